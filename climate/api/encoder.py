@@ -0,0 +1,107 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""JSON encoder of the API responses.
+
+The encoder is built once and reused, instead of one encoder per call as
+with wsgi.JSONDictSerializer. It is backed by the first importable module
+of the api_json_backends option: any module with a json-like JSONEncoder
+class will do. Types JSON does not know are converted by a table of
+functions keyed by type, which is filled with the subclasses of known types
+as they are met.
+"""
+
+import datetime
+
+from oslo.config import cfg
+import six
+
+from climate.openstack.common import gettextutils
+from climate.openstack.common import importutils
+
+netaddr = importutils.try_import('netaddr')
+
+opts = [
+    cfg.ListOpt('api_json_backends',
+                default=['json', 'simplejson'],
+                help='Modules encoding the JSON of API responses, the first '
+                     'importable one is used'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+
+
+def _datetime_to_str(value):
+    if value.tzinfo is None:
+        # Cheaper than value.replace(microsecond=0).isoformat()
+        return value.isoformat()[:19]
+    return value.replace(microsecond=0).isoformat()
+
+
+# Conversions of the types JSON does not know, the same as the ones of
+# wsgi.JSONDictSerializer
+_CONVERSIONS = {
+    datetime.datetime: _datetime_to_str,
+    gettextutils.Message: six.text_type,
+}
+if netaddr is not None:
+    _CONVERSIONS[netaddr.IPAddress] = six.text_type
+
+
+def _convert(value):
+    try:
+        return _CONVERSIONS[type(value)](value)
+    except KeyError:
+        pass
+
+    for known_type, conversion in _CONVERSIONS.items():
+        if isinstance(value, known_type):
+            break
+    else:
+        conversion = six.text_type
+    _CONVERSIONS[type(value)] = conversion
+    return conversion(value)
+
+
+def _import_backend(backends):
+    for name in backends:
+        module = importutils.try_import(name)
+        if module is not None:
+            return module
+    raise ImportError('No JSON module among %s' % ', '.join(backends))
+
+
+class Encoder(object):
+    """Reusable JSON encoder."""
+
+    def __init__(self, backends=None):
+        self.backend = _import_backend(backends or CONF.api_json_backends)
+        self._encoder = self.backend.JSONEncoder(default=_convert)
+
+    def dumps(self, value):
+        """Return the JSON document of value."""
+        return self._encoder.encode(value)
+
+
+_ENCODER = None
+
+
+def dumps(value):
+    """Return the JSON document of value, with the shared encoder."""
+    global _ENCODER
+    if _ENCODER is None:
+        _ENCODER = Encoder()
+    return _ENCODER.dumps(value)
@@ -13,19 +13,192 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+
+from oslo.config import cfg
+
+from climate import context
+from climate.db import api as db_api
+from climate import exceptions
 from climate.openstack.common import log as logging
+from climate.openstack.common import timeutils
+from climate.scheduler import rpcapi as scheduler_rpcapi
+
 
+opts = [
+    cfg.IntOpt('api_max_limit',
+               default=1000,
+               help='Maximum number of items returned by a single list '
+                    'request'),
+]
 
+CONF = cfg.CONF
+CONF.register_opts(opts)
 LOG = logging.getLogger(__name__)
 
+LEASE_DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def _parse_date(values, key):
+    if key in values:
+        try:
+            values[key] = datetime.datetime.strptime(values[key],
+                                                     LEASE_DATE_FORMAT)
+        except (TypeError, ValueError):
+            raise exceptions.InvalidInput(
+                '%s must use the format %s' % (key, LEASE_DATE_FORMAT))
+
+
+def _check_required(values, what, keys):
+    missing = [key for key in keys if values.get(key) is None]
+    if missing:
+        raise exceptions.InvalidInput(
+            '%s misses %s' % (what, ', '.join(missing)))
+
+
+def _copy_list_of_dicts(values, key):
+    items = values.get(key, [])
+    if not isinstance(items, list) or not all(isinstance(item, dict)
+                                              for item in items):
+        raise exceptions.InvalidInput('%s must be a list of objects' % key)
+    return [dict(item) for item in items]
+
+
+def _parse_lease_values(values):
+    """Return a copy of lease values with dates converted to datetime.
+
+    Raise InvalidInput if the values are not the ones of a lease.
+    """
+    if not isinstance(values, dict):
+        raise exceptions.InvalidInput('a lease must be an object')
+    values = dict(values)
+    _check_required(values, 'lease', ('name', 'start_date', 'end_date',
+                                      'trust'))
+    _parse_date(values, 'start_date')
+    _parse_date(values, 'end_date')
+    if values['start_date'] >= values['end_date']:
+        raise exceptions.InvalidInput(
+            'start_date must be before end_date')
+
+    values['reservations'] = _copy_list_of_dicts(values, 'reservations')
+    for reservation in values['reservations']:
+        _check_required(reservation, 'reservation',
+                        ('resource_id', 'resource_type'))
+    values['events'] = _copy_list_of_dicts(values, 'events')
+    for event in values['events']:
+        _parse_date(event, 'time')
+    return values
+
+
+def _etag_version(etag):
+    """Return the lease version of an ETag of get_lease_etag()."""
+    return int(etag) if etag is not None else None
+
 
 class API(object):
 
     ## Leases operations
 
-    def get_leases(self):
-        """List all existing leases."""
-        pass
+    def get_leases(self, query=None):
+        """Return an iterator on existing leases, oldest first.
+
+        :param query: Optional 'limit', 'marker' (ID of the last lease of the
+                      previous page), comma separated 'fields' to return,
+                      and 'name', 'tenant_id', 'user_id', 'status',
+                      'start_date', 'end_date' filters.
+        :type query: dict
+        """
+        query = query or {}
+
+        limit = CONF.api_max_limit
+        if 'limit' in query:
+            try:
+                limit = int(query['limit'])
+            except ValueError:
+                raise exceptions.InvalidInput('limit must be an integer')
+            if limit < 0:
+                raise exceptions.InvalidInput('limit must be positive')
+            limit = min(limit, CONF.api_max_limit)
+
+        fields = None
+        if query.get('fields'):
+            fields = [f.strip() for f in query['fields'].split(',')]
+
+        filters = dict((key, query[key])
+                       for key in ('name', 'tenant_id', 'user_id', 'status',
+                                   'start_date', 'end_date')
+                       if key in query)
+        _parse_date(filters, 'start_date')
+        _parse_date(filters, 'end_date')
+
+        return db_api.lease_iter_by_filters(filters, limit,
+                                            query.get('marker'), fields)
+
+    def get_availability(self, query):
+        """Find the earliest window when resources can be reserved.
+
+        :param query: 'resource_type', 'count' of resources (1 by default),
+                      'duration' of the window in minutes and the date
+                      'after' which it may start (now by default).
+        :type query: dict
+        """
+        resource_type = query.get('resource_type')
+        if resource_type != 'physical:host':
+            raise exceptions.InvalidInput(
+                'availability of %s resources is unknown' % resource_type)
+
+        try:
+            count = int(query.get('count', 1))
+            duration = int(query['duration'])
+        except KeyError:
+            raise exceptions.InvalidInput('duration is required')
+        except ValueError:
+            raise exceptions.InvalidInput(
+                'count and duration must be integers')
+        if count < 1 or duration < 1:
+            raise exceptions.InvalidInput(
+                'count and duration must be positive')
+        duration = datetime.timedelta(minutes=duration)
+
+        if 'after' in query:
+            _parse_date(query, 'after')
+            after = query['after']
+        else:
+            # Dates are exchanged to the minute, start at the next one
+            after = timeutils.utcnow().replace(second=0, microsecond=0) + \
+                datetime.timedelta(minutes=1)
+
+        # The timeline is shared by the requests, as the index it is built
+        # from: periods before after do not change the windows found.
+        hosts_count = db_api.host_count()
+        timeline = db_api.resource_timeline(resource_type, hosts_count)
+        index = db_api.resource_index(resource_type)
+
+        availability = {'resource_type': resource_type, 'count': count,
+                        'start_date': None, 'end_date': None}
+        # Enough hosts may be free at any time of a window, but not the
+        # same hosts all along: check windows host by host.
+        for start_date in timeline.windows(count, duration, after):
+            end_date = start_date + duration
+            busy_hosts = index.keys_overlapping(start_date, end_date)
+            if hosts_count - len(busy_hosts) >= count:
+                availability['start_date'] = start_date
+                availability['end_date'] = end_date
+                break
+        return availability
+
+    def get_host_reservations(self):
+        """Return the reservations of physical hosts not over yet.
+
+        They are listed for the filter of nova-scheduler, which cannot read
+        the DB of Climate.
+        """
+        reserved = db_api.reservation_get_all_periods('physical:host',
+                                                      timeutils.utcnow())
+        return [{'host': host, 'start_date': start_date,
+                 'end_date': end_date, 'reservation_id': reservation_id}
+                for host, start_date, end_date, _lease_id, reservation_id
+                in reserved]
 
     def create_lease(self, data):
         """Create new lease.
@@ -35,31 +208,78 @@ class API(object):
         """
         pass
 
+    def create_leases(self, data):
+        """Create several leases at once.
+
+        :param data: New leases characteristics, listed under 'leases'.
+        :type data: dict
+        """
+        leases = data.get('leases')
+        if not isinstance(leases, list):
+            raise exceptions.InvalidInput('a list of leases is expected')
+
+        ctx = context.Context.current()
+        leases = [_parse_lease_values(values) for values in leases]
+        for values in leases:
+            values['tenant_id'] = ctx.tenant_id
+            values['user_id'] = ctx.user_id
+        lease_ids = db_api.lease_create_bulk(leases, check_resources=True)
+        scheduler_rpcapi.SchedulerAPI().events_changed(ctx)
+        return [{'id': lease_id} for lease_id in lease_ids]
+
     def get_lease(self, lease_id):
         """Get lease by its ID.
 
         :param lease_id: ID of the lease in Climate DB.
         :type lease_id: str
         """
-        pass
+        return db_api.lease_get(lease_id)
 
-    def update_lease(self, lease_id, data):
-        """Update lease. Only name changing and prolonging may be proceeded.
+    def get_lease_etag(self, lease_id, lease=None):
+        """Get the ETag of a lease, its version, which changes with the lease
+        or its reservations and events. Return None if the lease does not
+        exist, so that it also checks a lease exists without loading it.
+
+        :param lease_id: ID of the lease in Climate DB.
+        :type lease_id: str
+        :param lease: The lease, if already got, to not read its version.
+        :type lease: dict
+        """
+        if lease is not None:
+            version = lease['version']
+        else:
+            version = db_api.lease_version(lease_id)
+        if version is None:
+            return None
+        return str(version)
+
+    def update_lease(self, lease_id, data, etag=None):
+        """Update lease. Only its name may be changed for now.
 
         :param lease_id: ID of the lease in Climate DB.
         :type lease_id: str
         :param data: New lease characteristics.
         :type data: dict
+        :param etag: ETag the lease must still have when it is updated,
+                     ConstraintNotMet is raised otherwise.
+        :type etag: str
         """
-        pass
+        unknown = set(data) - set(['name'])
+        if unknown:
+            raise exceptions.InvalidInput(
+                'only the name of a lease may be updated')
+        return db_api.lease_update(lease_id, data, _etag_version(etag))
 
-    def delete_lease(self, lease_id):
+    def delete_lease(self, lease_id, etag=None):
         """Delete specified lease.
 
         :param lease_id: ID of the lease in Climate DB.
         :type lease_id: str
+        :param etag: ETag the lease must still have when it is deleted,
+                     ConstraintNotMet is raised otherwise.
+        :type etag: str
         """
-        pass
+        db_api.lease_destroy(lease_id, _etag_version(etag))
 
     ## Plugins operations
 
@@ -14,32 +14,38 @@
 # limitations under the License.
 
 import traceback
+import types
 
 import flask
 from werkzeug import datastructures
 
 from climate.api import context
+from climate.api import encoder
+from climate import context as climate_context
 from climate import exceptions as ex
-from climate.openstack.common.deprecated import wsgi
+from climate.openstack.common import jsonutils
 from climate.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+# Size of the chunks of streamed responses
+STREAM_CHUNK_SIZE = 65536
+
 
 class Rest(flask.Blueprint):
     """REST helper class."""
 
-    def get(self, rule, status_code=200):
-        return self._mroute('GET', rule, status_code)
+    def get(self, rule, status_code=200, **kw):
+        return self._mroute('GET', rule, status_code, **kw)
 
-    def post(self, rule, status_code=202):
-        return self._mroute('POST', rule, status_code)
+    def post(self, rule, status_code=202, **kw):
+        return self._mroute('POST', rule, status_code, **kw)
 
-    def put(self, rule, status_code=202):
-        return self._mroute('PUT', rule, status_code)
+    def put(self, rule, status_code=202, **kw):
+        return self._mroute('PUT', rule, status_code, **kw)
 
-    def delete(self, rule, status_code=204):
-        return self._mroute('DELETE', rule, status_code)
+    def delete(self, rule, status_code=204, **kw):
+        return self._mroute('DELETE', rule, status_code, **kw)
 
     def _mroute(self, methods, rule, status_code=None, **kw):
         """Route helper method."""
@@ -48,9 +54,21 @@ class Rest(flask.Blueprint):
         return self.route(rule, methods=methods, status_code=status_code, **kw)
 
     def route(self, rule, **options):
-        """Routes REST method and its params to the actual request."""
+        """Routes REST method and its params to the actual request.
+
+        If the etag option is set, it is called with the params of the
+        request and returns the ETag of the resource, None if it does not
+        exist. GET requests are then answered 304 if the resource matches
+        If-None-Match, without calling the method, and get an ETag header,
+        got after the method was called if there was no If-None-Match.
+        Other requests fail with 412 if the resource does not match
+        If-Match. Otherwise, the method gets the matched ETag with
+        matched_etag(), to only write the resource if it still has it, and
+        raises ConstraintNotMet, answered 412 too, if not.
+        """
         status = options.pop('status_code', None)
         file_upload = options.pop('file_upload', False)
+        etag = options.pop('etag', None)
 
         def decorator(func):
             endpoint = options.pop('endpoint', func.__name__)
@@ -69,7 +87,11 @@ class Rest(flask.Blueprint):
 
                 with context.ctx_from_headers(flask.request.headers):
                     try:
-                        return func(**kwargs)
+                        if etag is None:
+                            return func(**kwargs)
+                        return _conditional(func, etag, kwargs)
+                    except ex.ConstraintNotMet:
+                        return _precondition_failed()
                     except ex.ClimateException as e:
                         return bad_request(e)
                     except Exception as e:
@@ -83,6 +105,48 @@ class Rest(flask.Blueprint):
         return decorator
 
 
+def _conditional(func, etag, kwargs):
+    """Call func unless the ETag of the resource fails the request
+    conditions.
+    """
+    params = dict((k, v) for k, v in kwargs.iteritems() if k != 'data')
+
+    if flask.request.method == 'GET':
+        if flask.request.if_none_match:
+            tag = etag(**params)
+            if tag is not None and tag in flask.request.if_none_match:
+                response = flask.Response(status=304)
+                response.set_etag(tag)
+                return response
+        response = func(**kwargs)
+        if response.status_code == 200:
+            tag = etag(**params)
+            if tag is not None:
+                response.set_etag(tag)
+        return response
+
+    tag = etag(**params)
+    if tag is None:
+        return func(**kwargs)
+
+    if flask.request.if_match:
+        if tag not in flask.request.if_match:
+            return _precondition_failed()
+        if not flask.request.if_match.star_tag:
+            flask.g.matched_etag = tag
+    return func(**kwargs)
+
+
+def _precondition_failed():
+    return render_error_message(412, 'Resource was modified',
+                                'PRECONDITION_FAILED')
+
+
+def matched_etag():
+    """Return the ETag of the resource matched by If-Match, if any."""
+    return getattr(flask.g, 'matched_etag', None)
+
+
 RT_JSON = datastructures.MIMEAccept([("application/json", 1)])
 
 
@@ -121,20 +185,77 @@ def render(result=None, response_type=None, status=None, **kwargs):
     if not response_type:
         response_type = getattr(flask.request, 'resp_type', RT_JSON)
 
-    serializer = None
+    dumps = None
     if "application/json" in response_type:
         response_type = RT_JSON
-        serializer = wsgi.JSONDictSerializer()
+        dumps = encoder.dumps
     else:
         abort_and_log(400, "Content type '%s' isn't supported" % response_type)
 
-    body = serializer.serialize(result)
+    if type(result) is dict and any(isinstance(value, types.GeneratorType)
+                                    for value in result.itervalues()):
+        # Keep the request and the Climate context, and so its DB session,
+        # until the streaming ends
+        body = flask.stream_with_context(
+            _stream_json(result, dumps, climate_context.Context.current()))
+    else:
+        body = dumps(result)
     response_type = str(response_type)
 
     return flask.Response(response=body, status=status_code,
                           mimetype=response_type)
 
 
+def _stream_json(result, dumps, ctx):
+    """Serialize the result dict to JSON, by chunks.
+
+    Generators in result are serialized as lists, one item at a time, so
+    that neither the items nor the JSON document are held in memory at once.
+    Chunks are about STREAM_CHUNK_SIZE long, and are serialized in the ctx
+    Climate context.
+
+    The status of the response is sent with its first chunk: an error
+    raised later is logged and raised again, for the server to close the
+    connection before the end of the chunked response, so that clients do
+    not take the truncated document for a complete one.
+    """
+    def _pieces():
+        yield '{'
+        for i, (key, value) in enumerate(result.iteritems()):
+            if i:
+                yield ', '
+            yield dumps(key)
+            yield ': '
+            if isinstance(value, types.GeneratorType):
+                yield '['
+                for j, item in enumerate(value):
+                    if j:
+                        yield ', '
+                    yield dumps(item)
+                yield ']'
+            else:
+                yield dumps(value)
+        yield '}'
+
+    with ctx:
+        chunk = []
+        size = 0
+        try:
+            for piece in _pieces():
+                chunk.append(piece)
+                size += len(piece)
+                if size >= STREAM_CHUNK_SIZE:
+                    yield ''.join(chunk)
+                    chunk = []
+                    size = 0
+        except Exception:
+            LOG.exception('Error while streaming the response, it is '
+                          'truncated')
+            raise
+        if chunk:
+            yield ''.join(chunk)
+
+
 def request_data():
     """Method called to process POST and PUT REST methods."""
     if hasattr(flask.request, 'parsed_data'):
@@ -147,15 +268,16 @@ def request_data():
     if flask.request.file_upload:
         return flask.request.data
 
-    deserializer = None
     content_type = flask.request.mimetype
-    if not content_type or content_type in RT_JSON:
-        deserializer = wsgi.JSONDeserializer()
-    else:
+    if content_type and content_type not in RT_JSON:
         abort_and_log(400, "Content type '%s' isn't supported" % content_type)
 
+    try:
+        parsed_data = jsonutils.loads(flask.request.data)
+    except ValueError:
+        abort_and_log(400, "Cannot understand JSON")
+
     # parsed request data to avoid unwanted re-parsings
-    parsed_data = deserializer.deserialize(flask.request.data)['body']
     flask.request.parsed_data = parsed_data
 
     return flask.request.parsed_data
@@ -27,10 +27,22 @@ _api = utils.LazyProxy(service.API)
 
 ## Leases operations
 
+def _lease_etag(lease_id):
+    """Return the ETag of the lease, reading it at most once per request.
+
+    It comes from the lease itself if it was already got in this request.
+    """
+    lease = validation.cached_object(_api.get_lease, lease_id=lease_id)
+    if lease is not None:
+        return _api.get_lease_etag(lease_id, lease)
+    return validation.checked_object(_api.get_lease_etag, lease_id=lease_id)
+
+
 @rest.get('/leases')
 def leases_list():
-    """List all existing leases."""
-    return api_utils.render(leases=_api.get_leases())
+    """List existing leases, by pages."""
+    query = api_utils.get_request_args().to_dict()
+    return api_utils.render(leases=_api.get_leases(query))
 
 
 @rest.post('/leases')
@@ -39,25 +51,40 @@ def leases_create(data):
     return api_utils.render(lease=_api.create_lease(data))
 
 
-@rest.get('/leases/<lease_id>')
+@rest.post('/leases:batch')
+def leases_create_batch(data):
+    """Create several leases at once."""
+    return api_utils.render(leases=_api.create_leases(data))
+
+
+@rest.get('/leases/availability')
+def leases_availability():
+    """Find the earliest window when resources can be reserved."""
+    query = api_utils.get_request_args().to_dict()
+    return api_utils.render(availability=_api.get_availability(query))
+
+
+@rest.get('/leases/<lease_id>', etag=_lease_etag)
 @validation.check_exists(_api.get_lease, lease_id='lease_id')
 def leases_get(lease_id):
     """Get lease by its ID."""
-    return api_utils.render(lease=_api.get_lease(lease_id))
+    lease = validation.checked_object(_api.get_lease, lease_id=lease_id)
+    return api_utils.render(lease=lease)
 
 
-@rest.put('/leases/<lease_id>')
-@validation.check_exists(_api.get_lease, lease_id='lease_id')
+@rest.put('/leases/<lease_id>', etag=_lease_etag)
+@validation.check_exists(_api.get_lease_etag, lease_id='lease_id')
 def leases_update(lease_id, data):
     """Update lease. Only name changing and prolonging may be proceeded."""
-    return api_utils.render(lease=_api.update_lease(lease_id, data))
+    return api_utils.render(lease=_api.update_lease(
+        lease_id, data, api_utils.matched_etag()))
 
 
-@rest.delete('/leases/<lease_id>')
-@validation.check_exists(_api.get_lease, lease_id='lease_id')
+@rest.delete('/leases/<lease_id>', etag=_lease_etag)
+@validation.check_exists(_api.get_lease_etag, lease_id='lease_id')
 def leases_delete(lease_id):
     """Delete specified lease."""
-    _api.delete_lease(lease_id)
+    _api.delete_lease(lease_id, api_utils.matched_etag())
     return api_utils.render()
 
 
@@ -67,3 +94,11 @@ def leases_delete(lease_id):
 def plugins_list():
     """List all possible plugins."""
     return api_utils.render(plugins=_api.get_plugins())
+
+
+## Hosts operations
+
+@rest.get('/os-hosts/reservations')
+def hosts_reservations():
+    """List the reservations of physical hosts not over yet."""
+    return api_utils.render(reservations=_api.get_host_reservations())
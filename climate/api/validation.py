@@ -15,15 +15,48 @@
 
 import functools
 
+import flask
 import six
 
 from climate.api import utils as api_utils
 from climate import exceptions
 
 
+def _checked_key(get_function, get_kwargs):
+    return get_function, tuple(sorted(get_kwargs.items()))
+
+
+def cached_object(get_function, **get_kwargs):
+    """Return the object got by checked_object or check_exists during this
+    request with the same function and arguments, None if there is none.
+    """
+    checked = getattr(flask.g, 'checked_objects', {})
+    return checked.get(_checked_key(get_function, get_kwargs))
+
+
+def checked_object(get_function, **get_kwargs):
+    """Return the object checked by check_exists during this request.
+
+    The object is only got if it was not got yet during this request with
+    the same function and arguments, and is then kept until the end of the
+    request.
+    """
+    if not hasattr(flask.g, 'checked_objects'):
+        flask.g.checked_objects = {}
+    key = _checked_key(get_function, get_kwargs)
+    if key not in flask.g.checked_objects:
+        flask.g.checked_objects[key] = get_function(**get_kwargs)
+    return flask.g.checked_objects[key]
+
+
 def check_exists(get_function, object_id=None, **get_args):
     """Check object exists.
 
+    The object is got with checked_object(), so that it is got once per
+    request: the decorated method can get it with checked_object() too
+    instead of getting it again. The get_function may also only check the
+    object exists, returning None or False otherwise.
+
     :param get_function: Method to call to get object.
     :type get_function: function
     :param object_id: ID of the object to get.
@@ -45,10 +78,10 @@ def check_exists(get_function, object_id=None, **get_args):
                 get_kwargs[k] = kwargs[v]
 
             try:
-                obj = get_function(**get_kwargs)
+                obj = checked_object(get_function, **get_kwargs)
             except exceptions.NotFound:
                 obj = None
-            if obj is None:
+            if obj is None or obj is False:
                 e = exceptions.NotFound(
                     get_kwargs,
                     template='Object with %s not found',
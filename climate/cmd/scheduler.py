@@ -22,15 +22,18 @@ import sys
 from oslo.config import cfg
 
 from climate.openstack.common import service
+from climate.scheduler import rpcapi as scheduler_rpcapi
 from climate.scheduler import service as scheduler_service
 from climate.utils import service as service_utils
 
 
 def main():
     service_utils.prepare_service(sys.argv)
+    workers = cfg.CONF.scheduler_workers
     service.launch(
         scheduler_service.SchedulerService(cfg.CONF.host,
-                                           'climate.scheduler')
+                                           scheduler_rpcapi.TOPIC),
+        workers=workers if workers > 1 else None
     ).wait()
 
 if __name__ == '__main__':
@@ -49,6 +49,12 @@ class Context(object):
         stack.pop()
         if not stack:
             del self._contexts[corolocal.get_ident()]
+        self._close_db_session()
+
+    def _close_db_session(self):
+        if self._db_session is not None:
+            self._db_session.close()
+            self._db_session = None
 
     @classmethod
     def current(cls):
@@ -59,10 +65,25 @@ class Context(object):
 
     @classmethod
     def clear(cls):
+        for ctx in cls._contexts.pop(corolocal.get_ident(), []):
+            ctx._close_db_session()
+
+    @classmethod
+    def db_session(cls, factory, default_factory=None):
+        """Return the DB session of the current context.
+
+        The session is created by factory the first time, and closed when
+        the context exits, so that the DB calls made in a context share its
+        connection and identity map. Without context, a new session is
+        returned each time, by default_factory if given.
+        """
         try:
-            del cls._contexts[corolocal.get_ident()]
-        except KeyError:
-            pass
+            ctx = cls._contexts[corolocal.get_ident()][-1]
+        except (KeyError, IndexError):
+            return (default_factory or factory)()
+        if ctx._db_session is None:
+            ctx._db_session = factory()
+        return ctx._db_session
 
     def clone(self):
         return Context(self.user_id,
@@ -89,21 +89,40 @@ def not_equal(*values):
     return IMPL.not_equal(*values)
 
 
+def _to_dict(item):
+    if isinstance(item, dict):
+        return item
+    return item.to_dict()
+
+
 def to_dict(func):
     def decorator(*args, **kwargs):
         res = func(*args, **kwargs)
 
         if isinstance(res, list):
-            return [item.to_dict() for item in res]
+            return [_to_dict(item) for item in res]
 
         if res:
-            return res.to_dict()
+            return _to_dict(res)
         else:
             return None
 
     return decorator
 
 
+def to_dict_iter(func):
+    """Convert the items returned by func to dicts, one at a time.
+
+    func is still called right away, only the conversion is deferred to the
+    iteration of the result.
+    """
+    def decorator(*args, **kwargs):
+        res = func(*args, **kwargs)
+        return (_to_dict(item) for item in res)
+
+    return decorator
+
+
 #Reservation
 
 def reservation_create(reservation_values):
@@ -114,7 +133,7 @@ def reservation_create(reservation_values):
 @to_dict
 def reservation_get_all_by_lease(lease_id):
     """Return all reservations belongs to specific lease."""
-    return IMPL.reservation_get_all_by_lease(lease_id)
+    return IMPL.reservation_get_all_by_lease_id(lease_id)
 
 
 @to_dict
@@ -123,6 +142,13 @@ def reservation_get(reservation_id):
     return IMPL.reservation_get(reservation_id)
 
 
+def reservation_get_all_periods(resource_type=None, ending_after=None):
+    """Return the reserved periods of resources of the given type, ending
+    after the given date if any.
+    """
+    return IMPL.reservation_get_all_periods(resource_type, ending_after)
+
+
 def reservation_destroy(reservation_id):
     """Delete specific reservation."""
     IMPL.reservation_destroy(reservation_id)
@@ -140,6 +166,15 @@ def lease_create(lease_values):
     return IMPL.lease_create(lease_values)
 
 
+def lease_create_bulk(leases_values, check_resources=False):
+    """Create leases from a list of values, return their IDs.
+
+    With check_resources, raise ResourceBusy instead if a resource would be
+    reserved twice at the same time.
+    """
+    return IMPL.lease_create_bulk(leases_values, check_resources)
+
+
 @to_dict
 def lease_get_all():
     """Return all leases."""
@@ -159,25 +194,96 @@ def lease_get_all_by_user(user_id):
 
 
 @to_dict
-def lease_get(lease_id):
-    """Return lease."""
-    return IMPL.lease_get(lease_id)
+def lease_get(lease_id, children=True):
+    """Return lease.
+
+    Its reservations and events are left empty if children is False.
+    """
+    return IMPL.lease_get(lease_id, children)
+
+
+def lease_version(lease_id):
+    """Return the version of the lease, bumped by every write of the lease
+    or of its children.
+
+    Return None if the lease does not exist.
+    """
+    return IMPL.lease_version(lease_id)
+
+
+@to_dict
+def lease_list(children=True):
+    """Return a list of all existing leases.
+
+    Their reservations and events are left empty if children is False.
+    """
+    return IMPL.lease_list(children)
 
 
 @to_dict
-def lease_list():
-    """Return a list of all existing leases."""
-    return IMPL.lease_list()
+def lease_get_all_by_filters(filters=None, limit=None, marker=None,
+                             fields=None):
+    """Return a page of leases matching filters.
+
+    If fields is set, only these columns of the leases are returned.
+    """
+    return IMPL.lease_get_all_by_filters(filters, limit, marker, fields)
+
+
+@to_dict_iter
+def lease_iter_by_filters(filters=None, limit=None, marker=None,
+                          fields=None):
+    """Return an iterator on a page of leases matching filters.
 
+    Like lease_get_all_by_filters, but leases are read by chunks and
+    converted to dicts while they are iterated on.
+    """
+    return IMPL.lease_iter_by_filters(filters, limit, marker, fields)
 
-def lease_destroy(lease_id):
-    """Delete lease or raise if not exists."""
-    IMPL.lease_destroy(lease_id)
 
+def lease_destroy(lease_id, version=None):
+    """Delete lease or raise if not exists.
 
-def lease_update(lease_id, lease_values):
-    """Update lease or raise if not exists."""
-    IMPL.lease_update(lease_id, lease_values)
+    With a version, raise ConstraintNotMet if the lease has another one.
+    """
+    IMPL.lease_destroy(lease_id, version)
+
+
+@to_dict
+def lease_update(lease_id, lease_values, version=None):
+    """Update lease or raise if not exists, and return it.
+
+    With a version, raise ConstraintNotMet if the lease has another one.
+    """
+    return IMPL.lease_update(lease_id, lease_values, version)
+
+
+def lease_ids_overlapping(resource_id, start_date, end_date):
+    """Return IDs of leases reserving the resource during the period, as
+    read from the DB.
+    """
+    return IMPL.lease_ids_overlapping(resource_id, start_date, end_date)
+
+
+def resource_is_free(resource_id, start_date, end_date):
+    """Check no lease reserves the resource during the period."""
+    return IMPL.resource_is_free(resource_id, start_date, end_date)
+
+
+def resource_index(resource_type):
+    """Return the index of the periods reserved for resources of the type.
+
+    The index is shared and may be a few seconds stale.
+    """
+    return IMPL.resource_index(resource_type)
+
+
+def resource_timeline(resource_type, resource_count):
+    """Return the capacity timeline of resource_count resources of the type.
+
+    The timeline is cached along with the resource index, and is as stale.
+    """
+    return IMPL.resource_timeline(resource_type, resource_count)
 
 
 #Events
@@ -201,10 +307,10 @@ def event_get(event_id):
 
 
 @to_dict
-def event_get_all_sorted_by_filters(sort_key, sort_dir, filters):
+def event_get_all_sorted_by_filters(sort_key, sort_dir, filters, limit=None):
     """Return instances sorted by param."""
     return IMPL.event_get_all_sorted_by_filters(sort_key, sort_dir,
-                                                filters)
+                                                filters, limit)
 
 
 @to_dict
@@ -218,6 +324,93 @@ def event_destroy(event_id):
     IMPL.event_destroy(event_id)
 
 
-def event_update(event_id, event_values):
-    """Update event or raise if not exists."""
-    IMPL.event_update(event_id, event_values)
+def event_update(event_id, event_values, constraint=None):
+    """Update event or raise if not exists.
+
+    If constraint is set and not met by the event, raise ConstraintNotMet.
+    """
+    IMPL.event_update(event_id, event_values, constraint)
+
+
+def event_reclaim(timeout, live_workers=None):
+    """Give the IN_PROGRESS events of dead workers back to UNDONE.
+
+    Events claimed more than timeout seconds ago are reclaimed, and, if
+    live_workers is set, events claimed by any other worker too. Return
+    the number of reclaimed events.
+    """
+    return IMPL.event_reclaim(timeout, live_workers)
+
+
+@to_dict
+def event_claim_due(limit, worker_id, partitions=None):
+    """Claim up to limit due events for the worker, soonest first.
+
+    Claimed events are IN_PROGRESS and will not be claimed by other
+    workers. If partitions is set, only events of leases in these
+    partitions are claimed.
+    """
+    return IMPL.event_claim_due(limit, worker_id, partitions)
+
+
+def event_count_due(partitions=None):
+    """Return the number of due events not claimed yet, by event type."""
+    return IMPL.event_count_due(partitions)
+
+
+#ComputeHosts
+
+@to_dict
+def host_get(host_id):
+    """Return specific compute host."""
+    return IMPL.host_get(host_id)
+
+
+@to_dict
+def host_get_all():
+    """Return all compute hosts."""
+    return IMPL.host_get_all()
+
+
+def host_count():
+    """Return the number of compute hosts."""
+    return IMPL.host_count()
+
+
+@to_dict
+def host_get_all_by_queries(queries):
+    """Return compute hosts matching all the queries on capabilities."""
+    return IMPL.host_get_all_by_queries(queries)
+
+
+@to_dict
+def host_create(host_values):
+    """Create a compute host from values."""
+    return IMPL.host_create(host_values)
+
+
+def host_update(host_id, host_values):
+    """Update compute host or raise if not exists."""
+    IMPL.host_update(host_id, host_values)
+
+
+def host_destroy(host_id):
+    """Delete compute host or raise if not exists."""
+    IMPL.host_destroy(host_id)
+
+
+#Scheduler workers
+
+def scheduler_worker_heartbeat(worker_id):
+    """Record that the scheduler worker is alive, registering it if new."""
+    IMPL.scheduler_worker_heartbeat(worker_id)
+
+
+def scheduler_worker_get_all_alive(ttl):
+    """Return IDs of the workers whose heartbeat is at most ttl s old."""
+    return IMPL.scheduler_worker_get_all_alive(ttl)
+
+
+def scheduler_worker_destroy(worker_id):
+    """Unregister the scheduler worker."""
+    IMPL.scheduler_worker_destroy(worker_id)
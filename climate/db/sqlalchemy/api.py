@@ -15,23 +15,57 @@
 
 """Implementation of SQLAlchemy backend."""
 
+import datetime
+import operator
 import sys
 
+from oslo.config import cfg
 import sqlalchemy as sa
+from sqlalchemy.ext import compiler
+from sqlalchemy import orm
+from sqlalchemy.orm import attributes
+from sqlalchemy.sql import expression
 from sqlalchemy.sql.expression import asc
 from sqlalchemy.sql.expression import desc
 
 from climate import context
+from climate.db.sqlalchemy import model_base as mb
 from climate.db.sqlalchemy import models
+from climate.db.sqlalchemy import rows
+from climate import exceptions
+from climate.inventory import query as host_query
 from climate.openstack.common.db import exception as db_exc
 from climate.openstack.common.db.sqlalchemy import session as db_session
+from climate.openstack.common.db.sqlalchemy import utils as db_utils
 from climate.openstack.common import log as logging
-
-
+from climate.openstack.common import timeutils
+from climate.openstack.common import uuidutils
+from climate.utils import capacity
+from climate.utils import intervals
+
+
+opts = [
+    cfg.IntOpt('resource_index_ttl',
+               default=60,
+               help='Number of seconds the in-memory index of the periods '
+                    'reserved for resources is used before being built '
+                    'again from the DB, to see the writes of the other '
+                    'processes'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
 LOG = logging.getLogger(__name__)
 
 get_engine = db_session.get_engine
-get_session = db_session.get_session
+
+# Indexes of the reserved periods by resource type, along with the time
+# they were built at
+_RESOURCE_INDEXES = {}
+
+# Capacity timelines by resource type, along with the index and the
+# resource count they were built from
+_RESOURCE_TIMELINES = {}
 
 
 def get_backend():
@@ -39,6 +73,29 @@ def get_backend():
     return sys.modules[__name__]
 
 
+class _ContextSession(db_session.Session):
+    """Session holding one connection until it is closed."""
+
+    def close(self):
+        connection = self.bind
+        super(_ContextSession, self).close()
+        connection.close()
+
+
+def _context_session():
+    return _ContextSession(bind=get_engine().connect(), autocommit=True,
+                           expire_on_commit=False, query_cls=db_session.Query)
+
+
+def get_session():
+    """Return the DB session of the current context, or a new session.
+
+    The session of a context is bound to a connection checked out once,
+    so that all the DB calls of the context run on it.
+    """
+    return context.Context.db_session(_context_session, db_session.get_session)
+
+
 def model_query(model, session=None, project_only=None):
     """Query helper.
 
@@ -52,7 +109,7 @@ def model_query(model, session=None, project_only=None):
 
     if project_only:
         ctx = context.Context.current()
-        query = query.filter_by(tenant_id=ctx.project_id)
+        query = query.filter_by(tenant_id=ctx.tenant_id)
 
     return query
 
@@ -70,6 +127,7 @@ def column_query(*columns, **kwargs):
 
 
 def setup_db():
+    _reset_resource_index()
     try:
         engine = db_session.get_engine(sqlite_fk=True)
         models.Lease.metadata.create_all(engine)
@@ -80,6 +138,7 @@ def setup_db():
 
 
 def drop_db():
+    _reset_resource_index()
     try:
         engine = db_session.get_engine(sqlite_fk=True)
         models.Lease.metadata.drop_all(engine)
@@ -131,6 +190,116 @@ class InequalityCondition(object):
         return [field != value for value in self.values]
 
 
+def _refresh_db_generated(session, obj):
+    """Load the columns of a flushed obj without reading it again if possible.
+
+    Columns left unset at INSERT time are expired by the flush. Unless the
+    DB computes a default for them, their value is known to be NULL, so obj
+    only needs to be refreshed for columns having a server-side default.
+    """
+    unloaded = attributes.instance_state(obj).unloaded
+    server_generated = []
+    for col in obj.__table__.columns:
+        if col.name not in unloaded:
+            continue
+        if col.server_default is None and col.server_onupdate is None:
+            attributes.set_committed_value(obj, col.name, None)
+        else:
+            server_generated.append(col.name)
+
+    if server_generated:
+        session.refresh(obj, server_generated)
+
+
+## Resource availability index
+
+
+def _reset_resource_index():
+    _RESOURCE_INDEXES.clear()
+    _RESOURCE_TIMELINES.clear()
+
+
+def resource_index(resource_type):
+    """Return the index of the periods reserved for resources of a type.
+
+    The index is built from the DB, without the periods already over, and
+    is then kept up to date by the lease and reservation write functions of
+    this module. It is built again every resource_index_ttl seconds to see
+    the writes of the other processes, so that it may be that stale: new
+    reservations must be checked with lease_ids_overlapping() instead.
+    """
+    now = timeutils.utcnow_ts()
+    built_at, index = _RESOURCE_INDEXES.get(resource_type, (None, None))
+    if built_at is None or now - built_at >= CONF.resource_index_ttl:
+        index = intervals.IntervalIndex()
+        for resource_id, start_date, end_date, lease_id, _r_id in \
+                reservation_get_all_periods(resource_type,
+                                            timeutils.utcnow()):
+            index.add(resource_id, start_date, end_date, lease_id)
+        _RESOURCE_INDEXES[resource_type] = (now, index)
+    return index
+
+
+def resource_timeline(resource_type, resource_count):
+    """Return the capacity timeline of resource_count resources of a type.
+
+    The timeline is built from resource_index() and cached along with it:
+    it is built again when the index is, when a lease write changes the
+    index, or for another resource count.
+    """
+    index = resource_index(resource_type)
+    built_from, count, timeline = _RESOURCE_TIMELINES.get(
+        resource_type, (None, None, None))
+    if built_from is not index or count != resource_count:
+        timeline = capacity.CapacityTimeline(
+            resource_count,
+            [(start_date, end_date, 1) for start_date, end_date, _r_id in
+             index.periods_overlapping(datetime.datetime.min,
+                                       datetime.datetime.max)])
+        _RESOURCE_TIMELINES[resource_type] = (index, resource_count,
+                                              timeline)
+    return timeline
+
+
+def _index_lease(lease):
+    """Update the resource indexes with lease and its reservations."""
+    if not _RESOURCE_INDEXES:
+        # Nothing to keep up to date, indexes will be built from the DB.
+        return
+
+    _unindex_lease(lease.id)
+    for reservation in lease.reservations:
+        if reservation.resource_type in _RESOURCE_INDEXES:
+            _built_at, index = _RESOURCE_INDEXES[reservation.resource_type]
+            index.add(reservation.resource_id, lease.start_date,
+                      lease.end_date, lease.id)
+
+
+def _unindex_lease(lease_id):
+    """Remove lease from the resource indexes."""
+    _RESOURCE_TIMELINES.clear()
+    for _built_at, index in _RESOURCE_INDEXES.itervalues():
+        index.remove(lease_id)
+
+
+def _lease_bump_version(session, lease_ids, version=None):
+    """Bump the version of leases, as they or their children are written.
+
+    With a version, the single lease of lease_ids is only bumped if it still
+    has this version, and ConstraintNotMet is raised otherwise. Its row is
+    then locked until the end of the transaction.
+
+    :param lease_ids: IDs of the leases, as a list or as a SELECT.
+    """
+    leases = models.Lease.__table__
+    update = leases.update().where(leases.c.id.in_(lease_ids)).values(
+        version=leases.c.version + 1)
+    if version is not None:
+        update = update.where(leases.c.version == version)
+    if not session.execute(update).rowcount and version is not None:
+        raise exceptions.ConstraintNotMet()
+
+
 #Reservation
 def _reservation_get(session, reservation_id):
     query = model_query(models.Reservation, session)
@@ -153,6 +322,29 @@ def reservation_get_all_by_lease_id(lease_id):
     return reservations.all()
 
 
+def reservation_get_all_periods(resource_type=None, ending_after=None):
+    """Return the period during which each reservation holds its resource.
+
+    Only the needed columns are fetched, as tuples of (resource_id,
+    start_date, end_date, lease_id, reservation_id).
+
+    :param ending_after: only return the periods ending after this date.
+    """
+    query = column_query(models.Reservation.resource_id,
+                         models.Lease.start_date,
+                         models.Lease.end_date,
+                         models.Lease.id,
+                         models.Reservation.id).\
+        filter(models.Reservation.lease_id == models.Lease.id)
+
+    if resource_type is not None:
+        query = query.filter(models.Reservation.resource_type == resource_type)
+    if ending_after is not None:
+        query = query.filter(models.Lease.end_date > ending_after)
+
+    return query.all()
+
+
 def reservation_create(values):
     values = values.copy()
     reservation = models.Reservation()
@@ -165,8 +357,13 @@ def reservation_create(values):
         except db_exc.DBDuplicateEntry as e:
             # raise exception about duplicated columns (e.columns)
             raise RuntimeError("DBDuplicateEntry: %s" % e.columns)
+        _refresh_db_generated(session, reservation)
+        _lease_bump_version(session, [reservation.lease_id])
+
+    if _RESOURCE_INDEXES:
+        _index_lease(lease_get(reservation.lease_id))
 
-    return reservation_get(reservation.id)
+    return reservation
 
 
 def reservation_update(reservation_id, values):
@@ -176,8 +373,13 @@ def reservation_update(reservation_id, values):
         reservation = _reservation_get(session, reservation_id)
         reservation.update(values)
         reservation.save(session=session)
+        _refresh_db_generated(session, reservation)
+        _lease_bump_version(session, [reservation.lease_id])
+
+    if _RESOURCE_INDEXES:
+        _index_lease(lease_get(reservation.lease_id))
 
-    return reservation_get(reservation_id)
+    return reservation
 
 
 def reservation_destroy(reservation_id):
@@ -190,33 +392,247 @@ def reservation_destroy(reservation_id):
             raise RuntimeError("Reservation not found!")
 
         session.delete(reservation)
+        _lease_bump_version(session, [reservation.lease_id])
+
+    if _RESOURCE_INDEXES:
+        _index_lease(lease_get(reservation.lease_id))
 
 
 #Lease
-def _lease_get(session, lease_id):
+def _lease_query(session, children=True):
+    """Return a query of leases.
+
+    Reservations and events of the leases are loaded by one extra query
+    each, unless children is False: they are then left empty.
+    """
     query = model_query(models.Lease, session)
+    if not children:
+        query = query.options(orm.noload('reservations'),
+                              orm.noload('events'))
+    return query
+
+
+def _lease_get(session, lease_id, children=True):
+    query = _lease_query(session, children)
     return query.filter_by(id=lease_id).first()
 
 
-def lease_get(lease_id):
-    return _lease_get(get_session(), lease_id)
+def lease_get(lease_id, children=True):
+    return _lease_get(get_session(), lease_id, children)
+
+
+def _lease_rows_query(session):
+    """Return a query of all the columns of leases, for _lease_rows()."""
+    return column_query(*[getattr(models.Lease, name)
+                          for name in rows.LeaseRow.columns],
+                        session=session)
+
+
+# Maximum number of IDs in the IN clause of a query, SQLite before 3.32
+# does not accept more than 999 variables in a statement
+IN_CHUNK_SIZE = 500
+
+
+def _lease_rows(session, query):
+    """Run a _lease_rows_query() and return its leases as read-only rows.
+
+    Leases, their reservations and their events are read by Core SELECTs,
+    without building ORM instances. Children are read by chunks of
+    IN_CHUNK_SIZE leases.
+    """
+    leases = [rows.LeaseRow(row) for row in session.execute(query.statement)]
+    if not leases:
+        return leases
+
+    leases_by_id = dict((lease.id, lease) for lease in leases)
+    lease_ids = list(leases_by_id)
+    for row_type, attr in ((rows.ReservationRow, 'reservations'),
+                           (rows.EventRow, 'events')):
+        table = getattr(models.Lease, attr).property.mapper.local_table
+        columns = [table.c[name] for name in row_type.columns]
+        for i in range(0, len(lease_ids), IN_CHUNK_SIZE):
+            chunk = lease_ids[i:i + IN_CHUNK_SIZE]
+            select = sa.select(columns, table.c.lease_id.in_(chunk))
+            for row in session.execute(select):
+                child = row_type(row)
+                getattr(leases_by_id[child.lease_id], attr).append(child)
+    return leases
 
 
 def lease_get_all():
-    query = model_query(models.Lease, get_session())
-    return query.all()
+    session = get_session()
+    return _lease_rows(session, _lease_rows_query(session))
 
 
 def lease_get_all_by_tenant(tenant_id):
-    raise NotImplementedError
+    session = get_session()
+    query = _lease_rows_query(session).filter_by(tenant_id=tenant_id)
+    return _lease_rows(session, query)
 
 
 def lease_get_all_by_user(user_id):
-    raise NotImplementedError
+    session = get_session()
+    query = _lease_rows_query(session).filter_by(user_id=user_id)
+    return _lease_rows(session, query)
+
+
+def lease_version(lease_id):
+    """Return the version of the lease, None if it does not exist.
+
+    The version is bumped by every write of the lease, of its reservations
+    and of its events. It is read without loading the lease.
+    """
+    version = column_query(models.Lease.version).filter(
+        models.Lease.id == lease_id).first()
+    return version[0] if version is not None else None
+
+
+def lease_list(children=True):
+    return _lease_query(get_session(), children).all()
+
+
+LEASE_SORT_KEYS = ['created_at', 'id']
+
+
+# Number of leases read by each query of lease_iter_by_filters()
+LEASE_ITER_CHUNK_SIZE = IN_CHUNK_SIZE
+
+
+def _lease_filters_query(session, filters, fields):
+    """Return the query of the leases matching filters, not paginated.
+
+    If fields is set, only these columns are selected, followed by the
+    LEASE_SORT_KEYS not in fields, for the pagination.
+    """
+    if fields:
+        columns = models.Lease.__table__.columns
+        unknown = [f for f in fields if f not in columns]
+        if unknown:
+            raise exceptions.InvalidInput(
+                'unknown lease fields %s' % ', '.join(unknown))
+        names = fields + [k for k in LEASE_SORT_KEYS if k not in fields]
+        query = column_query(*[getattr(models.Lease, f) for f in names],
+                             session=session)
+    else:
+        query = _lease_rows_query(session)
+
+    for key in ('name', 'tenant_id', 'user_id'):
+        if key in filters:
+            query = query.filter(getattr(models.Lease, key) == filters[key])
+    if 'status' in filters:
+        query = query.filter(
+            models.Lease.reservations.any(status=filters['status']))
+    if filters.get('start_date') is not None:
+        query = query.filter(models.Lease.end_date > filters['start_date'])
+    if filters.get('end_date') is not None:
+        query = query.filter(models.Lease.start_date < filters['end_date'])
+    return query
+
+
+def _lease_fields(fields):
+    """Return the lease fields to read, the ID first."""
+    if not fields:
+        return None
+    fields = list(fields)
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
 
+def _lease_marker(session, marker):
+    """Return the sort keys of the marker lease, given by its ID."""
+    if marker is None:
+        return None
+    marker_query = column_query(
+        *[getattr(models.Lease, key) for key in LEASE_SORT_KEYS],
+        session=session)
+    marker = marker_query.filter(models.Lease.id == marker).first()
+    if marker is None:
+        raise exceptions.InvalidInput('marker lease not found')
+    return marker
 
-def lease_list():
-    return model_query(models.Lease, get_session()).all()
+
+def _lease_page(session, query, fields, limit, marker):
+    """Return the page of leases of query following marker.
+
+    The last row read is returned too, as the marker of the next page.
+    """
+    query = db_utils.paginate_query(query, models.Lease, limit,
+                                    LEASE_SORT_KEYS, marker=marker)
+
+    if not fields:
+        leases = _lease_rows(session, query)
+        return leases, leases[-1] if leases else None
+
+    leases = []
+    row = None
+    for row in session.execute(query.statement):
+        lease = dict(zip(fields, row))
+        mb.datetime_to_str(lease, 'created_at')
+        mb.datetime_to_str(lease, 'updated_at')
+        leases.append(lease)
+    return leases, row
+
+
+def lease_get_all_by_filters(filters=None, limit=None, marker=None,
+                             fields=None):
+    """Return a page of leases matching filters, oldest first.
+
+    :param filters: dict which may contain 'name', 'tenant_id', 'user_id',
+                    'status' (status of one of the lease reservations), and
+                    'start_date' / 'end_date' to only get leases overlapping
+                    this window.
+    :param limit: maximum number of leases to return.
+    :param marker: ID of the last lease of the previous page.
+    :param fields: names of the lease columns to return. If set, only these
+                   columns are read and leases are returned as dicts.
+    """
+    session = get_session()
+    fields = _lease_fields(fields)
+    query = _lease_filters_query(session, filters or {}, fields)
+    marker = _lease_marker(session, marker)
+    return _lease_page(session, query, fields, limit, marker)[0]
+
+
+def lease_iter_by_filters(filters=None, limit=None, marker=None,
+                          fields=None):
+    """Return an iterator on a page of leases matching filters.
+
+    Like lease_get_all_by_filters(), but leases are read by chunks of
+    LEASE_ITER_CHUNK_SIZE, each chunk starting after the last lease of the
+    previous one, so that a page is never held in memory at once. The
+    first chunk is read right away, so that invalid filters and DB errors
+    are raised by this call; the next ones are read with a session got
+    while the iterator is consumed.
+    """
+    session = get_session()
+    fields = _lease_fields(fields)
+    filters = filters or {}
+    query = _lease_filters_query(session, filters, fields)
+    marker = _lease_marker(session, marker)
+
+    def _chunk_size(read):
+        if limit is None:
+            return LEASE_ITER_CHUNK_SIZE
+        return min(limit - read, LEASE_ITER_CHUNK_SIZE)
+
+    leases, marker = _lease_page(session, query, fields, _chunk_size(0),
+                                 marker)
+
+    def _iter(leases, marker):
+        read = 0
+        while True:
+            for lease in leases:
+                yield lease
+            read += len(leases)
+            if len(leases) < LEASE_ITER_CHUNK_SIZE or not _chunk_size(read):
+                return
+            session = get_session()
+            query = _lease_filters_query(session, filters, fields)
+            leases, marker = _lease_page(session, query, fields,
+                                         _chunk_size(read), marker)
+
+    return _iter(leases, marker)
 
 
 def lease_create(values):
@@ -226,44 +642,208 @@ def lease_create(values):
     events = values.pop("events", [])
     lease.update(values)
 
+    # NOTE: children are attached to the lease so that they are flushed
+    # along with it and that the returned lease holds them without having
+    # to be read again from the DB.
+    lease.reservations = []
+    for r in reservations:
+        reservation = models.Reservation()
+        reservation.update(r)
+        lease.reservations.append(reservation)
+
+    lease.events = []
+    for e in events:
+        event = models.Event()
+        event.update(e)
+        lease.events.append(event)
+
     session = get_session()
     with session.begin():
         try:
             lease.save(session=session)
+        except db_exc.DBDuplicateEntry as e:
+            # raise exception about duplicated columns (e.columns)
+            raise RuntimeError("DBDuplicateEntry: %s" % e.columns)
+        _refresh_db_generated(session, lease)
+
+    _index_lease(lease)
+    return lease
 
-            for r in reservations:
-                reservation = models.Reservation()
-                reservation.update({"lease_id": lease.id})
-                reservation.update(r)
-                reservation.save(session=session)
 
-            for e in events:
-                event = models.Event()
-                event.update({"lease_id": lease.id})
-                event.update(e)
-                event.save(session=session)
+def _bulk_rows(model, values_list, now):
+    """Return values_list as rows suitable for an executemany() INSERT.
 
+    All the rows of an executemany() share the same columns, so that every
+    row gets an ID and a creation date here and None for the columns set in
+    other rows only.
+    """
+    columns = set(['id', 'created_at'])
+    for values in values_list:
+        columns.update(values)
+    columns &= set(model.__table__.columns.keys())
+
+    rows = []
+    for values in values_list:
+        row = dict((col, values.get(col)) for col in columns)
+        row['id'] = row['id'] or unicode(uuidutils.generate_uuid())
+        row['created_at'] = row['created_at'] or now
+        rows.append(row)
+    return rows
+
+
+def _lock_resources(session, resource_ids):
+    """Keep other transactions from reserving resources until the end of
+    the transaction.
+
+    PostgreSQL takes transaction advisory locks on the resources, in a
+    fixed order. MySQL locks the index entries and gaps of their
+    reservations by a locking read, which blocks the INSERTs of other
+    reservations of these resources. SQLite only has one writing
+    transaction at a time.
+    """
+    dialect = session.bind.dialect.name
+    if dialect == 'postgresql':
+        for resource_id in sorted(resource_ids):
+            session.execute(sa.select([sa.func.pg_advisory_xact_lock(
+                sa.func.hashtext(resource_id))]))
+    elif dialect == 'mysql':
+        reservations = models.Reservation.__table__
+        session.execute(sa.select(
+            [reservations.c.id],
+            reservations.c.resource_id.in_(sorted(resource_ids)),
+            for_update=True))
+
+
+def _check_resources_free(session, leases, reservations):
+    """Raise ResourceBusy if reservations reserve a resource already reserved
+    during their lease, by another lease or by one of them.
+
+    The periods reserved for the resources during the window of all the
+    leases are read by one query per IN_CHUNK_SIZE resources, and the
+    reservations are then checked in memory.
+    """
+    leases_by_id = dict((lease['id'], lease) for lease in leases)
+    start_date = min(lease['start_date'] for lease in leases)
+    end_date = max(lease['end_date'] for lease in leases)
+    resource_ids = sorted(set(r['resource_id'] for r in reservations))
+
+    reserved = intervals.IntervalIndex()
+    for i in range(0, len(resource_ids), IN_CHUNK_SIZE):
+        query = column_query(models.Reservation.resource_id,
+                             models.Lease.start_date,
+                             models.Lease.end_date,
+                             models.Lease.id,
+                             session=session).filter(
+            models.Reservation.lease_id == models.Lease.id).filter(
+            models.Reservation.resource_id.in_(
+                resource_ids[i:i + IN_CHUNK_SIZE])).filter(
+            models.Lease.start_date < end_date).filter(
+            models.Lease.end_date > start_date)
+        for resource_id, lease_start, lease_end, lease_id in query:
+            reserved.add(resource_id, lease_start, lease_end, lease_id)
+
+    for r in reservations:
+        lease = leases_by_id[r['lease_id']]
+        if reserved.overlapping(r['resource_id'], lease['start_date'],
+                                lease['end_date']):
+            raise exceptions.ResourceBusy(
+                '%s is already reserved between %s and %s' %
+                (r['resource_id'], lease['start_date'], lease['end_date']))
+        reserved.add(r['resource_id'], lease['start_date'],
+                     lease['end_date'], lease['id'])
+
+
+def lease_create_bulk(values_list, check_resources=False):
+    """Create leases along with their reservations and events.
+
+    Leases, reservations and events are each inserted by a single
+    executemany() INSERT, all in one transaction.
+
+    :param check_resources: raise ResourceBusy if a resource would be
+                            reserved twice at the same time. The check is
+                            made in the transaction of the INSERTs, with the
+                            resources locked, so that concurrent calls can
+                            not both reserve a resource.
+    :returns: IDs of the created leases, in the order of values_list.
+    """
+    now = timeutils.utcnow()
+    leases = _bulk_rows(models.Lease, values_list, now)
+    reservations = []
+    events = []
+    for lease, values in zip(leases, values_list):
+        for r in values.get('reservations', []):
+            reservations.append(dict(r, lease_id=lease['id']))
+        for e in values.get('events', []):
+            events.append(dict(e, lease_id=lease['id']))
+    reservations = _bulk_rows(models.Reservation, reservations, now)
+    events = _bulk_rows(models.Event, events, now)
+
+    session = get_session()
+    with session.begin():
+        if check_resources and reservations:
+            _lock_resources(session,
+                            set(r['resource_id'] for r in reservations))
+            _check_resources_free(session, leases, reservations)
+        try:
+            for model, rows in ((models.Lease, leases),
+                                (models.Reservation, reservations),
+                                (models.Event, events)):
+                if rows:
+                    session.execute(model.__table__.insert(), rows)
         except db_exc.DBDuplicateEntry as e:
             # raise exception about duplicated columns (e.columns)
             raise RuntimeError("DBDuplicateEntry: %s" % e.columns)
 
-    return lease_get(lease.id)
-
+    if _RESOURCE_INDEXES:
+        _RESOURCE_TIMELINES.clear()
+        leases_by_id = dict((lease['id'], lease) for lease in leases)
+        for r in reservations:
+            if r.get('resource_type') not in _RESOURCE_INDEXES:
+                continue
+            lease = leases_by_id[r['lease_id']]
+            _built_at, index = _RESOURCE_INDEXES[r['resource_type']]
+            index.add(r['resource_id'], lease['start_date'],
+                      lease['end_date'], lease['id'])
 
-def lease_update(lease_id, values):
-    session = get_session()
+    return [lease['id'] for lease in leases]
 
-    with session.begin():
-        lease = _lease_get(session, lease_id)
-        lease.update(values)
-        lease.save(session=session)
 
-    return lease_get(lease_id)
+def lease_update(lease_id, values, version=None):
+    """Update the lease and bump its version.
 
+    With a version, the lease is only updated if it still has this version
+    at the time of the UPDATE, and ConstraintNotMet is raised otherwise.
+    """
+    session = get_session()
 
-def lease_destroy(lease_id):
+    with session.begin():
+        query = model_query(models.Lease, session).filter_by(id=lease_id)
+        if version is not None:
+            query = query.filter_by(version=version)
+        values = dict(values, version=models.Lease.version + 1,
+                      updated_at=timeutils.utcnow())
+        if not query.update(values, synchronize_session=False):
+            if version is not None:
+                raise exceptions.ConstraintNotMet()
+            raise exceptions.NotFound({'id': lease_id},
+                                      template='Lease with %s not found')
+        lease = _lease_query(session).populate_existing().filter_by(
+            id=lease_id).first()
+
+    _index_lease(lease)
+    return lease
+
+
+def lease_destroy(lease_id, version=None):
+    """Delete the lease along with its children.
+
+    With a version, the lease is only deleted if it still has this version,
+    and ConstraintNotMet is raised otherwise.
+    """
     session = get_session()
     with session.begin():
+        if version is not None:
+            _lease_bump_version(session, [lease_id], version)
         lease = _lease_get(session, lease_id)
 
         if not lease:
@@ -272,6 +852,34 @@ def lease_destroy(lease_id):
 
         session.delete(lease)
 
+    _unindex_lease(lease_id)
+
+
+def _lease_ids_overlapping(session, resource_id, start_date, end_date):
+    query = column_query(models.Lease.id, models.Lease.start_date,
+                         session=session).filter(
+        models.Reservation.lease_id == models.Lease.id).filter(
+        models.Reservation.resource_id == resource_id).filter(
+        models.Lease.start_date < end_date).filter(
+        models.Lease.end_date > start_date)
+    return [lease_id for lease_id, _start_date in
+            query.distinct().order_by(models.Lease.start_date)]
+
+
+def lease_ids_overlapping(resource_id, start_date, end_date):
+    """Return IDs of leases reserving resource during [start, end).
+
+    They are read from the DB and not from resource_index(), which may be
+    stale, so that a resource is never given to two leases at once.
+    """
+    return _lease_ids_overlapping(get_session(), resource_id, start_date,
+                                  end_date)
+
+
+def resource_is_free(resource_id, start_date, end_date):
+    """Check no lease reserves resource during [start, end)."""
+    return not lease_ids_overlapping(resource_id, start_date, end_date)
+
 
 #Event
 def _event_get(session, event_id):
@@ -292,8 +900,14 @@ def event_get_all():
     return _event_get_all(get_session()).all()
 
 
-def event_get_all_sorted_by_filters(sort_key, sort_dir, filters):
-    """Return events filtered and sorted by name of the field."""
+def event_get_all_sorted_by_filters(sort_key, sort_dir, filters, limit=None):
+    """Return events filtered and sorted by name of the field.
+
+    Besides 'status', filters may bound the event time with a
+    {'op': <lt, le, gt, ge or eq>, 'border': <datetime>} 'time' filter,
+    and restrict events to a list of 'partitions' of their lease.
+    With limit, at most limit events are returned.
+    """
 
     sort_fn = {'desc': desc, 'asc': asc}
 
@@ -303,10 +917,24 @@ def event_get_all_sorted_by_filters(sort_key, sort_dir, filters):
         events_query = \
             events_query.filter(models.Event.status == filters['status'])
 
+    if 'partitions' in filters:
+        events_query = events_query.filter(
+            models.Event.partition.in_(filters['partitions']))
+
+    if 'time' in filters:
+        time_op = {'lt': operator.lt, 'le': operator.le,
+                   'gt': operator.gt, 'ge': operator.ge,
+                   'eq': operator.eq}[filters['time']['op']]
+        events_query = events_query.filter(
+            time_op(models.Event.time, filters['time']['border']))
+
     events_query = events_query.order_by(
         sort_fn[sort_dir](getattr(models.Event, sort_key))
     )
 
+    if limit is not None:
+        events_query = events_query.limit(limit)
+
     return events_query.all()
 
 
@@ -326,19 +954,39 @@ def event_create(values):
         except db_exc.DBDuplicateEntry as e:
             # raise exception about duplicated columns (e.columns)
             raise RuntimeError("DBDuplicateEntry: %s" % e.columns)
+        _refresh_db_generated(session, event)
+        _lease_bump_version(session, [event.lease_id])
+
+    return event
 
-    return event_get(event.id)
 
+def event_update(event_id, values, constraint=None):
+    """Update the event.
 
-def event_update(event_id, values):
+    With a constraint, the event is only updated if it matches the
+    constraint at the time of the UPDATE, and ConstraintNotMet is raised
+    otherwise. It allows to safely change the event status from concurrent
+    processes.
+    """
     session = get_session()
 
     with session.begin():
-        event = _event_get(session, event_id)
-        event.update(values)
-        event.save(session=session)
+        if constraint is not None:
+            query = model_query(models.Event, session).filter_by(id=event_id)
+            values = dict(values, updated_at=timeutils.utcnow())
+            if not constraint.apply(models.Event, query).update(
+                    values, synchronize_session=False):
+                raise exceptions.ConstraintNotMet()
+            event = model_query(models.Event, session).populate_existing(
+            ).filter_by(id=event_id).first()
+        else:
+            event = _event_get(session, event_id)
+            event.update(values)
+            event.save(session=session)
+            _refresh_db_generated(session, event)
+        _lease_bump_version(session, [event.lease_id])
 
-    return event_get(event_id)
+    return event
 
 
 def event_destroy(event_id):
@@ -351,3 +999,236 @@ def event_destroy(event_id):
             raise RuntimeError("Event not found!")
 
         session.delete(event)
+        _lease_bump_version(session, [event.lease_id])
+
+
+class _SelectSkipLocked(expression.Select):
+    """SELECT ... FOR UPDATE SKIP LOCKED, for MySQL and PostgreSQL."""
+
+
+@compiler.compiles(_SelectSkipLocked)
+def _compile_select_skip_locked(element, compiler, **kw):
+    return compiler.visit_select(element, **kw) + ' SKIP LOCKED'
+
+
+def _event_due_clauses(now, partitions):
+    clauses = [models.Event.status == 'UNDONE', models.Event.time <= now]
+    if partitions is not None:
+        clauses.append(models.Event.partition.in_(partitions))
+    return sa.and_(*clauses)
+
+
+def _event_claim_skip_locked(session, now, limit, partitions, values):
+    """Claim due events, skipping the ones other workers are claiming."""
+    events = models.Event.__table__
+    select = _SelectSkipLocked([events.c.id],
+                               _event_due_clauses(now, partitions),
+                               order_by=[events.c.time], limit=limit,
+                               for_update=True)
+    claimed = [event_id for event_id, in session.execute(select)]
+    if claimed:
+        model_query(models.Event, session).filter(
+            models.Event.id.in_(claimed)).update(
+            values, synchronize_session=False)
+    return claimed
+
+
+def _event_claim_cas(session, now, limit, partitions, values):
+    """Claim due events by compare-and-swap on their version.
+
+    Used where SKIP LOCKED is not available. An event already claimed by
+    another worker since it was read has a new version, so that it is not
+    updated again here.
+    """
+    candidates = column_query(models.Event.id, models.Event.version,
+                              session=session).filter(
+        _event_due_clauses(now, partitions)).order_by(
+        models.Event.time).limit(limit).all()
+
+    claimed = []
+    for event_id, version in candidates:
+        if model_query(models.Event, session).filter_by(
+                id=event_id, version=version, status='UNDONE').update(
+                values, synchronize_session=False):
+            claimed.append(event_id)
+    return claimed
+
+
+def event_claim_due(limit, worker_id, partitions=None):
+    """Move up to limit due events from UNDONE to IN_PROGRESS for worker_id.
+
+    Events are claimed soonest first, each one by a single worker. On MySQL
+    and PostgreSQL, due events are locked with SELECT ... FOR UPDATE SKIP
+    LOCKED, so that concurrent workers claim other events instead of
+    waiting for the locks. Elsewhere, events are claimed by compare-and-swap
+    on their version column.
+
+    :param partitions: only claim events of these lease partitions.
+    :returns: the claimed events, soonest first.
+    """
+    if partitions is not None and not partitions:
+        return []
+
+    now = timeutils.utcnow()
+    values = {'status': 'IN_PROGRESS', 'worker_id': worker_id,
+              'version': models.Event.version + 1, 'updated_at': now}
+
+    session = get_session()
+    with session.begin():
+        if session.bind.dialect.name in ('mysql', 'postgresql'):
+            claim = _event_claim_skip_locked
+        else:
+            claim = _event_claim_cas
+        claimed = claim(session, now, limit, partitions, values)
+        if not claimed:
+            return []
+        _lease_bump_version(session, sa.select(
+            [models.Event.lease_id], models.Event.id.in_(claimed)))
+
+        return model_query(models.Event, session).populate_existing().filter(
+            models.Event.id.in_(claimed)).order_by(models.Event.time).all()
+
+
+def event_count_due(partitions=None):
+    """Return the number of due events not claimed yet, by event type.
+
+    :param partitions: only count events of these lease partitions.
+    """
+    if partitions is not None and not partitions:
+        return {}
+
+    query = column_query(models.Event.event_type,
+                         sa.func.count(models.Event.id)).filter(
+        _event_due_clauses(timeutils.utcnow(), partitions)).group_by(
+        models.Event.event_type)
+    return dict(query.all())
+
+
+def event_reclaim(timeout, live_workers=None):
+    """Give the IN_PROGRESS events of dead workers back to UNDONE.
+
+    Events claimed more than timeout seconds ago are reclaimed, and, if
+    live_workers is set, events claimed by any other worker too.
+
+    :returns: the number of reclaimed events.
+    """
+    now = timeutils.utcnow()
+    stale = [models.Event.updated_at <
+             now - datetime.timedelta(seconds=timeout)]
+    if live_workers:
+        stale.append(sa.not_(models.Event.worker_id.in_(live_workers)))
+
+    reclaimed = sa.and_(models.Event.status == 'IN_PROGRESS',
+                        sa.or_(*stale))
+
+    session = get_session()
+    with session.begin():
+        _lease_bump_version(session, sa.select([models.Event.lease_id],
+                                               reclaimed))
+        return model_query(models.Event, session).filter(reclaimed).update(
+            {'status': 'UNDONE', 'worker_id': None,
+             'version': models.Event.version + 1, 'updated_at': now},
+            synchronize_session=False)
+
+
+#ComputeHosts
+def _host_get(session, host_id):
+    query = model_query(models.ComputeHost, session)
+    return query.filter_by(id=host_id).first()
+
+
+def host_get(host_id):
+    return _host_get(get_session(), host_id)
+
+
+def host_get_all():
+    return model_query(models.ComputeHost, get_session()).all()
+
+
+def host_count():
+    return model_query(models.ComputeHost, get_session()).count()
+
+
+def host_get_all_by_queries(queries):
+    """Return the hosts matching all the queries on their capabilities.
+
+    Terms of the queries on host columns are run in SQL, the ones on host
+    properties are checked on the resulting hosts.
+    """
+    compiled = [host_query.compile_query(q) for q in queries]
+    hosts_query = model_query(models.ComputeHost, get_session())
+    for q in compiled:
+        for clause in q.clauses(models.ComputeHost):
+            hosts_query = hosts_query.filter(clause)
+
+    return [host for host in hosts_query.all()
+            if all(q.matches_properties(host) for q in compiled)]
+
+
+def host_create(values):
+    values = values.copy()
+    host = models.ComputeHost()
+    host.update(values)
+
+    session = get_session()
+    with session.begin():
+        try:
+            host.save(session=session)
+        except db_exc.DBDuplicateEntry as e:
+            # raise exception about duplicated columns (e.columns)
+            raise RuntimeError("DBDuplicateEntry: %s" % e.columns)
+        _refresh_db_generated(session, host)
+
+    return host
+
+
+def host_update(host_id, values):
+    session = get_session()
+
+    with session.begin():
+        host = _host_get(session, host_id)
+        host.update(values)
+        host.save(session=session)
+        _refresh_db_generated(session, host)
+
+    return host
+
+
+def host_destroy(host_id):
+    session = get_session()
+    with session.begin():
+        host = _host_get(session, host_id)
+
+        if not host:
+            # raise not found error
+            raise RuntimeError("Host not found!")
+
+        session.delete(host)
+
+
+#Scheduler workers
+def scheduler_worker_heartbeat(worker_id):
+    session = get_session()
+    with session.begin():
+        worker = model_query(models.SchedulerWorker, session).filter_by(
+            id=worker_id).first()
+        if not worker:
+            worker = models.SchedulerWorker()
+            worker.id = worker_id
+        worker.heartbeat_at = timeutils.utcnow()
+        worker.save(session=session)
+
+
+def scheduler_worker_get_all_alive(ttl):
+    """Return IDs of the workers whose heartbeat is at most ttl s old."""
+    since = timeutils.utcnow() - datetime.timedelta(seconds=ttl)
+    query = column_query(models.SchedulerWorker.id).filter(
+        models.SchedulerWorker.heartbeat_at >= since)
+    return [worker_id for worker_id, in query.all()]
+
+
+def scheduler_worker_destroy(worker_id):
+    session = get_session()
+    with session.begin():
+        model_query(models.SchedulerWorker, session).filter_by(
+            id=worker_id).delete()
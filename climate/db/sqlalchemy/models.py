@@ -17,7 +17,9 @@ import sqlalchemy as sa
 from sqlalchemy.orm import relationship
 
 from climate.db.sqlalchemy import model_base as mb
+from climate.db.sqlalchemy import types as st
 from climate.openstack.common import uuidutils
+from climate.utils import partitions
 
 
 ## Helpers
@@ -26,6 +28,14 @@ def _generate_unicode_uuid():
     return unicode(uuidutils.generate_uuid())
 
 
+def _lease_partition(context):
+    lease_id = context.current_parameters.get('lease_id')
+    if lease_id is None:
+        # Events without a lease all belong to the first partition
+        return 0
+    return partitions.partition_of(lease_id)
+
+
 def _id_column():
     return sa.Column(sa.String(36),
                      primary_key=True,
@@ -41,17 +51,25 @@ class Lease(mb.ClimateBase):
 
     __table_args__ = (
         sa.UniqueConstraint('name'),
+        sa.Index('leases_tenant_id_start_date_end_date_idx',
+                 'tenant_id', 'start_date', 'end_date'),
+        sa.Index('leases_user_id_idx', 'user_id'),
     )
 
     id = _id_column()
     name = sa.Column(sa.String(80), nullable=False)
+    tenant_id = sa.Column(sa.String(255))
+    user_id = sa.Column(sa.String(255))
     start_date = sa.Column(sa.DateTime, nullable=False)
     end_date = sa.Column(sa.DateTime, nullable=False)
     trust = sa.Column(sa.String(36), nullable=False)
+    # Bumped by every write of the lease or of its children, for its ETag
+    # and compare-and-swap updates
+    version = sa.Column(sa.Integer, nullable=False, default=0)
     reservations = relationship('Reservation', cascade="all,delete",
-                                backref='lease', lazy='joined')
+                                backref='lease', lazy='subquery')
     events = relationship('Event', cascade="all,delete",
-                          backref='lease', lazy='joined')
+                          backref='lease', lazy='subquery')
 
     def to_dict(self):
         d = super(Lease, self).to_dict()
@@ -65,6 +83,11 @@ class Reservation(mb.ClimateBase):
 
     __tablename__ = 'reservations'
 
+    __table_args__ = (
+        sa.Index('reservations_resource_id_lease_id_idx',
+                 'resource_id', 'lease_id'),
+    )
+
     id = _id_column()
     lease_id = sa.Column(sa.String(36),
                          sa.ForeignKey('leases.id'),
@@ -82,11 +105,54 @@ class Event(mb.ClimateBase):
 
     __tablename__ = 'events'
 
+    __table_args__ = (
+        sa.Index('events_status_time_idx', 'status', 'time'),
+    )
+
     id = _id_column()
     lease_id = sa.Column(sa.String(36), sa.ForeignKey('leases.id'))
     event_type = sa.Column(sa.String(66))
     time = sa.Column(sa.DateTime)
     status = sa.Column(sa.String(13))
+    partition = sa.Column(sa.Integer, default=_lease_partition)
+    # Bumped by every claim of the event, for compare-and-swap updates
+    version = sa.Column(sa.Integer, nullable=False, default=0)
+    worker_id = sa.Column(sa.String(255))
 
     def to_dict(self):
         return super(Event, self).to_dict()
+
+
+## Inventory
+
+class ComputeHost(mb.ClimateBase):
+    """A Nova hypervisor, as last synchronized from Nova."""
+
+    __tablename__ = 'computehosts'
+
+    __table_args__ = (
+        sa.UniqueConstraint('hypervisor_hostname'),
+        sa.Index('computehosts_vcpus_memory_mb_idx', 'vcpus', 'memory_mb'),
+    )
+
+    id = _id_column()
+    hypervisor_id = sa.Column(sa.String(36))
+    hypervisor_hostname = sa.Column(sa.String(255), nullable=False)
+    vcpus = sa.Column(sa.Integer, nullable=False)
+    memory_mb = sa.Column(sa.Integer, nullable=False)
+    local_gb = sa.Column(sa.Integer, nullable=False)
+    properties = sa.Column(st.JsonEncoded)
+
+    def to_dict(self):
+        return super(ComputeHost, self).to_dict()
+
+
+## Scheduler
+
+class SchedulerWorker(mb.ClimateBase):
+    """A live scheduler worker, as long as its heartbeat is recent."""
+
+    __tablename__ = 'scheduler_workers'
+
+    id = sa.Column(sa.String(255), primary_key=True)
+    heartbeat_at = sa.Column(sa.DateTime, nullable=False)
@@ -0,0 +1,79 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Read-only rows of leases, reservations and events.
+
+Rows are built from the results of Core SELECTs: unlike the models, they
+have no instance state and are not tracked by a session, which makes them
+much cheaper to load for listings. They offer the same dict-like access and
+to_dict() as the models.
+"""
+
+from climate.db.sqlalchemy import model_base as mb
+from climate.db.sqlalchemy import models
+
+
+def _columns(model):
+    return tuple(column.name for column in model.__table__.columns)
+
+
+class Row(object):
+    """Base class of the rows, holding one attribute per column."""
+
+    __slots__ = ()
+    columns = ()
+
+    def __init__(self, values):
+        """Build a row from the column values, in the order of columns."""
+        for name, value in zip(self.columns, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        d = dict((name, getattr(self, name)) for name in self.columns)
+        mb.datetime_to_str(d, 'created_at')
+        mb.datetime_to_str(d, 'updated_at')
+        return d
+
+
+class ReservationRow(Row):
+    columns = _columns(models.Reservation)
+    __slots__ = columns
+
+
+class EventRow(Row):
+    columns = _columns(models.Event)
+    __slots__ = columns
+
+
+class LeaseRow(Row):
+    columns = _columns(models.Lease)
+    __slots__ = columns + ('reservations', 'events')
+
+    def __init__(self, values):
+        super(LeaseRow, self).__init__(values)
+        self.reservations = []
+        self.events = []
+
+    def to_dict(self):
+        d = super(LeaseRow, self).to_dict()
+        d['reservations'] = [r.to_dict() for r in self.reservations]
+        d['events'] = [e.to_dict() for e in self.events]
+        return d
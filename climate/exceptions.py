@@ -48,3 +48,27 @@ class NotFound(ClimateException):
 
     def __init__(self, *args, **kwargs):
         super(NotFound, self).__init__(*args, **kwargs)
+
+
+class InvalidInput(ClimateException):
+    """Invalid input exception."""
+    template = "Invalid input: %s"
+    code = "INVALID_INPUT"
+
+
+class ResourceBusy(ClimateException):
+    """Resource already reserved during the period exception."""
+    template = "Resource busy: %s"
+    code = "RESOURCE_BUSY"
+
+
+class ConfigurationError(ClimateException):
+    """Invalid configuration option exception."""
+    template = "Invalid configuration: %s"
+    code = "CONFIGURATION_ERROR"
+
+
+class ConstraintNotMet(ClimateException):
+    """Constraint of a conditional update not met exception."""
+    template = "Constraint not met"
+    code = "CONSTRAINT_NOT_MET"
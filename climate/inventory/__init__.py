@@ -29,3 +29,14 @@ class Plugin(object):
     @abc.abstractmethod
     def get_host_details(self, host):
         """Get host details."""
+
+    def get_hosts_details(self, hosts):
+        """Get details of several hosts, keyed by host."""
+        return dict((host, self.get_host_details(host)) for host in hosts)
+
+    def list_aggregates(self):
+        """List host aggregates, with their name, hosts and metadata."""
+        return []
+
+    def invalidate(self, host=None):
+        """Forget what is known about host, or about all hosts."""
@@ -0,0 +1,115 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Process-wide pool of OpenStack clients shared by inventory plugins.
+
+One client is kept per set of credentials. A client authenticates once and
+keeps its token and its HTTP connections (a requests session) between
+calls, so that plugins do not pay for an authentication per instance.
+"""
+
+import os
+import threading
+
+from novaclient import client
+from oslo.config import cfg
+
+from climate.openstack.common import log as logging
+from climate.openstack.common import timeutils
+
+
+CLI_OPTIONS = [
+    cfg.StrOpt('os-username',
+               default=os.environ.get('OS_USERNAME', 'climate'),
+               help='Username to use for OpenStack service access'),
+    cfg.StrOpt('os-password',
+               default=os.environ.get('OS_PASSWORD', 'admin'),
+               help='Password to use for OpenStack service access'),
+    cfg.StrOpt('os-tenant-id',
+               default=os.environ.get('OS_TENANT_ID', ''),
+               help='Tenant ID to use for OpenStack service access'),
+    cfg.StrOpt('os-tenant-name',
+               default=os.environ.get('OS_TENANT_NAME', 'admin'),
+               help='Tenant name to use for OpenStack service access'),
+    cfg.StrOpt('os-auth-url',
+               default=os.environ.get('OS_AUTH_URL',
+                                      'http://localhost:5000/v2.0'),
+               help='Auth URL to use for openstack service access'),
+]
+cfg.CONF.register_cli_opts(CLI_OPTIONS)
+
+opts = [
+    cfg.IntOpt('inventory_token_refresh_margin',
+               default=300,
+               help='Number of seconds before its expiration a token of '
+                    'the inventory clients is renewed'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+LOG = logging.getLogger(__name__)
+
+_CLIENTS = {}
+_LOCK = threading.Lock()
+
+
+def _token_expires_at(nova):
+    """Return when the token of the client expires, None if unknown."""
+    catalog = getattr(nova.client, 'service_catalog', None)
+    try:
+        expires = catalog.catalog['access']['token']['expires']
+    except (AttributeError, KeyError, TypeError):
+        return None
+    return timeutils.normalize_time(timeutils.parse_isotime(expires))
+
+
+def _renew_token_if_needed(nova):
+    if nova.client.auth_token is None:
+        # Not authenticated yet, it happens on the first request
+        return
+
+    expires_at = _token_expires_at(nova)
+    if expires_at is None:
+        return
+    if timeutils.is_soon(expires_at, CONF.inventory_token_refresh_margin):
+        LOG.debug('Renewing the inventory token expiring at %s', expires_at)
+        nova.client.authenticate()
+
+
+def get_novaclient(username=None, password=None, tenant=None,
+                   auth_url=None):
+    """Return the shared novaclient for the credentials.
+
+    Credentials default to the os-* options.
+    """
+    key = (username or CONF.os_username,
+           password or CONF.os_password,
+           tenant or CONF.os_tenant_name or CONF.os_tenant_id,
+           auth_url or CONF.os_auth_url)
+
+    with _LOCK:
+        nova = _CLIENTS.get(key)
+        if nova is None:
+            nova = client.Client("2", username=key[0], api_key=key[1],
+                                 project_id=key[2], auth_url=key[3])
+            _CLIENTS[key] = nova
+
+    _renew_token_if_needed(nova)
+    return nova
+
+
+def reset():
+    """Forget all the clients."""
+    with _LOCK:
+        _CLIENTS.clear()
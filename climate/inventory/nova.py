@@ -14,47 +14,118 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import os
-
-from novaclient import client
+from novaclient import base
 from oslo.config import cfg
 
 from climate import inventory
+from climate.inventory import clients
+from climate.openstack.common import timeutils
 
 
-CLI_OPTIONS = [
-    cfg.StrOpt('os-username',
-               default=os.environ.get('OS_USERNAME', 'climate'),
-               help='Username to use for OpenStack service access'),
-    cfg.StrOpt('os-password',
-               default=os.environ.get('OS_PASSWORD', 'admin'),
-               help='Password to use for OpenStack service access'),
-    cfg.StrOpt('os-tenant-id',
-               default=os.environ.get('OS_TENANT_ID', ''),
-               help='Tenant ID to use for OpenStack service access'),
-    cfg.StrOpt('os-tenant-name',
-               default=os.environ.get('OS_TENANT_NAME', 'admin'),
-               help='Tenant name to use for OpenStack service access'),
-    cfg.StrOpt('os-auth-url',
-               default=os.environ.get('OS_AUTH_URL',
-                                      'http://localhost:5000/v2.0'),
-               help='Auth URL to use for openstack service access'),
+OPTIONS = [
+    cfg.IntOpt('inventory_cache_ttl',
+               default=300,
+               help='Number of seconds the hosts fetched from Nova are '
+                    'cached'),
 ]
-cfg.CONF.register_cli_opts(CLI_OPTIONS)
+cfg.CONF.register_opts(OPTIONS)
 
 
 class NovaInventory(inventory.Plugin):
+    """Inventory of the Nova hypervisors.
+
+    The novaclient is shared with the other plugins using the same
+    credentials, and is got again for every call, so that its token is
+    renewed before it expires even for long-lived inventories. Hypervisors
+    are cached for inventory_cache_ttl seconds, and so are aggregates.
+    Their list is fetched along with their details, so that the details of
+    many hosts come from one API call instead of one per host.
+    """
+
+    def __init__(self, cache_ttl=None):
+        if cache_ttl is None:
+            cache_ttl = cfg.CONF.inventory_cache_ttl
+        self.cache_ttl = cache_ttl
+        self._hosts = None
+        self._hosts_expire_at = 0
+        # Details of hypervisors and their expiration time, keyed by ID
+        self._details = {}
+        # Expiration time of the IDs not found in the list, keyed by ID
+        self._unknown = {}
+        self._aggregates = None
+        self._aggregates_expire_at = 0
 
-    def __init__(self):
-        self.novaclient = client.Client(
-            "2",
-            username=cfg.CONF.os_username,
-            api_key=cfg.CONF.os_password,
-            auth_url=cfg.CONF.os_auth_url,
-            project_id=cfg.CONF.os_tenant_name or cfg.CONF.os_tenant_id)
+    @property
+    def novaclient(self):
+        return clients.get_novaclient()
+
+    def _is_fresh(self, expire_at):
+        return timeutils.utcnow_ts() < expire_at
 
     def list_hosts(self):
-        return self.novaclient.hypervisors.list()
+        if self._hosts is None or not self._is_fresh(self._hosts_expire_at):
+            hosts = self.novaclient.hypervisors.list(detailed=True)
+            expire_at = timeutils.utcnow_ts() + self.cache_ttl
+            self._details = dict((host.id, (host, expire_at))
+                                 for host in hosts)
+            self._hosts = hosts
+            self._hosts_expire_at = expire_at
+        return self._hosts
+
+    def list_aggregates(self):
+        if self._aggregates is None or \
+                not self._is_fresh(self._aggregates_expire_at):
+            self._aggregates = self.novaclient.aggregates.list()
+            self._aggregates_expire_at = (timeutils.utcnow_ts() +
+                                          self.cache_ttl)
+        return self._aggregates
+
+    def _get_cached_details(self, host):
+        detail, expire_at = self._details.get(base.getid(host), (None, 0))
+        if self._is_fresh(expire_at):
+            return detail
+        return None
 
     def get_host_details(self, host):
-        return self.novaclient.hypervisors.get(host)
+        detail = self._get_cached_details(host)
+        if detail is None:
+            detail = self.novaclient.hypervisors.get(host)
+            self._details[base.getid(host)] = (
+                detail, timeutils.utcnow_ts() + self.cache_ttl)
+        return detail
+
+    def get_hosts_details(self, hosts):
+        """Get details of several hosts, keyed by host.
+
+        If details of some hosts are not cached, the details of all the
+        hypervisors are listed at once. Unknown hosts are left out, and are
+        not looked for again before the cache expires.
+        """
+        def missing(host):
+            return (self._get_cached_details(host) is None and
+                    not self._is_fresh(self._unknown.get(base.getid(host),
+                                                         0)))
+
+        relisted = any(missing(host) for host in hosts)
+        if relisted:
+            self._hosts = None
+            self.list_hosts()
+
+        details = {}
+        for host in hosts:
+            detail = self._get_cached_details(host)
+            if detail is not None:
+                details[host] = detail
+            elif relisted:
+                self._unknown[base.getid(host)] = self._hosts_expire_at
+        return details
+
+    def invalidate(self, host=None):
+        if host is None:
+            self._details = {}
+            self._unknown = {}
+        else:
+            self._details.pop(base.getid(host), None)
+            self._unknown.pop(base.getid(host), None)
+        self._hosts = None
+        self._aggregates = None
@@ -0,0 +1,156 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Queries on the capabilities of the hosts of the inventory.
+
+A query is a conjunction of comparisons between a host capability and a
+value, e.g. 'vcpus >= 32 and memory_mb >= 256000 and aggregate = gpu-free'.
+Supported operators are =, ==, !=, <, <=, > and >=. Values are numbers, or
+strings, quoted if they contain spaces.
+
+Capabilities stored in columns of the computehosts table are compared in
+SQL, the other ones are looked up in the host properties and compared in
+Python. Queries are compiled once, and kept in a LRU cache keyed by their
+text.
+"""
+
+import operator
+import re
+
+from climate import exceptions
+
+
+# Capabilities stored in columns of computehosts
+COLUMNS = ('hypervisor_id', 'hypervisor_hostname', 'vcpus', 'memory_mb',
+           'local_gb')
+
+OPERATORS = {
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+CACHE_SIZE = 256
+
+_TERM_RE = re.compile(r'''\s*([A-Za-z_][\w.:-]*)\s*(==|!=|<=|>=|=|<|>)\s*
+                          ("[^"]*"|'[^']*'|[^\s'"]+)\s*''', re.VERBOSE)
+_AND_RE = re.compile(r'and\s', re.IGNORECASE)
+_NUMBER_RE = re.compile(r'^-?\d+(\.\d+)?$')
+
+# Compiled queries keyed by their text, and their texts from the least to
+# the most recently used. OrderedDict is not available on Python 2.6.
+_CACHE = {}
+_CACHE_ORDER = []
+
+
+def _parse_value(value):
+    if value[0] in '"\'':
+        return value[1:-1]
+    if _NUMBER_RE.match(value):
+        return float(value) if '.' in value else int(value)
+    return value
+
+
+def parse(text):
+    """Return the (capability, operator, value) terms of a query.
+
+    Raise InvalidInput if text is not a valid query.
+    """
+    terms = []
+    pos = 0
+    while True:
+        match = _TERM_RE.match(text, pos)
+        if match is None:
+            raise exceptions.InvalidInput('malformed host query %r at %d' %
+                                          (text, pos))
+        name, op, value = match.groups()
+        terms.append((name, op, _parse_value(value)))
+        pos = match.end()
+        if pos == len(text):
+            return terms
+
+        match = _AND_RE.match(text, pos)
+        if match is None:
+            raise exceptions.InvalidInput('malformed host query %r at %d' %
+                                          (text, pos))
+        pos = match.end()
+
+
+def _compare(op, host_value, value):
+    if isinstance(host_value, list):
+        # Capabilities with several values, e.g. aggregates: the host is
+        # in the aggregate if one of them matches, and not in it if none
+        # does.
+        if op == '!=':
+            return all(_compare(op, v, value) for v in host_value)
+        return any(_compare(op, v, value) for v in host_value)
+    if host_value is None:
+        return False
+    if isinstance(value, (int, float)) and \
+            not isinstance(host_value, (int, float)):
+        try:
+            host_value = float(host_value)
+        except (TypeError, ValueError):
+            return False
+    elif isinstance(value, basestring):
+        host_value = unicode(host_value)
+    return OPERATORS[op](host_value, value)
+
+
+class HostQuery(object):
+    """Compiled query on host capabilities."""
+
+    def __init__(self, text):
+        self.text = text
+        terms = parse(text)
+        self.column_terms = [t for t in terms if t[0] in COLUMNS]
+        self.property_terms = [t for t in terms if t[0] not in COLUMNS]
+
+    def clauses(self, model):
+        """Return the SQL clauses of the query on the columns of model."""
+        return [OPERATORS[op](getattr(model, name), value)
+                for name, op, value in self.column_terms]
+
+    def matches_properties(self, host):
+        """Check the properties of the host dict match the query."""
+        properties = host.get('properties') or {}
+        for name, op, value in self.property_terms:
+            if not _compare(op, properties.get(name), value):
+                return False
+        return True
+
+    def matches(self, host):
+        """Check the host dict matches the whole query."""
+        for name, op, value in self.column_terms:
+            if not _compare(op, host.get(name), value):
+                return False
+        return self.matches_properties(host)
+
+
+def compile_query(text):
+    """Return the compiled query of text, from the cache if possible."""
+    query = _CACHE.get(text)
+    if query is None:
+        query = HostQuery(text)
+        _CACHE[text] = query
+    else:
+        _CACHE_ORDER.remove(text)
+    _CACHE_ORDER.append(text)
+    if len(_CACHE_ORDER) > CACHE_SIZE:
+        del _CACHE[_CACHE_ORDER.pop(0)]
+    return query
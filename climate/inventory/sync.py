@@ -0,0 +1,140 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Mirror of the inventory hosts in the Climate DB.
+
+Hosts are stored in the computehosts table, so that reservations can be
+checked against them with local queries, even while Nova is unavailable.
+"""
+
+from climate.db import api as db_api
+from climate.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+# Attributes of the hypervisors stored in columns of computehosts
+HOST_COLUMNS = ('hypervisor_hostname', 'vcpus', 'memory_mb', 'local_gb')
+
+# Attributes of the hypervisors stored in the properties of computehosts.
+# Usage counters are left out, they change all the time.
+HOST_PROPERTIES = ('cpu_info', 'hypervisor_type', 'hypervisor_version')
+
+
+def _service_host(hypervisor):
+    """Return the name of the host of a hypervisor in the aggregates."""
+    service = getattr(hypervisor, 'service', None)
+    if isinstance(service, dict) and 'host' in service:
+        return service['host']
+    return hypervisor.hypervisor_hostname
+
+
+def aggregates_by_host(aggregates):
+    """Return the aggregates of the inventory keyed by host name."""
+    by_host = {}
+    for aggregate in aggregates:
+        for host in aggregate.hosts or []:
+            by_host.setdefault(host, []).append(aggregate)
+    return by_host
+
+
+def host_values(hypervisor, aggregates=()):
+    """Return the computehosts values of a hypervisor of the inventory.
+
+    Names of the aggregates of the hypervisor are stored in the 'aggregate'
+    property, and their metadata in properties of the same names. A
+    property set to different values by several aggregates holds the list
+    of the values.
+    """
+    values = dict((name, getattr(hypervisor, name))
+                  for name in HOST_COLUMNS)
+    values['hypervisor_id'] = unicode(hypervisor.id)
+
+    properties = {}
+    for aggregate in sorted(aggregates, key=lambda a: a.name):
+        for key, value in (aggregate.metadata or {}).iteritems():
+            known = properties.setdefault(key, value)
+            if known != value:
+                if not isinstance(known, list):
+                    known = properties[key] = [known]
+                if value not in known:
+                    known.append(value)
+    properties['aggregate'] = sorted(a.name for a in aggregates)
+    for name in HOST_PROPERTIES:
+        properties[name] = getattr(hypervisor, name, None)
+    values['properties'] = properties
+    return values
+
+
+class HostsSynchronizer(object):
+    """Keep the computehosts table in sync with an inventory plugin.
+
+    The hosts written at the previous sync are kept in memory, so that a
+    sync only writes the hosts that were added, changed or removed since.
+    """
+
+    def __init__(self, inventory):
+        self.inventory = inventory
+        # Last known values of the hosts, keyed by hypervisor hostname
+        self._snapshot = None
+
+    def _load_snapshot(self):
+        snapshot = {}
+        for host in db_api.host_get_all():
+            values = dict((name, host[name]) for name in
+                          HOST_COLUMNS + ('hypervisor_id', 'properties'))
+            snapshot[host['hypervisor_hostname']] = (host['id'], values)
+        return snapshot
+
+    def sync(self):
+        """Write the changes of the inventory hosts to the DB.
+
+        :returns: numbers of hosts created, updated and deleted.
+        """
+        self.inventory.invalidate()
+        hypervisors = self.inventory.list_hosts()
+        aggregates = aggregates_by_host(self.inventory.list_aggregates())
+        if self._snapshot is None:
+            self._snapshot = self._load_snapshot()
+
+        created = updated = deleted = 0
+        seen = set()
+        for hypervisor in hypervisors:
+            values = host_values(
+                hypervisor, aggregates.get(_service_host(hypervisor), ()))
+            hostname = values['hypervisor_hostname']
+            seen.add(hostname)
+
+            if hostname not in self._snapshot:
+                host = db_api.host_create(values)
+                self._snapshot[hostname] = (host['id'], values)
+                created += 1
+            elif self._snapshot[hostname][1] != values:
+                host_id = self._snapshot[hostname][0]
+                db_api.host_update(host_id, values)
+                self._snapshot[hostname] = (host_id, values)
+                updated += 1
+
+        for hostname in set(self._snapshot) - seen:
+            db_api.host_destroy(self._snapshot.pop(hostname)[0])
+            deleted += 1
+
+        if created or updated or deleted:
+            LOG.info('Synchronized hosts: %d created, %d updated, %d '
+                     'deleted', created, updated, deleted)
+        return created, updated, deleted
+
+    def reset(self):
+        """Reload the hosts from the DB at the next sync."""
+        self._snapshot = None
@@ -14,14 +14,215 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
+from keystoneclient.v2_0 import client as keystone_client
+from nova.openstack.common import log as logging
+from nova.openstack.common import loopingcall
 from nova.scheduler import filters
+from oslo.config import cfg
+
+from climate.openstack.common import timeutils
+
+
+# The filter runs in nova-scheduler: it must not register the options of
+# the Climate services, such as the ones of its RPC, which Nova registers
+# with other defaults. Climate is reached through its REST API instead.
+opts = [
+    cfg.IntOpt('climate_reserved_hosts_refresh_interval',
+               default=30,
+               help='Number of seconds between two refreshes of the '
+                    'snapshot of hosts reserved in Climate'),
+    cfg.IntOpt('climate_reserved_hosts_timeout',
+               default=10,
+               help='Number of seconds to wait for Climate to send the '
+                    'snapshot of reserved hosts'),
+    cfg.StrOpt('climate_auth_url',
+               default='http://127.0.0.1:5000/v2.0',
+               help='URL of the OpenStack Identity service used to get a '
+                    'token for the Climate API'),
+    cfg.StrOpt('climate_username',
+               default='admin',
+               help='User getting the reserved hosts from Climate'),
+    cfg.StrOpt('climate_password',
+               default='',
+               secret=True,
+               help='Password of climate_username'),
+    cfg.StrOpt('climate_tenant_name',
+               default='admin',
+               help='Tenant of climate_username'),
+    cfg.StrOpt('climate_url',
+               default=None,
+               help='URL of the v1 Climate API, found in the service '
+                    'catalog by default'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+LOG = logging.getLogger(__name__)
+
+Reservation = collections.namedtuple('Reservation',
+                                     ['start_date', 'end_date', 'id'])
+
+
+def _parse_date(value):
+    return timeutils.normalize_time(timeutils.parse_isotime(value))
+
+
+def _fetch_reserved_hosts():
+    """Return the periods of the physical host reservations not over yet.
+
+    They are got from the Climate REST API, as the DB of Climate is not
+    reachable from nova-scheduler.
+    """
+    keystone = keystone_client.Client(
+        username=CONF.climate_username,
+        password=CONF.climate_password,
+        tenant_name=CONF.climate_tenant_name,
+        auth_url=CONF.climate_auth_url,
+        timeout=CONF.climate_reserved_hosts_timeout)
+    url = CONF.climate_url or keystone.service_catalog.url_for(
+        service_type='reservation', endpoint_type='internalURL')
+    _resp, body = keystone.request(
+        url.rstrip('/') + '/os-hosts/reservations', 'GET',
+        headers={'X-Auth-Token': keystone.auth_token,
+                 'Accept': 'application/json'})
+
+    hosts = {}
+    for reservation in body['reservations']:
+        hosts.setdefault(reservation['host'], []).append(
+            Reservation(_parse_date(reservation['start_date']),
+                        _parse_date(reservation['end_date']),
+                        reservation['reservation_id']))
+    return hosts
+
+
+class ReservedHostsCache(object):
+    """Local snapshot of the hosts reserved in Climate.
+
+    The snapshot maps every reserved host to its reservations. Once
+    started, it is refreshed every refresh_interval seconds in a background
+    greenthread, so that deciding if a host passes is a dict lookup and
+    never waits for Climate. A failed refresh keeps the previous snapshot,
+    and the snapshot is None until it is loaded once.
+    """
+
+    def __init__(self, fetch=_fetch_reserved_hosts, refresh_interval=None):
+        self._fetch = fetch
+        if refresh_interval is None:
+            refresh_interval = CONF.climate_reserved_hosts_refresh_interval
+        self.refresh_interval = refresh_interval
+        self._hosts = None
+        self._refresher = None
+        self.last_refresh = None
+
+    def start(self):
+        """Start refreshing the snapshot in the background."""
+        if self._refresher is None:
+            self._refresher = loopingcall.FixedIntervalLoopingCall(
+                self.refresh)
+            self._refresher.start(self.refresh_interval)
+
+    def staleness(self):
+        """Return the age in seconds of the snapshot, None if never loaded."""
+        if self.last_refresh is None:
+            return None
+        return timeutils.utcnow_ts() - self.last_refresh
+
+    def refresh(self):
+        """Reload the snapshot of reserved hosts.
+
+        A failure is logged once, and not by each lookup of the snapshot.
+        """
+        now = timeutils.utcnow_ts()
+        try:
+            self._hosts = self._fetch()
+        except Exception:
+            if self._hosts is None:
+                LOG.exception('Unable to get the reserved hosts from '
+                              'Climate, refusing all hosts')
+            else:
+                LOG.exception('Unable to refresh the reserved hosts, using '
+                              'a snapshot %s seconds old', self.staleness())
+            return
+        self.last_refresh = now
+
+    def snapshot(self):
+        """Return the reservations of all the hosts, keyed by host, None if
+        the snapshot was never loaded.
+        """
+        return self._hosts
+
+    def get(self, host):
+        """Return the reservations of host, None if the snapshot was never
+        loaded.
+        """
+        hosts = self._hosts
+        if hosts is None:
+            return None
+        return hosts.get(host, [])
+
+
+_CACHE = None
+
+
+def _get_cache():
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ReservedHostsCache()
+        _CACHE.start()
+    return _CACHE
 
 
 class ClimateFilter(filters.BaseHostFilter):
-    """Climate Filter for nova-scheduler."""
+    """Climate Filter for nova-scheduler.
+
+    Hosts reserved in Climate only accept the instances booked with the
+    'reservation' scheduler hint of one of their ongoing reservations. Other
+    hosts accept any instance not booked for a reservation. No host passes
+    until the reserved hosts were got from Climate once, so that reserved
+    hosts are never given away.
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache or _get_cache()
+
+    @staticmethod
+    def _passes(reservations, reservation_id, now):
+        ongoing = [r.id for r in reservations
+                   if r.start_date <= now < r.end_date]
+        if reservation_id is None:
+            return not ongoing
+        return reservation_id in ongoing
+
+    @staticmethod
+    def _get_reservation_id(filter_properties):
+        scheduler_hints = filter_properties.get('scheduler_hints') or {}
+        return scheduler_hints.get('reservation')
 
     def host_passes(self, host_state, filter_properties):
         """Filter based on Climate."""
-        # scheduler_hints = filter_properties.get('scheduler_hints') or {}
-        # XXX send host_state + to Climate API
-        return True
+        reservations = self.cache.get(host_state.host)
+        if reservations is None:
+            return False
+        return self._passes(reservations,
+                            self._get_reservation_id(filter_properties),
+                            timeutils.utcnow())
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Yield the hosts passing the filter.
+
+        Reservations of the whole list of hosts are resolved from one lookup
+        of the snapshot, instead of one per host.
+        """
+        reserved_hosts = self.cache.snapshot()
+        if reserved_hosts is None:
+            return
+
+        reservation_id = self._get_reservation_id(filter_properties)
+        now = timeutils.utcnow()
+
+        for host_state in filter_obj_list:
+            if self._passes(reserved_hosts.get(host_state.host, ()),
+                            reservation_id, now):
+                yield host_state
@@ -0,0 +1,176 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import contextlib
+import time
+
+from eventlet import greenpool
+from eventlet import semaphore
+from oslo.config import cfg
+
+from climate import exceptions
+from climate.openstack.common import log as logging
+
+
+opts = [
+    cfg.IntOpt('scheduler_executor_size',
+               default=64,
+               help='Maximum number of lease actions run concurrently by a '
+                    'scheduler worker'),
+    cfg.ListOpt('scheduler_executor_limits',
+                default=[],
+                help='Maximum number of actions using a plugin run '
+                     'concurrently, as plugin=limit pairs, e.g. '
+                     'physical:host=16'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+LOG = logging.getLogger(__name__)
+
+
+class _KindStats(object):
+    """Counters of the actions of one kind."""
+
+    def __init__(self):
+        self.running = 0
+        self.done = 0
+        self.failed = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def to_dict(self, queued=0):
+        finished = self.done + self.failed
+        return {
+            'queued': queued,
+            'running': self.running,
+            'done': self.done,
+            'failed': self.failed,
+            'avg_time': self.total_time / finished if finished else 0.0,
+            'max_time': self.max_time,
+        }
+
+
+class Executor(object):
+    """Bounded pool of greenthreads running lease actions.
+
+    At most size actions are submitted at once: submit() blocks while the
+    pool is full, so that callers only take new work when there is room
+    for it. Statistics are kept by kind of action: actions are done if
+    they return and failed if they raise.
+
+    Actions call their plugins within plugin_slot(): plugins listed in
+    limits are then called by at most as many actions at once.
+    """
+
+    def __init__(self, size=None, limits=None):
+        """Build an executor.
+
+        :param limits: maximum number of concurrent calls by plugin name,
+                       defaults to the scheduler_executor_limits option.
+        """
+        if size is None:
+            size = CONF.scheduler_executor_size
+        if limits is None:
+            limits = _parse_limits(CONF.scheduler_executor_limits)
+        self.size = size
+        self._pool = greenpool.GreenPool(size)
+        self._slots = semaphore.Semaphore(size)
+        self._plugin_slots = dict((plugin, semaphore.Semaphore(limit))
+                                  for plugin, limit in limits.iteritems())
+        self._stats = {}
+
+    def free(self):
+        """Return the number of actions that can be submitted right now."""
+        return self._slots.balance
+
+    def submit(self, kind, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in the pool as an action of kind.
+
+        Blocks until the pool has room for the action.
+        """
+        self._slots.acquire()
+        stats = self._stats.setdefault(kind, _KindStats())
+        try:
+            self._pool.spawn_n(self._run, kind, stats, func, args, kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+
+    @contextlib.contextmanager
+    def plugin_slot(self, plugin):
+        """Wait for a slot of the plugin, held until the block exits."""
+        plugin_slot = self._plugin_slots.get(plugin)
+        if plugin_slot is None:
+            yield
+            return
+
+        with plugin_slot:
+            yield
+
+    def _run(self, kind, stats, func, args, kwargs):
+        try:
+            stats.running += 1
+            started_at = time.time()
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                stats.failed += 1
+                LOG.exception('Action %s failed', kind)
+            else:
+                stats.done += 1
+            finally:
+                elapsed = time.time() - started_at
+                stats.running -= 1
+                stats.total_time += elapsed
+                stats.max_time = max(stats.max_time, elapsed)
+        finally:
+            self._slots.release()
+
+    def stats(self, queued=None):
+        """Return queue depth and latency counters of actions, by kind.
+
+        :param queued: number of actions waiting to be submitted by kind,
+                       e.g. the due events no worker has claimed yet.
+        """
+        queued = queued or {}
+        kinds = set(self._stats) | set(queued)
+        return dict((kind, self._stats.get(kind, _KindStats()).to_dict(
+            queued.get(kind, 0))) for kind in kinds)
+
+    def wait(self):
+        """Wait until all the submitted actions are over."""
+        self._pool.waitall()
+
+
+def _parse_limits(pairs):
+    """Return the limits by plugin of plugin=limit pairs.
+
+    :raises: ConfigurationError if a pair has no plugin or its limit is
+             not a positive integer.
+    """
+    limits = {}
+    for pair in pairs:
+        plugin, _sep, limit = pair.rpartition('=')
+        plugin = plugin.strip()
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = None
+        if not plugin or limit is None or limit < 1:
+            raise exceptions.ConfigurationError(
+                'scheduler_executor_limits: %r is not a plugin=limit pair '
+                'with a positive limit' % pair)
+        limits[plugin] = limit
+    return limits
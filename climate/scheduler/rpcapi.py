@@ -0,0 +1,34 @@
+# -*- encoding: utf-8 -*-
+#
+# Copyright © 2013 Julien Danjou <julien@danjou.info>
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from climate.openstack.common.rpc import proxy as rpc_proxy
+
+
+TOPIC = 'climate.scheduler'
+
+
+class SchedulerAPI(rpc_proxy.RpcProxy):
+    """Client side of the scheduler RPC API."""
+
+    BASE_RPC_API_VERSION = '1.0'
+
+    def __init__(self):
+        super(SchedulerAPI, self).__init__(
+            topic=TOPIC, default_version=self.BASE_RPC_API_VERSION)
+
+    def events_changed(self, ctxt):
+        """Tell all the schedulers that events were created or modified."""
+        self.fanout_cast(ctxt, self.make_msg('events_changed'))
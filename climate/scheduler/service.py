@@ -14,8 +14,315 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
+import heapq
+import os
+
+from eventlet import semaphore
+from oslo.config import cfg
+
+from climate.db import api as db_api
+from climate import exceptions
+from climate.inventory import nova
+from climate.inventory import sync
+from climate.openstack.common import excutils
+from climate.openstack.common import log as logging
+from climate.openstack.common import loopingcall
 from climate.openstack.common.rpc import service as rpc_service
+from climate.openstack.common import timeutils
+from climate.scheduler import executor
+from climate.utils import partitions
+
+
+opts = [
+    cfg.IntOpt('events_resync_interval',
+               default=60,
+               help='Maximum number of seconds between two reloads of the '
+                    'upcoming events from the DB'),
+    cfg.IntOpt('events_retry_interval',
+               default=5,
+               help='Number of seconds to wait before dispatching the due '
+                    'events again after a failure, such as a DB error'),
+    cfg.IntOpt('events_batch_size',
+               default=100,
+               help='Maximum number of upcoming events loaded at once'),
+    cfg.BoolOpt('scheduler_sharding',
+                default=False,
+                help='Spread the leases over all the running scheduler '
+                     'workers, each one processing the events of its '
+                     'share of the leases only'),
+    cfg.IntOpt('scheduler_workers',
+               default=1,
+               help='Number of scheduler worker processes to launch, '
+                    'meant to be used along with scheduler_sharding'),
+    cfg.IntOpt('scheduler_heartbeat_interval',
+               default=10,
+               help='Number of seconds between two heartbeats of a '
+                    'scheduler worker'),
+    cfg.IntOpt('scheduler_heartbeat_ttl',
+               default=30,
+               help='Number of seconds after its last heartbeat a scheduler '
+                    'worker is considered dead and its leases are given '
+                    'to the other workers'),
+    cfg.IntOpt('scheduler_event_timeout',
+               default=3600,
+               help='Number of seconds after which an event still in '
+                    'progress is considered lost, and is run again'),
+    cfg.IntOpt('inventory_sync_interval',
+               default=60,
+               help='Number of seconds between two synchronizations of the '
+                    'hosts of Nova into the Climate DB, 0 to disable them'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(opts)
+LOG = logging.getLogger(__name__)
 
 
 class SchedulerService(rpc_service.Service):
-    pass
+    """Service firing lease events when they are due.
+
+    Deadlines of the next UNDONE events are kept in a heap, and the service
+    sleeps until the earliest one instead of polling the DB. Events are
+    reloaded when notified that some changed, and at least every
+    events_resync_interval seconds.
+
+    With scheduler_sharding, every worker sends heartbeats to the DB and
+    only processes the events of the lease partitions it owns among the
+    live workers. Partitions are given again to the remaining workers once
+    a worker stops or misses its heartbeats, along with the events it was
+    running. Events running for more than scheduler_event_timeout seconds
+    are run again too, e.g. after the restart of a worker.
+    """
+
+    def __init__(self, host, topic, manager=None, serializer=None):
+        super(SchedulerService, self).__init__(host, topic, manager,
+                                               serializer)
+        self.event_handlers = {
+            'start_lease': self.start_lease,
+            'end_lease': self.end_lease,
+        }
+        self._deadlines = []
+        self._truncated = False
+        self._next_resync = None
+        self._lock = semaphore.Semaphore()
+        self._timer = None
+        self.executor = executor.Executor()
+        self.worker_id = None
+        # Partitions owned by the worker, None meaning all of them
+        self._partitions = None
+        self._hosts_synchronizer = None
+
+    def start(self):
+        super(SchedulerService, self).start()
+        self.worker_id = '%s:%d' % (self.host, os.getpid())
+        if CONF.scheduler_sharding:
+            self._heartbeat()
+            self.tg.add_timer(CONF.scheduler_heartbeat_interval,
+                              self._heartbeat,
+                              CONF.scheduler_heartbeat_interval)
+        if CONF.inventory_sync_interval > 0:
+            self.tg.add_timer(CONF.inventory_sync_interval,
+                              self._sync_hosts)
+        self._start_timer()
+
+    def stop(self):
+        if CONF.scheduler_sharding and self.worker_id is not None:
+            # Let the other workers take the partitions over right now
+            db_api.scheduler_worker_destroy(self.worker_id)
+        super(SchedulerService, self).stop()
+
+    def _heartbeat(self):
+        """Refresh the worker heartbeat and the partitions it owns."""
+        try:
+            db_api.scheduler_worker_heartbeat(self.worker_id)
+            members = db_api.scheduler_worker_get_all_alive(
+                CONF.scheduler_heartbeat_ttl)
+        except Exception:
+            LOG.exception('Failed to send the heartbeat of scheduler '
+                          'worker %s', self.worker_id)
+            return
+
+        owned = partitions.owned_partitions(members, self.worker_id)
+        reclaimed = self._reclaim_events(members)
+        if owned != self._partitions or reclaimed:
+            LOG.info('Scheduler worker %s now owns %d partitions out of %d, '
+                     'with %d live workers', self.worker_id, len(owned),
+                     partitions.PARTITION_COUNT, len(members))
+            self._partitions = owned
+            if self._timer is not None:
+                self._start_timer()
+
+    def _reclaim_events(self, live_workers=None):
+        """Make the events lost by dead workers UNDONE again."""
+        try:
+            reclaimed = db_api.event_reclaim(CONF.scheduler_event_timeout,
+                                             live_workers)
+        except Exception:
+            LOG.exception('Failed to reclaim the events of dead workers')
+            return 0
+        if reclaimed:
+            LOG.warn('Reclaimed %d events lost by dead workers', reclaimed)
+        return reclaimed
+
+    def _start_timer(self):
+        """(Re)start the loop dispatching events, reloading them first."""
+        self._next_resync = None
+        if self._timer is not None:
+            self._timer.stop()
+            self.tg.timers.remove(self._timer)
+
+        self._timer = loopingcall.DynamicLoopingCall(self._run_due_events)
+        self._timer.start(periodic_interval_max=CONF.events_resync_interval)
+        self.tg.timers.append(self._timer)
+
+    def _sync_hosts(self):
+        """Mirror the Nova hosts into the DB."""
+        if self._partitions is not None and 0 not in self._partitions:
+            # The worker owning the first partition syncs for all workers
+            return
+
+        try:
+            if self._hosts_synchronizer is None:
+                self._hosts_synchronizer = sync.HostsSynchronizer(
+                    nova.NovaInventory())
+            self._hosts_synchronizer.sync()
+        except Exception:
+            LOG.exception('Failed to synchronize the hosts')
+            if self._hosts_synchronizer is not None:
+                self._hosts_synchronizer.reset()
+
+    def events_changed(self, context):
+        """Called by RPC when events were created, updated or deleted."""
+        self._start_timer()
+
+    def _resync(self, now):
+        """Reload the next UNDONE events from the DB, soonest first."""
+        filters = {'status': 'UNDONE'}
+        if self._partitions is not None:
+            filters['partitions'] = self._partitions
+
+        if not CONF.scheduler_sharding:
+            # With sharding, events are reclaimed at heartbeats
+            self._reclaim_events()
+
+        if self._partitions == []:
+            events = []
+        else:
+            events = db_api.event_get_all_sorted_by_filters(
+                'time', 'asc', filters, limit=CONF.events_batch_size)
+
+        self._deadlines = [(event['time'], event['id']) for event in events]
+        heapq.heapify(self._deadlines)
+        self._truncated = len(events) == CONF.events_batch_size
+        self._next_resync = now + datetime.timedelta(
+            seconds=CONF.events_resync_interval)
+
+    def _run_due_events(self):
+        """Dispatch the due events, return seconds until the next one.
+
+        A failure is logged and the events are reloaded after
+        events_retry_interval seconds, so that the loop keeps running.
+        """
+        try:
+            return self._try_run_due_events()
+        except Exception:
+            LOG.exception('Failed to dispatch the due events, retrying in '
+                          '%d seconds', CONF.events_retry_interval)
+            self._next_resync = None
+            return CONF.events_retry_interval
+
+    def _try_run_due_events(self):
+        with self._lock:
+            now = timeutils.utcnow()
+            if self._next_resync is None or now >= self._next_resync:
+                self._resync(now)
+
+            if self._deadlines and self._deadlines[0][0] <= now:
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    heapq.heappop(self._deadlines)
+                self._dispatch_due_events()
+
+            if not self._deadlines and self._truncated:
+                # More events are waiting in the DB, load them right now.
+                self._next_resync = None
+                return 0
+
+            now = timeutils.utcnow()
+            next_deadline = self._next_resync
+            if self._deadlines:
+                next_deadline = min(next_deadline, self._deadlines[0][0])
+            return max(timeutils.delta_seconds(now, next_deadline), 0)
+
+    def _dispatch_due_events(self):
+        """Claim the due events and submit them to the executor.
+
+        No more events are claimed than the executor has room for, so that
+        events not run yet stay UNDONE for the other workers. The due events
+        left unclaimed are reported as the queue depth of the executor.
+        """
+        queued = db_api.event_count_due(self._partitions)
+        LOG.debug('Scheduler executor stats: %s', self.executor.stats(queued))
+        while True:
+            limit = min(CONF.events_batch_size,
+                        max(self.executor.free(), 1))
+            events = db_api.event_claim_due(limit, self.worker_id,
+                                            self._partitions)
+            for event in events:
+                self.executor.submit(event['event_type'], self._dispatch,
+                                     event)
+            if len(events) < limit:
+                break
+
+    def _dispatch(self, event):
+        """Run the handler of a claimed event and record how it ended.
+
+        The status is not recorded if the event was reclaimed meanwhile.
+        Handler errors are raised again once the event is in ERROR, so
+        that the executor counts the action as failed.
+        """
+        try:
+            handler = self.event_handlers[event['event_type']]
+            handler(event['lease_id'])
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.error('Failed to process event %s', event['id'])
+                self._record_status(event, 'ERROR')
+        else:
+            self._record_status(event, 'DONE')
+
+    def _record_status(self, event, status):
+        """Record the status of an event if it is still claimed here."""
+        claimed = db_api.constraint(status=db_api.equal_any('IN_PROGRESS'),
+                                    worker_id=db_api.equal_any(
+                                        self.worker_id))
+        try:
+            db_api.event_update(event['id'], {'status': status}, claimed)
+        except exceptions.ConstraintNotMet:
+            LOG.warn('Event %s was reclaimed while it was run by %s',
+                     event['id'], self.worker_id)
+
+    def _update_reservations(self, lease_id, values):
+        """Update the reservations of the lease, plugin by plugin.
+
+        Reservations of a plugin are handled within a slot of the plugin in
+        the executor, so that plugins are not called by more actions at
+        once than their limit.
+        """
+        by_plugin = {}
+        for reservation in db_api.reservation_get_all_by_lease(lease_id):
+            by_plugin.setdefault(reservation['resource_type'],
+                                 []).append(reservation)
+
+        for plugin in sorted(by_plugin):
+            with self.executor.plugin_slot(plugin):
+                for reservation in by_plugin[plugin]:
+                    db_api.reservation_update(reservation['id'], values)
+
+    def start_lease(self, lease_id):
+        """Mark reservations of the lease as active."""
+        self._update_reservations(lease_id, {'status': 'active'})
+
+    def end_lease(self, lease_id):
+        """Mark reservations of the lease as completed."""
+        self._update_reservations(lease_id, {'status': 'completed'})
@@ -24,7 +24,10 @@ class LazyProxy(object):
         self.instance = None
 
     def __getattr__(self, name):
-        return functools.partial(self.__run_method, name)
+        # Kept, so that a method of the proxy is always the same object
+        method = functools.partial(self.__run_method, name)
+        setattr(self, name, method)
+        return method
 
     def __run_method(self, __name, *args, **kwargs):
         if self.instance is None:
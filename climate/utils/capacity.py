@@ -0,0 +1,113 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+
+
+class CapacityTimeline(object):
+    """Free capacity over time of a pool of interchangeable resources.
+
+    The timeline is a step function built by sweeping the sorted start and
+    end points of the [start, end) periods during which resources are used:
+    the used capacity is the running sum of +count at starts and -count at
+    ends. A sparse table of the minimums of the steps answers the minimum
+    free capacity over any window with two bisections and two lookups.
+    """
+
+    def __init__(self, capacity, periods):
+        """Build the timeline of capacity resources.
+
+        :param periods: (start, end, count) tuples of the periods during
+                        which count resources are used.
+        """
+        self.capacity = capacity
+
+        deltas = {}
+        ends = set()
+        for start, end, count in periods:
+            deltas[start] = deltas.get(start, 0) + count
+            deltas[end] = deltas.get(end, 0) - count
+            ends.add(end)
+        self._ends = sorted(ends)
+
+        # free[i] is the free capacity from times[i] until times[i + 1]
+        self.times = sorted(deltas)
+        self.free = [capacity - used for used in
+                     _accumulate(deltas[t] for t in self.times)]
+
+        # _log2[n] is the integer log2 of n; int.bit_length() needs
+        # Python 2.7
+        self._log2 = [0, 0]
+        for n in range(2, len(self.free) + 1):
+            self._log2.append(self._log2[n // 2] + 1)
+
+        self._mins = [self.free]
+        width = 1
+        while width * 2 <= len(self.free):
+            previous = self._mins[-1]
+            self._mins.append([min(previous[i], previous[i + width])
+                               for i in range(len(previous) - width)])
+            width *= 2
+
+    def _range_min(self, first, last):
+        """Return the minimum of free[first:last + 1]."""
+        level = self._log2[last - first + 1]
+        mins = self._mins[level]
+        return min(mins[first], mins[last - (1 << level) + 1])
+
+    def min_free(self, start, end):
+        """Return the minimum free capacity during [start, end)."""
+        first = bisect.bisect_right(self.times, start) - 1
+        last = bisect.bisect_left(self.times, end) - 1
+        if last < 0:
+            return self.capacity
+        if first < 0:
+            return min(self.capacity, self._range_min(0, last))
+        return self._range_min(first, last)
+
+    def windows(self, count, duration, after):
+        """Yield the starts of the windows with count free resources.
+
+        Windows last duration and start at after or later. Windows can only
+        begin at after or when resources are released, so only these starts
+        are yielded, in order.
+        """
+        if count > self.capacity:
+            return
+
+        candidates = [after] + self._ends[
+            bisect.bisect_right(self._ends, after):]
+        for start in candidates:
+            if self.min_free(start, start + duration) >= count:
+                yield start
+
+    def earliest_window(self, count, duration, after):
+        """Return the earliest start of a window with count free resources.
+
+        The window lasts duration and starts at after or later. Return None
+        if count is more than the capacity.
+        """
+        return next(self.windows(count, duration, after), None)
+
+    def steps(self):
+        """Return the (time, free capacity) steps of the timeline."""
+        return zip(self.times, self.free)
+
+
+def _accumulate(values):
+    total = 0
+    for value in values:
+        total += value
+        yield total
@@ -0,0 +1,179 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+
+class _Node(object):
+    __slots__ = ('period', 'priority', 'max_end', 'left', 'right')
+
+    def __init__(self, period):
+        self.period = period
+        self.priority = random.random()
+        self.max_end = period[1]
+        self.left = None
+        self.right = None
+
+    def update(self):
+        self.max_end = self.period[1]
+        for child in (self.left, self.right):
+            if child is not None and child.max_end > self.max_end:
+                self.max_end = child.max_end
+
+
+def _split(node, period):
+    """Split a tree into the periods lower than period and the others."""
+    if node is None:
+        return None, None
+    if node.period < period:
+        node.right, right = _split(node.right, period)
+        node.update()
+        return node, right
+    left, node.left = _split(node.left, period)
+    node.update()
+    return left, node
+
+
+def _merge(left, right):
+    """Merge two trees, all the periods of left being lower."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        left.update()
+        return left
+    right.left = _merge(left, right.left)
+    right.update()
+    return right
+
+
+def _remove_first(node):
+    """Return the tree without its lowest period."""
+    if node.left is None:
+        return node.right
+    node.left = _remove_first(node.left)
+    node.update()
+    return node
+
+
+def _first(node):
+    while node.left is not None:
+        node = node.left
+    return node.period
+
+
+def _overlapping(node, start, end, result):
+    if node is None or node.max_end <= start:
+        return
+    _overlapping(node.left, start, end, result)
+    if node.period[0] < end:
+        if node.period[1] > start:
+            result.append(node.period)
+        _overlapping(node.right, start, end, result)
+
+
+class IntervalTree(object):
+    """Interval tree of [start, end) periods.
+
+    Periods are (start, end, ...) tuples, kept sorted in a treap whose nodes
+    also hold the greatest end of their subtree. Finding the periods
+    overlapping a window skips the subtrees ending before it and the ones
+    starting after it, in O(log n + k) on average, and so does not depend on
+    the length of the periods. Adding and removing a period is in
+    O(log n) on average.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def add(self, period):
+        """Add the period to the tree."""
+        left, right = _split(self._root, period)
+        self._root = _merge(_merge(left, _Node(period)), right)
+        self._len += 1
+
+    def remove(self, period):
+        """Remove the period from the tree, raise ValueError if missing."""
+        left, right = _split(self._root, period)
+        if right is None or _first(right) != period:
+            self._root = _merge(left, right)
+            raise ValueError('%r is not in the tree' % (period,))
+        self._root = _merge(left, _remove_first(right))
+        self._len -= 1
+
+    def overlapping(self, start, end):
+        """Return the periods overlapping [start, end), sorted."""
+        result = []
+        _overlapping(self._root, start, end, result)
+        return result
+
+
+class IntervalIndex(object):
+    """Index of [start, end) periods of values grouped by key.
+
+    Periods are kept in an interval tree per key, and in an interval tree of
+    all the keys, so that both the values of a key and the keys having
+    values during a window are found without walking the other periods.
+    """
+
+    def __init__(self):
+        self._trees = {}
+        self._all = IntervalTree()
+        self._values = {}
+
+    def __len__(self):
+        return len(self._all)
+
+    def add(self, key, start, end, value):
+        """Index the [start, end) period of value under key."""
+        self._trees.setdefault(key, IntervalTree()).add((start, end, value))
+        self._all.add((start, end, key, value))
+        self._values.setdefault(value, []).append((key, start, end))
+
+    def remove(self, value):
+        """Remove all the periods indexed for value."""
+        for key, start, end in self._values.pop(value, []):
+            tree = self._trees[key]
+            tree.remove((start, end, value))
+            if not tree:
+                del self._trees[key]
+            self._all.remove((start, end, key, value))
+
+    def overlapping(self, key, start, end):
+        """Return values having a period overlapping [start, end) for key.
+
+        Values are returned in the order of their period start.
+        """
+        tree = self._trees.get(key)
+        if tree is None:
+            return []
+        return [v for _s, _e, v in tree.overlapping(start, end)]
+
+    def periods_overlapping(self, start, end):
+        """Return the (start, end, key) periods overlapping [start, end) of
+        all the keys, sorted.
+        """
+        return [(s, e, k) for s, e, k, _v in self._all.overlapping(start, end)]
+
+    def keys_overlapping(self, start, end):
+        """Return the set of keys having a period overlapping [start, end).
+        """
+        return set(k for _s, _e, k, _v in self._all.overlapping(start, end))
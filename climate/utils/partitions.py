@@ -0,0 +1,48 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Hash partitioning of leases between scheduler workers.
+
+Every lease belongs to one of PARTITION_COUNT partitions, given by a hash of
+its ID. Partitions are stored along with the events, so PARTITION_COUNT
+cannot change once events were created. They are spread over the live
+workers like on a ring: partition p belongs to the (p modulo the number of
+workers)-th worker of the sorted list of workers.
+"""
+
+import zlib
+
+
+PARTITION_COUNT = 64
+
+
+def partition_of(key):
+    """Return the partition of key, stable across processes and hosts."""
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return (zlib.crc32(key) & 0xffffffff) % PARTITION_COUNT
+
+
+def owned_partitions(members, member):
+    """Return the partitions member owns among members.
+
+    :param members: IDs of all the live workers, in any order.
+    :param member: ID of the worker.
+    """
+    members = sorted(members)
+    if member not in members:
+        return []
+    index = members.index(member)
+    return range(index, PARTITION_COUNT, len(members))
@@ -0,0 +1,65 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import json
+
+import netaddr
+
+from climate.api import encoder
+from climate.openstack.common import gettextutils
+from climate import test
+
+
+class DateTime(datetime.datetime):
+    pass
+
+
+class EncoderTestCase(test.TestCase):
+
+    def setUp(self):
+        super(EncoderTestCase, self).setUp()
+        self.value = {
+            'lease': {
+                'name': u'lease\xe9',
+                'start_date': datetime.datetime(2030, 1, 1, 12, 0, 0, 123),
+                'end_date': DateTime(2030, 1, 2),
+                'reservations': [{'id': 1, 'weight': 1.5, 'active': True,
+                                  'address': netaddr.IPAddress('10.0.0.1')}],
+                'message': gettextutils.Message('message', 'climate'),
+                'events': (),
+                'trust': None,
+            }
+        }
+
+    def test_dumps(self):
+        self.assertEqual({
+            'lease': {
+                'name': u'lease\xe9',
+                'start_date': '2030-01-01T12:00:00',
+                'end_date': '2030-01-02T00:00:00',
+                'reservations': [{'id': 1, 'weight': 1.5, 'active': True,
+                                  'address': '10.0.0.1'}],
+                'message': 'message',
+                'events': [],
+                'trust': None,
+            }
+        }, json.loads(encoder.dumps(self.value)))
+
+    def test_backends(self):
+        self.assertEqual(json, encoder.Encoder(['nope', 'json']).backend)
+        self.assertRaises(ImportError, encoder.Encoder, ['nope'])
+        self.assertEqual(encoder.dumps(self.value),
+                         encoder.Encoder(['json']).dumps(self.value))
@@ -0,0 +1,118 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+from climate.api import service
+from climate.db import api as db_api
+from climate import exceptions
+from climate.openstack.common import timeutils
+from climate import test
+
+
+def _create_lease(name, host, start_date, end_date):
+    db_api.lease_create({'name': name,
+                         'start_date': start_date,
+                         'end_date': end_date,
+                         'trust': 'trust',
+                         'reservations': [{'resource_id': host,
+                                           'resource_type': 'physical:host'}],
+                         'events': []})
+
+
+class AvailabilityTestCase(test.DBTestCase):
+    """Test case for API.get_availability()."""
+
+    def setUp(self):
+        super(AvailabilityTestCase, self).setUp()
+        self.api = service.API()
+        for name in ('host1', 'host2'):
+            db_api.host_create({'hypervisor_hostname': name,
+                                'vcpus': 4, 'memory_mb': 8192,
+                                'local_gb': 100})
+        _create_lease('l1', 'host1', datetime.datetime(2030, 1, 1, 0, 0),
+                      datetime.datetime(2030, 1, 2, 0, 0))
+        _create_lease('l2', 'host2', datetime.datetime(2030, 1, 1, 10, 0),
+                      datetime.datetime(2030, 1, 1, 12, 0))
+
+    def assertWindow(self, start_date, end_date, **query):
+        query = dict({'resource_type': 'physical:host',
+                      'after': '2030-01-01 00:00'}, **query)
+        availability = self.api.get_availability(query)
+        self.assertEqual(start_date, availability['start_date'])
+        self.assertEqual(end_date, availability['end_date'])
+
+    def test_free_now(self):
+        self.assertWindow(datetime.datetime(2030, 1, 1, 0, 0),
+                          datetime.datetime(2030, 1, 1, 1, 0),
+                          count='1', duration='60')
+
+    def test_after_reservations(self):
+        self.assertWindow(datetime.datetime(2030, 1, 2, 0, 0),
+                          datetime.datetime(2030, 1, 2, 1, 0),
+                          count='2', duration='60')
+
+    def test_same_host_all_along(self):
+        # host2 is free from 00:00 to 10:00 and from 12:00 only
+        self.assertWindow(datetime.datetime(2030, 1, 1, 12, 0),
+                          datetime.datetime(2030, 1, 1, 23, 0),
+                          count='1', duration='660')
+
+    def test_periods_over(self):
+        self.assertWindow(datetime.datetime(2030, 1, 3, 0, 0),
+                          datetime.datetime(2030, 1, 3, 1, 0),
+                          count='2', duration='60', after='2030-01-03 00:00')
+
+    def test_follows_lease_changes(self):
+        self.assertWindow(datetime.datetime(2030, 1, 1, 0, 0),
+                          datetime.datetime(2030, 1, 1, 1, 0),
+                          count='1', duration='60')
+        _create_lease('l3', 'host2', datetime.datetime(2030, 1, 1, 0, 0),
+                      datetime.datetime(2030, 1, 1, 10, 0))
+        self.assertWindow(datetime.datetime(2030, 1, 1, 12, 0),
+                          datetime.datetime(2030, 1, 1, 13, 0),
+                          count='1', duration='60')
+
+    def test_not_enough_resources(self):
+        self.assertWindow(None, None, count='3', duration='60')
+
+    def test_invalid(self):
+        self.assertRaises(exceptions.InvalidInput, self.api.get_availability,
+                          {'resource_type': 'virtual:instance',
+                           'duration': '60'})
+        self.assertRaises(exceptions.InvalidInput, self.api.get_availability,
+                          {'resource_type': 'physical:host'})
+        self.assertRaises(exceptions.InvalidInput, self.api.get_availability,
+                          {'resource_type': 'physical:host',
+                           'duration': '0'})
+
+
+class HostReservationsTestCase(test.DBTestCase):
+    """Test case for API.get_host_reservations()."""
+
+    def test_get_host_reservations(self):
+        timeutils.set_time_override(datetime.datetime(2030, 1, 1, 12, 0))
+        self.addCleanup(timeutils.clear_time_override)
+        _create_lease('l1', 'host1', datetime.datetime(2030, 1, 1, 0, 0),
+                      datetime.datetime(2030, 1, 1, 12, 0))
+        _create_lease('l2', 'host2', datetime.datetime(2030, 1, 1, 10, 0),
+                      datetime.datetime(2030, 1, 2, 0, 0))
+        reservations = service.API().get_host_reservations()
+        self.assertEqual(1, len(reservations))
+        self.assertEqual('host2', reservations[0]['host'])
+        self.assertEqual(datetime.datetime(2030, 1, 1, 10, 0),
+                         reservations[0]['start_date'])
+        self.assertEqual(datetime.datetime(2030, 1, 2, 0, 0),
+                         reservations[0]['end_date'])
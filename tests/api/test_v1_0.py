@@ -0,0 +1,320 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import json
+
+import flask
+import sqlalchemy as sa
+
+from climate.api import utils as api_utils
+from climate.api import v1_0
+from climate import context
+from climate.db import api as db_api
+from climate.db.sqlalchemy import api as sqlalchemy_api
+from climate.openstack.common.fixture import mockpatch
+from climate.scheduler import rpcapi as scheduler_rpcapi
+from climate import test
+
+
+def _batch_lease(name, host, start_date, end_date):
+    return {'name': name,
+            'start_date': '2030-01-%s' % start_date,
+            'end_date': '2030-01-%s' % end_date,
+            'trust': 'trust',
+            'reservations': [{'resource_id': host,
+                              'resource_type': 'physical:host'}]}
+
+
+def _lease_values(name='lease'):
+    return {'name': name,
+            'start_date': datetime.datetime(2030, 1, 1),
+            'end_date': datetime.datetime(2030, 1, 2),
+            'trust': 'trust',
+            'reservations': [{'resource_id': 'host1',
+                              'resource_type': 'physical:host'}],
+            'events': []}
+
+
+class LeasesTestBase(test.DBTestCase):
+    """Base test case for the leases endpoints, with a lease to request."""
+
+    headers = {
+        'X-User-Id': u'user',
+        'X-Tenant-Id': u'tenant',
+        'X-Auth-Token': u'token',
+        'X-Service-Catalog': u'',
+        'X-User-Name': u'user_name',
+        'X-Tenant-Name': u'tenant_name',
+        'X-Roles': u'admin',
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+    }
+
+    def setUp(self):
+        super(LeasesTestBase, self).setUp()
+        app = flask.Flask('climate.api')
+        app.register_blueprint(v1_0.rest, url_prefix='/v1')
+        app.teardown_request(lambda _ex=None: context.Context.clear())
+        self.client = app.test_client()
+        self.lease = db_api.lease_create(_lease_values())
+        self.url = '/v1/leases/%s' % self.lease['id']
+
+    def request(self, method, url, data=None, headers=None):
+        headers = dict(self.headers, **(headers or {}))
+        if data is not None:
+            data = json.dumps(data)
+        return getattr(self.client, method)(url, data=data, headers=headers)
+
+
+class LeasesTestCase(LeasesTestBase):
+    """Test case for the leases endpoints of the v1.0 API."""
+
+    def _stream_by_lease(self, fail_after=None):
+        """Stream the leases one by one, and record the user of the context
+        each chunk of leases is read in.
+        """
+        for obj, attr in ((sqlalchemy_api, 'LEASE_ITER_CHUNK_SIZE'),
+                          (api_utils, 'STREAM_CHUNK_SIZE')):
+            self.useFixture(mockpatch.PatchObject(obj, attr, new=1))
+        for name in ('lease2', 'lease3'):
+            db_api.lease_create(_lease_values(name))
+
+        lease_page = sqlalchemy_api._lease_page
+        users = []
+
+        def _lease_page(*args):
+            if len(users) == fail_after:
+                raise RuntimeError('DB connection lost')
+            users.append(context.Context.current().user_id)
+            return lease_page(*args)
+
+        self.useFixture(mockpatch.PatchObject(sqlalchemy_api, '_lease_page',
+                                              new=_lease_page))
+        return users
+
+    def test_list(self):
+        users = self._stream_by_lease()
+        response = self.request('get', '/v1/leases?fields=name')
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(['lease', 'lease2', 'lease3'], sorted(
+            l['name'] for l in json.loads(response.data)['leases']))
+        self.assertEqual(['user'] * 4, users)
+
+    def test_list_error_while_streaming(self):
+        """Check an error after the first chunk is not answered with a
+        complete document.
+        """
+        self._stream_by_lease(fail_after=1)
+        response = self.request('get', '/v1/leases')
+        self.assertEqual(200, response.status_code)
+        self.assertRaises(RuntimeError, getattr, response, 'data')
+
+    def test_get(self):
+        response = self.request('get', self.url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('"0"', response.headers['ETag'])
+        self.assertEqual(self.lease['id'],
+                         json.loads(response.data)['lease']['id'])
+
+    def test_get_not_modified(self):
+        response = self.request('get', self.url,
+                                headers={'If-None-Match': '"0"'})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual('"0"', response.headers['ETag'])
+
+    def test_get_modified(self):
+        db_api.lease_update(self.lease['id'], {'name': 'renamed'})
+        response = self.request('get', self.url,
+                                headers={'If-None-Match': '"0"'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('"1"', response.headers['ETag'])
+
+    def test_get_not_found(self):
+        response = self.request('get', '/v1/leases/nope')
+        self.assertEqual(404, response.status_code)
+
+    def test_update_if_match(self):
+        response = self.request('put', self.url, {'name': 'renamed'},
+                                headers={'If-Match': '"0"'})
+        self.assertEqual(202, response.status_code)
+        self.assertEqual('renamed',
+                         json.loads(response.data)['lease']['name'])
+        self.assertEqual(1, db_api.lease_version(self.lease['id']))
+
+    def test_update_if_match_failed(self):
+        db_api.lease_update(self.lease['id'], {'name': 'renamed'})
+        response = self.request('put', self.url, {'name': 'renamed_again'},
+                                headers={'If-Match': '"0"'})
+        self.assertEqual(412, response.status_code)
+        self.assertEqual('renamed',
+                         db_api.lease_get(self.lease['id'])['name'])
+
+    def test_update_if_match_failed_at_write(self):
+        """Check a lease modified after its ETag was checked is not
+        overwritten.
+        """
+        db_api.lease_update(self.lease['id'], {'name': 'renamed'})
+        self.patch(db_api, 'lease_version').return_value = 0
+        response = self.request('put', self.url, {'name': 'renamed_again'},
+                                headers={'If-Match': '"0"'})
+        self.assertEqual(412, response.status_code)
+        self.assertEqual('renamed',
+                         db_api.lease_get(self.lease['id'])['name'])
+
+    def test_update_invalid(self):
+        response = self.request('put', self.url, {'trust': 'other'})
+        self.assertEqual(400, response.status_code)
+
+    def test_delete_if_match(self):
+        response = self.request('delete', self.url,
+                                headers={'If-Match': '"0"'})
+        self.assertEqual(204, response.status_code)
+        self.assertIsNone(db_api.lease_get(self.lease['id']))
+
+    def test_delete_if_match_failed(self):
+        db_api.lease_update(self.lease['id'], {'name': 'renamed'})
+        response = self.request('delete', self.url,
+                                headers={'If-Match': '"0"'})
+        self.assertEqual(412, response.status_code)
+        self.assertIsNotNone(db_api.lease_get(self.lease['id']))
+
+    def test_availability(self):
+        for name in ('host1', 'host2'):
+            db_api.host_create({'hypervisor_hostname': name,
+                                'vcpus': 4, 'memory_mb': 8192,
+                                'local_gb': 100})
+        response = self.request(
+            'get', '/v1/leases/availability?resource_type=physical:host'
+                   '&count=2&duration=60&after=2030-01-01%2000:00')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({'resource_type': 'physical:host', 'count': 2,
+                          'start_date': '2030-01-02T00:00:00',
+                          'end_date': '2030-01-02T01:00:00'},
+                         json.loads(response.data)['availability'])
+
+    def test_availability_invalid(self):
+        response = self.request(
+            'get', '/v1/leases/availability?resource_type=physical:host')
+        self.assertEqual(400, response.status_code)
+
+    def test_host_reservations(self):
+        response = self.request('get', '/v1/os-hosts/reservations')
+        self.assertEqual(200, response.status_code)
+        reservations = json.loads(response.data)['reservations']
+        self.assertEqual(1, len(reservations))
+        reservation = reservations[0]
+        self.assertEqual(('host1', '2030-01-01T00:00:00',
+                          '2030-01-02T00:00:00'),
+                         (reservation['host'], reservation['start_date'],
+                          reservation['end_date']))
+
+    def test_create_batch(self):
+        events_changed = self.patch(scheduler_rpcapi.SchedulerAPI,
+                                    'events_changed')
+        response = self.request('post', '/v1/leases:batch', {'leases': [
+            _batch_lease('l1', 'host1', '02 00:00', '03 00:00'),
+            _batch_lease('l2', 'host2', '01 00:00', '03 00:00'),
+        ]})
+        self.assertEqual(202, response.status_code)
+        self.assertEqual(2, len(json.loads(response.data)['leases']))
+        self.assertTrue(events_changed.called)
+
+    def test_create_batch_invalid(self):
+        lease = _batch_lease('l1', 'host2', '02 00:00', '03 00:00')
+        missing_date = dict(lease)
+        del missing_date['end_date']
+        for leases in (['l1'],
+                       [missing_date],
+                       [dict(lease, end_date='2030-01-01 00:00')],
+                       [dict(lease, reservations='host2')],
+                       [dict(lease, reservations=[{'resource_id': 'host2'}])],
+                       [dict(lease, events=[{'time': 'tomorrow'}])]):
+            response = self.request('post', '/v1/leases:batch',
+                                    {'leases': leases})
+            self.assertEqual(400, response.status_code, leases)
+            self.assertEqual('INVALID_INPUT',
+                             json.loads(response.data)['error_name'])
+        self.assertEqual(1, len(db_api.lease_list()))
+
+    def test_create_batch_resource_busy(self):
+        response = self.request('post', '/v1/leases:batch', {'leases': [
+            _batch_lease('l1', 'host1', '01 12:00', '03 00:00'),
+        ]})
+        self.assertEqual(400, response.status_code)
+        error = json.loads(response.data)
+        self.assertEqual('RESOURCE_BUSY', error['error_name'])
+        self.assertEqual('host1 is already reserved between '
+                         '2030-01-01 12:00:00 and 2030-01-03 00:00:00',
+                         error['error_message'])
+
+    def test_create_batch_resource_reserved_twice(self):
+        response = self.request('post', '/v1/leases:batch', {'leases': [
+            _batch_lease('l1', 'host2', '01 00:00', '03 00:00'),
+            _batch_lease('l2', 'host2', '02 00:00', '04 00:00'),
+        ]})
+        self.assertEqual(400, response.status_code)
+        self.assertEqual(1, len(db_api.lease_list()))
+
+
+class LeasesQueryCountTestCase(LeasesTestBase):
+    """Test case for the number of SQL statements run by the leases
+    endpoints.
+    """
+
+    def setUp(self):
+        super(LeasesQueryCountTestCase, self).setUp()
+        self.statements = None
+        sa.event.listen(sqlalchemy_api.get_engine(), 'before_cursor_execute',
+                        self._count_statement)
+
+    def _count_statement(self, conn, cursor, statement, *args):
+        if self.statements is not None:
+            self.statements.append(statement)
+
+    def assertStatementsCount(self, count, status_code, method, *args,
+                              **kwargs):
+        self.statements = []
+        try:
+            response = self.request(method, *args, **kwargs)
+        finally:
+            statements, self.statements = self.statements, None
+        self.assertEqual(status_code, response.status_code)
+        self.assertEqual(count, len(statements), statements)
+
+    def test_get(self):
+        # The lease and its reservations and events, the ETag comes from it
+        self.assertStatementsCount(3, 200, 'get', self.url)
+
+    def test_get_not_modified(self):
+        self.assertStatementsCount(1, 304, 'get', self.url,
+                                   headers={'If-None-Match': '"0"'})
+
+    def test_get_modified(self):
+        self.assertStatementsCount(4, 200, 'get', self.url,
+                                   headers={'If-None-Match': '"1"'})
+
+    def test_update(self):
+        # The version, then the UPDATE and the lease read again
+        self.assertStatementsCount(5, 202, 'put', self.url,
+                                   {'name': 'renamed'},
+                                   headers={'If-Match': '"0"'})
+
+    def test_delete(self):
+        # The version, the version bumped, the lease and its reservations
+        # and events, then the DELETEs of the lease and its reservations
+        self.assertStatementsCount(7, 204, 'delete', self.url,
+                                   headers={'If-Match': '"0"'})
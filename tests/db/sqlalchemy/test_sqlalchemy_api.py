@@ -15,10 +15,19 @@
 
 import datetime
 
+import mock
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from climate import context as climate_context
 from climate.db.sqlalchemy import api as db_api
+from climate import exceptions
 from climate.openstack.common import context
+from climate.openstack.common.fixture import mockpatch
+from climate.openstack.common import timeutils
 from climate.openstack.common import uuidutils
 from climate import test
+from climate.utils import partitions
 
 
 def _get_fake_random_uuid():
@@ -139,6 +148,34 @@ class SQLAlchemyDBApiTestCase(test.DBTestCase):
                           _get_fake_phys_lease_values()['name'])
         self.assertEqual(1, len(db_api.event_get_all()))
 
+    def test_create_bulk_leases(self):
+        """Create several leases at once and check all tables."""
+        leases = [_get_fake_phys_lease_values(id=_get_fake_random_uuid(),
+                                              name='fake%d' % i)
+                  for i in range(3)]
+        leases[0]['events'].append(
+            _get_fake_event_values(lease_id=leases[0]['id']))
+        del leases[1]['id']
+
+        lease_ids = db_api.lease_create_bulk(leases)
+        self.assertEqual(3, len(lease_ids))
+        self.assertEqual(leases[0]['id'], lease_ids[0])
+        self.assertEqual(3, len(db_api.lease_get_all()))
+        self.assertEqual(3, len(db_api.reservation_get_all()))
+        self.assertEqual(1, len(db_api.event_get_all()))
+
+        lease = db_api.lease_get(lease_ids[1])
+        self.assertEqual('fake1', lease['name'])
+        self.assertIsNotNone(lease['created_at'])
+        self.assertEqual(lease_ids[1], lease['reservations'][0]['lease_id'])
+
+    def test_create_bulk_duplicate_leases(self):
+        """Create leases with same names in bulk, and check none exists."""
+        leases = [_get_fake_phys_lease_values(id=_get_fake_random_uuid()),
+                  _get_fake_phys_lease_values(id=_get_fake_random_uuid())]
+        self.assertRaises(RuntimeError, db_api.lease_create_bulk, leases)
+        self.assertEqual(0, len(db_api.lease_get_all()))
+
     def test_delete_wrong_lease(self):
         """Delete a lease that doesn't exist and check that raises an error."""
         self.assertRaises(RuntimeError, db_api.lease_destroy, 'fake_id')
@@ -160,6 +197,102 @@ class SQLAlchemyDBApiTestCase(test.DBTestCase):
         _create_physical_lease(random=True)
         self.assertEqual(2, len(db_api.lease_get_all()))
 
+    def test_lease_get_all_rows(self):
+        """Check listed leases match the leases got one by one."""
+        lease = _create_physical_lease()
+        db_api.event_create(_get_fake_event_values(lease_id=lease['id']))
+        result = db_api.lease_get_all()
+        self.assertEqual(1, len(result))
+        self.assertEqual(db_api.lease_get(lease['id']).to_dict(),
+                         result[0].to_dict())
+        self.assertEqual(lease['name'], result[0]['name'])
+        self.assertRaises(AttributeError, setattr, result[0], 'foo', 'bar')
+
+    def test_lease_get_all_by_filters_pagination(self):
+        """Check leases are listed page by page."""
+        lease_ids = db_api.lease_create_bulk(
+            [_get_fake_phys_lease_values(id=_get_fake_random_uuid(),
+                                         name='fake%d' % i)
+             for i in range(5)])
+
+        page = db_api.lease_get_all_by_filters(limit=3)
+        self.assertEqual(sorted(lease_ids)[:3], [l['id'] for l in page])
+        page = db_api.lease_get_all_by_filters(limit=3,
+                                               marker=page[-1]['id'])
+        self.assertEqual(sorted(lease_ids)[3:], [l['id'] for l in page])
+        self.assertRaises(exceptions.InvalidInput,
+                          db_api.lease_get_all_by_filters, marker='fake_id')
+
+    def test_lease_iter_by_filters(self):
+        """Check leases are iterated on by chunks, page by page."""
+        self.useFixture(mockpatch.PatchObject(db_api,
+                                              'LEASE_ITER_CHUNK_SIZE', new=2))
+        lease_ids = sorted(db_api.lease_create_bulk(
+            [_get_fake_phys_lease_values(id=_get_fake_random_uuid(),
+                                         name='fake%d' % i)
+             for i in range(5)]))
+
+        self.assertEqual(lease_ids, [l.id for l in
+                                     db_api.lease_iter_by_filters()])
+        self.assertEqual(lease_ids[:3], [l.id for l in
+                                         db_api.lease_iter_by_filters(
+                                             limit=3)])
+        self.assertEqual(lease_ids[2:], [l['id'] for l in
+                                         db_api.lease_iter_by_filters(
+                                             marker=lease_ids[1],
+                                             fields=['name'])])
+        self.assertRaises(exceptions.InvalidInput,
+                          db_api.lease_iter_by_filters, marker='fake_id')
+
+    def test_lease_get_all_by_filters(self):
+        """Check leases are filtered by name, status and dates."""
+        lease = _get_fake_phys_lease_values(id='1', name='fake1')
+        lease['reservations'][0]['status'] = 'active'
+        _create_physical_lease(values=lease)
+        lease = _get_fake_phys_lease_values(id='2', name='fake2')
+        lease['start_date'] = _get_datetime('2030-02-01 00:00')
+        lease['end_date'] = _get_datetime('2030-02-02 00:00')
+        _create_physical_lease(values=lease)
+
+        def ids(**filters):
+            return [l['id'] for l in db_api.lease_get_all_by_filters(filters)]
+
+        self.assertEqual(['2'], ids(name='fake2'))
+        self.assertEqual(['1'], ids(status='active'))
+        self.assertEqual(['2'],
+                         ids(start_date=_get_datetime('2030-01-02 00:00')))
+        self.assertEqual(['1'],
+                         ids(start_date=_get_datetime('2030-01-01 12:00'),
+                             end_date=_get_datetime('2030-02-01 00:00')))
+
+    def test_lease_get_all_by_filters_fields(self):
+        """Check only requested columns of leases are returned."""
+        _create_physical_lease()
+        leases = db_api.lease_get_all_by_filters(fields=['name'])
+        self.assertEqual([{'id': _get_fake_lease_uuid(),
+                           'name': 'fake_phys_lease'}], leases)
+        self.assertRaises(exceptions.InvalidInput,
+                          db_api.lease_get_all_by_filters,
+                          fields=['reservations'])
+
+    def test_lease_get_all_by_tenant_and_user(self):
+        """Check leases are found by tenant and by user."""
+        for i, (tenant_id, user_id) in enumerate([('t1', 'u1'),
+                                                  ('t1', 'u2'),
+                                                  ('t2', 'u2')]):
+            lease = _get_fake_phys_lease_values(id=str(i), name='fake%d' % i)
+            lease.update(tenant_id=tenant_id, user_id=user_id)
+            _create_physical_lease(values=lease)
+
+        self.assertEqual(['0', '1'], sorted(
+            l['id'] for l in db_api.lease_get_all_by_tenant('t1')))
+        self.assertEqual(['1', '2'], sorted(
+            l['id'] for l in db_api.lease_get_all_by_user('u2')))
+        self.assertEqual([], db_api.lease_get_all_by_tenant('t3'))
+        self.assertEqual(['2'], [l['id'] for l in
+                                 db_api.lease_get_all_by_filters(
+                                     {'tenant_id': 't2'})])
+
     def test_lease_list(self):
         """Not implemented yet until lease_list returns list of IDs."""
         # TODO(sbauza): Enable this test when lease_list will return only IDs
@@ -182,3 +315,517 @@ class SQLAlchemyDBApiTestCase(test.DBTestCase):
             values={'start_date': _get_datetime('2014-02-01 00:00')})
         self.assertEquals(_get_datetime('2014-02-01 00:00'),
                           result['start_date'])
+
+    def test_lease_version(self):
+        """Check the version of a lease changes with its children, even
+        within the same second.
+        """
+        self.assertIsNone(db_api.lease_version('nope'))
+        lease = _create_physical_lease()
+        versions = [db_api.lease_version(lease['id'])]
+
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        event = db_api.event_create(_get_fake_event_values(lease['id']))
+        versions.append(db_api.lease_version(lease['id']))
+        db_api.event_update(event['id'], {'status': 'DONE'})
+        versions.append(db_api.lease_version(lease['id']))
+        db_api.reservation_update(lease['reservations'][0]['id'],
+                                  {'status': 'active'})
+        versions.append(db_api.lease_version(lease['id']))
+        db_api.lease_update(lease['id'], {'name': 'lease_renamed'})
+        versions.append(db_api.lease_version(lease['id']))
+
+        self.assertEqual([0, 1, 2, 3, 4], versions)
+
+    def test_lease_update_with_version(self):
+        """Check a lease is only updated if it still has the version."""
+        lease = _create_physical_lease()
+        result = db_api.lease_update(lease['id'], {'name': 'renamed'}, 0)
+        self.assertEqual(1, result['version'])
+        self.assertRaises(exceptions.ConstraintNotMet, db_api.lease_update,
+                          lease['id'], {'name': 'renamed_again'}, 0)
+        self.assertEqual('renamed', db_api.lease_get(lease['id'])['name'])
+
+    def test_lease_destroy_with_version(self):
+        """Check a lease is only deleted if it still has the version."""
+        lease = _create_physical_lease()
+        db_api.lease_update(lease['id'], {'name': 'renamed'})
+        self.assertRaises(exceptions.ConstraintNotMet, db_api.lease_destroy,
+                          lease['id'], 0)
+        db_api.lease_destroy(lease['id'], 1)
+        self.assertIsNone(db_api.lease_get(lease['id']))
+
+    def test_lease_ids_overlapping(self):
+        """Check leases reserving a resource are found by period."""
+        _create_physical_lease()
+        self.assertEqual(
+            [_get_fake_lease_uuid()],
+            db_api.lease_ids_overlapping('1234',
+                                         _get_datetime('2030-01-01 12:00'),
+                                         _get_datetime('2030-01-03 00:00')))
+        self.assertFalse(
+            db_api.resource_is_free('1234',
+                                    _get_datetime('2029-12-31 00:00'),
+                                    _get_datetime('2030-01-01 00:01')))
+        self.assertTrue(
+            db_api.resource_is_free('1234',
+                                    _get_datetime('2030-01-02 00:00'),
+                                    _get_datetime('2030-01-03 00:00')))
+        self.assertTrue(
+            db_api.resource_is_free('5678',
+                                    _get_datetime('2030-01-01 00:00'),
+                                    _get_datetime('2030-01-02 00:00')))
+
+    def test_lease_create_bulk_check_resources(self):
+        """Check a resource is not reserved twice by a bulk creation."""
+        _create_physical_lease()
+
+        def lease(name, resource_id, start, end):
+            values = _get_fake_phys_lease_values(id=_get_fake_random_uuid(),
+                                                 name=name)
+            values['start_date'] = _get_datetime(start)
+            values['end_date'] = _get_datetime(end)
+            values['reservations'][0]['resource_id'] = resource_id
+            return values
+
+        self.assertRaises(exceptions.ResourceBusy, db_api.lease_create_bulk,
+                          [lease('l1', '1234', '2030-01-01 12:00',
+                                 '2030-01-03 00:00')],
+                          check_resources=True)
+        self.assertRaises(exceptions.ResourceBusy, db_api.lease_create_bulk,
+                          [lease('l1', '5678', '2030-01-01 00:00',
+                                 '2030-01-03 00:00'),
+                           lease('l2', '5678', '2030-01-02 00:00',
+                                 '2030-01-04 00:00')],
+                          check_resources=True)
+        self.assertEqual(1, len(db_api.lease_get_all()))
+
+        db_api.lease_create_bulk([lease('l1', '1234', '2030-01-02 00:00',
+                                        '2030-01-03 00:00'),
+                                  lease('l2', '5678', '2030-01-01 00:00',
+                                        '2030-01-03 00:00')],
+                                 check_resources=True)
+        self.assertEqual(3, len(db_api.lease_get_all()))
+
+    def test_lock_resources(self):
+        """Check the resources are locked according to the DB."""
+        session = mock.Mock()
+        session.bind.dialect.name = 'postgresql'
+        db_api._lock_resources(session, set(['1234', '5678']))
+        self.assertEqual(2, session.execute.call_count)
+        self.assertIn('pg_advisory_xact_lock',
+                      str(session.execute.call_args[0][0]))
+
+        session.reset_mock()
+        session.bind.dialect.name = 'mysql'
+        db_api._lock_resources(session, set(['1234', '5678']))
+        self.assertEqual(1, session.execute.call_count)
+        self.assertIn('FOR UPDATE', str(session.execute.call_args[0][0]))
+
+        session.reset_mock()
+        session.bind.dialect.name = 'sqlite'
+        db_api._lock_resources(session, set(['1234', '5678']))
+        self.assertFalse(session.execute.called)
+
+    def test_resource_is_free_follows_lease_changes(self):
+        """Check resource_is_free sees the lease writes."""
+        start = _get_datetime('2030-01-01 12:00')
+        end = _get_datetime('2030-01-01 13:00')
+        self.assertTrue(db_api.resource_is_free('1234', start, end))
+
+        lease = _create_physical_lease()
+        self.assertFalse(db_api.resource_is_free('1234', start, end))
+
+        db_api.lease_update(lease['id'],
+                            {'start_date': _get_datetime('2030-02-01 00:00'),
+                             'end_date': _get_datetime('2030-02-02 00:00')})
+        self.assertTrue(db_api.resource_is_free('1234', start, end))
+
+        db_api.lease_destroy(lease['id'])
+        self.assertEqual([], db_api.lease_ids_overlapping(
+            '1234', _get_datetime('2030-01-01 00:00'),
+            _get_datetime('2031-01-01 00:00')))
+
+    def test_resource_index_follows_lease_changes(self):
+        """Check the resource index is kept up to date on lease writes."""
+        start = _get_datetime('2030-01-01 12:00')
+        end = _get_datetime('2030-01-01 13:00')
+        index = db_api.resource_index('physical:host')
+        self.assertEqual(set(), index.keys_overlapping(start, end))
+
+        lease = _create_physical_lease()
+        self.assertEqual([lease['id']], index.overlapping('1234', start, end))
+
+        db_api.lease_update(lease['id'],
+                            {'start_date': _get_datetime('2030-02-01 00:00'),
+                             'end_date': _get_datetime('2030-02-02 00:00')})
+        self.assertEqual([], index.overlapping('1234', start, end))
+
+        db_api.lease_destroy(lease['id'])
+        self.assertEqual(0, len(index))
+        self.assertIs(index, db_api.resource_index('physical:host'))
+
+    def test_resource_index_ttl(self):
+        """Check the resource index sees the writes of other processes."""
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        index = db_api.resource_index('physical:host')
+        # Lease written without the index knowing, as by another process
+        self.useFixture(mockpatch.PatchObject(db_api, '_RESOURCE_INDEXES',
+                                              new={}))
+        lease = _create_physical_lease()
+        db_api._RESOURCE_INDEXES.update({'physical:host': (
+            timeutils.utcnow_ts(), index)})
+        self.assertIs(index, db_api.resource_index('physical:host'))
+
+        timeutils.advance_time_seconds(60)
+        index = db_api.resource_index('physical:host')
+        self.assertEqual([lease['id']], index.overlapping(
+            '1234', lease['start_date'], lease['end_date']))
+
+    def test_resource_timeline_follows_lease_changes(self):
+        """Check the timeline is cached until the resource index changes."""
+        start = _get_datetime('2030-01-01 12:00')
+        end = _get_datetime('2030-01-01 13:00')
+        timeline = db_api.resource_timeline('physical:host', 2)
+        self.assertEqual(2, timeline.min_free(start, end))
+        self.assertIs(timeline, db_api.resource_timeline('physical:host', 2))
+
+        lease = _create_physical_lease()
+        timeline = db_api.resource_timeline('physical:host', 2)
+        self.assertEqual(1, timeline.min_free(start, end))
+        self.assertIs(timeline, db_api.resource_timeline('physical:host', 2))
+        self.assertEqual(2, db_api.resource_timeline(
+            'physical:host', 3).min_free(start, end))
+
+        db_api.lease_destroy(lease['id'])
+        self.assertEqual(3, db_api.resource_timeline(
+            'physical:host', 3).min_free(start, end))
+
+    def test_resource_timeline_ttl(self):
+        """Check the timeline is built again along with the index."""
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        timeline = db_api.resource_timeline('physical:host', 1)
+        self.assertIs(timeline, db_api.resource_timeline('physical:host', 1))
+
+        timeutils.advance_time_seconds(60)
+        self.assertIsNot(timeline,
+                         db_api.resource_timeline('physical:host', 1))
+
+    def test_context_shares_session(self):
+        checkouts = []
+        sa.event.listen(db_api.get_engine(), 'checkout',
+                        lambda *args: checkouts.append(args))
+        with climate_context.Context():
+            session = db_api.get_session()
+            lease = _create_physical_lease()
+            db_api.event_create(_get_fake_event_values())
+            db_api.lease_update(lease['id'], {'name': 'updated'})
+            self.assertEqual('updated', db_api.lease_get(lease['id'])['name'])
+            self.assertEqual(1, len(db_api.event_get_all()))
+            self.assertIs(session, db_api.get_session())
+        self.assertEqual(1, len(checkouts))
+        self.assertTrue(session.bind.closed)
+
+    def test_event_partition(self):
+        """Check events get the partition of their lease."""
+        lease = _get_fake_phys_lease_values()
+        lease['events'].append(_get_fake_event_values(lease_id=lease['id']))
+        db_api.lease_create(lease)
+        event = db_api.event_create(_get_fake_event_values())
+        expected = partitions.partition_of(_get_fake_lease_uuid())
+        self.assertEqual(expected, event['partition'])
+        self.assertEqual(
+            2, len(db_api.event_get_all_sorted_by_filters(
+                'time', 'asc', {'partitions': [expected]})))
+        self.assertEqual(
+            [], db_api.event_get_all_sorted_by_filters(
+                'time', 'asc', {'partitions': [expected + 1]}))
+
+    def test_event_partition_without_lease(self):
+        """Check events without a lease get the first partition."""
+        event = db_api.event_create(_get_fake_event_values(lease_id=None))
+        self.assertEqual(0, event['partition'])
+
+    def test_event_update_with_constraint(self):
+        """Check an event is only updated if it meets the constraint."""
+        _create_physical_lease()
+        event = db_api.event_create(dict(_get_fake_event_values(),
+                                         status='UNDONE'))
+        undone = db_api.constraint(status=db_api.equal_any('UNDONE'))
+
+        result = db_api.event_update(event['id'], {'status': 'IN_PROGRESS'},
+                                     undone)
+        self.assertEqual('IN_PROGRESS', result['status'])
+        self.assertRaises(exceptions.ConstraintNotMet, db_api.event_update,
+                          event['id'], {'status': 'IN_PROGRESS'}, undone)
+
+    def test_scheduler_workers(self):
+        """Check scheduler workers are alive until their heartbeat is old."""
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.set_time_override(_get_datetime('2030-01-01 00:00'))
+        db_api.scheduler_worker_heartbeat('worker1')
+        timeutils.advance_time_seconds(20)
+        db_api.scheduler_worker_heartbeat('worker2')
+        self.assertEqual(['worker1', 'worker2'],
+                         sorted(db_api.scheduler_worker_get_all_alive(30)))
+
+        timeutils.advance_time_seconds(20)
+        self.assertEqual(['worker2'],
+                         db_api.scheduler_worker_get_all_alive(30))
+        db_api.scheduler_worker_heartbeat('worker1')
+        self.assertEqual(['worker1', 'worker2'],
+                         sorted(db_api.scheduler_worker_get_all_alive(30)))
+
+        db_api.scheduler_worker_destroy('worker2')
+        self.assertEqual(['worker1'],
+                         db_api.scheduler_worker_get_all_alive(30))
+
+    def test_event_claim_due(self):
+        """Check due events are claimed once, soonest first."""
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.set_time_override(_get_datetime('2030-03-01 00:00'))
+        _create_physical_lease()
+        for event_id, time in (('late', '2030-03-01 00:00'),
+                               ('early', '2030-02-01 00:00'),
+                               ('future', '2030-04-01 00:00')):
+            db_api.event_create(dict(_get_fake_event_values(),
+                                     id=event_id, status='UNDONE',
+                                     time=_get_datetime(time)))
+
+        claimed = db_api.event_claim_due(1, 'worker1')
+        self.assertEqual(['early'], [event.id for event in claimed])
+        self.assertEqual('IN_PROGRESS', claimed[0].status)
+        self.assertEqual('worker1', claimed[0].worker_id)
+        self.assertEqual(1, claimed[0].version)
+
+        claimed = db_api.event_claim_due(10, 'worker2')
+        self.assertEqual(['late'], [event.id for event in claimed])
+        self.assertEqual([], db_api.event_claim_due(10, 'worker1'))
+        self.assertEqual('UNDONE', db_api.event_get('future')['status'])
+
+    def test_event_reclaim(self):
+        """Check events of dead or late workers are made UNDONE again."""
+        self.addCleanup(timeutils.clear_time_override)
+        timeutils.set_time_override(_get_datetime('2030-03-01 00:00'))
+        _create_physical_lease()
+        for event_id in ('event1', 'event2'):
+            db_api.event_create(dict(_get_fake_event_values(), id=event_id,
+                                     status='UNDONE',
+                                     time=_get_datetime('2030-02-01 00:00')))
+        db_api.event_claim_due(1, 'worker1')
+        db_api.event_claim_due(1, 'worker2')
+
+        self.assertEqual(1, db_api.event_reclaim(3600, ['worker1']))
+        event = db_api.event_get('event2')
+        self.assertEqual(('UNDONE', None, 2),
+                         (event.status, event.worker_id, event.version))
+        self.assertEqual(0, db_api.event_reclaim(3600))
+
+        timeutils.advance_time_seconds(3601)
+        self.assertEqual(1, db_api.event_reclaim(3600, ['worker1']))
+        self.assertEqual('UNDONE', db_api.event_get('event1').status)
+
+    def test_event_claim_due_by_partitions(self):
+        """Check only the events of the given partitions are claimed."""
+        _create_physical_lease()
+        db_api.event_create(dict(_get_fake_event_values(), status='UNDONE',
+                                 time=_get_datetime('2000-01-01 00:00')))
+        partition = partitions.partition_of(_get_fake_lease_uuid())
+        self.assertEqual([], db_api.event_claim_due(10, 'worker1', []))
+        self.assertEqual([], db_api.event_claim_due(10, 'worker1',
+                                                    [partition + 1]))
+        self.assertEqual(1, len(db_api.event_claim_due(10, 'worker1',
+                                                       [partition])))
+
+    def test_event_count_due(self):
+        """Check due events not claimed yet are counted by type."""
+        _create_physical_lease()
+        for event_id, event_type in (('start', 'start_lease'),
+                                     ('end', 'end_lease'),
+                                     ('end2', 'end_lease')):
+            db_api.event_create(dict(_get_fake_event_values(), id=event_id,
+                                     event_type=event_type, status='UNDONE',
+                                     time=_get_datetime('2000-01-01 00:00')))
+        db_api.event_claim_due(1, 'worker1')
+        partition = partitions.partition_of(_get_fake_lease_uuid())
+
+        self.assertEqual(2, sum(db_api.event_count_due().values()))
+        self.assertEqual(db_api.event_count_due(),
+                         db_api.event_count_due([partition]))
+        self.assertEqual({}, db_api.event_count_due([]))
+        self.assertEqual({}, db_api.event_count_due([partition + 1]))
+
+    def test_event_claim_skip_locked_statement(self):
+        """Check claims skip the events locked by other workers."""
+        statement = db_api._SelectSkipLocked(
+            [db_api.models.Event.id], limit=1, for_update=True)
+        compiled = unicode(statement.compile(
+            dialect=postgresql.dialect()))
+        self.assertTrue(compiled.endswith('FOR UPDATE SKIP LOCKED'),
+                        compiled)
+
+    def test_host_crud(self):
+        """Create, update and delete a compute host."""
+        host = db_api.host_create({'hypervisor_hostname': 'host1',
+                                   'vcpus': 4, 'memory_mb': 8192,
+                                   'local_gb': 100,
+                                   'properties': {'arch': 'x86_64'}})
+        self.assertEqual({'arch': 'x86_64'},
+                         db_api.host_get(host['id'])['properties'])
+
+        db_api.host_update(host['id'], {'vcpus': 8})
+        self.assertEqual(8, db_api.host_get(host['id'])['vcpus'])
+
+        db_api.host_destroy(host['id'])
+        self.assertEqual([], db_api.host_get_all())
+
+    def test_host_get_all_by_queries(self):
+        """Check hosts are filtered on their columns and properties."""
+        for name, vcpus, aggregate in (('host1', 16, 'gpu'),
+                                       ('host2', 32, 'gpu'),
+                                       ('host3', 32, 'cpu')):
+            db_api.host_create({'hypervisor_hostname': name,
+                                'vcpus': vcpus, 'memory_mb': 8192,
+                                'local_gb': 100,
+                                'properties': {'aggregate': aggregate}})
+
+        hosts = db_api.host_get_all_by_queries(['vcpus >= 32'])
+        self.assertEqual(['host2', 'host3'],
+                         sorted(h.hypervisor_hostname for h in hosts))
+        hosts = db_api.host_get_all_by_queries(['vcpus >= 32',
+                                                'aggregate = gpu'])
+        self.assertEqual(['host2'], [h.hypervisor_hostname for h in hosts])
+
+
+class SQLAlchemyDBApiQueryCountTestCase(test.DBTestCase):
+    """Test case for the number of SQL statements run by the DB API."""
+
+    def setUp(self):
+        super(SQLAlchemyDBApiQueryCountTestCase, self).setUp()
+        self.set_context(context.get_admin_context())
+        self.statements = None
+        sa.event.listen(db_api.get_engine(), 'before_cursor_execute',
+                        self._count_statement)
+
+    def _count_statement(self, conn, cursor, statement, *args):
+        if self.statements is not None:
+            self.statements.append(statement)
+
+    def assertStatementsCount(self, count, func, *args):
+        self.statements = []
+        try:
+            result = func(*args)
+            if hasattr(result, 'to_dict'):
+                result.to_dict()
+        finally:
+            statements, self.statements = self.statements, None
+        self.assertEqual(count, len(statements), statements)
+        return result
+
+    def test_lease_create(self):
+        lease = _get_fake_phys_lease_values()
+        lease['events'].append(_get_fake_event_values(lease_id=lease['id']))
+        result = self.assertStatementsCount(3, db_api.lease_create, lease)
+        self.assertEqual(1, len(result.reservations))
+        self.assertEqual(1, len(result.events))
+
+    def test_lease_create_bulk(self):
+        leases = [_get_fake_phys_lease_values(id=_get_fake_random_uuid(),
+                                              name='fake%d' % i)
+                  for i in range(10)]
+        for lease in leases:
+            lease['events'].append(_get_fake_event_values(lease['id']))
+        self.assertStatementsCount(3, db_api.lease_create_bulk, leases)
+
+    def test_lease_create_bulk_check_resources(self):
+        # The periods reserved for all the resources, then the INSERTs of
+        # the leases and of their reservations
+        leases = [_get_fake_phys_lease_values(id=_get_fake_random_uuid(),
+                                              name='fake%d' % i)
+                  for i in range(10)]
+        for i, lease in enumerate(leases):
+            lease['reservations'][0]['resource_id'] = 'host%d' % i
+        self.assertStatementsCount(3, db_api.lease_create_bulk, leases, True)
+
+    def test_lease_update(self):
+        lease = _create_physical_lease()
+        result = self.assertStatementsCount(
+            4, db_api.lease_update, lease['id'], {'name': 'lease_renamed'})
+        self.assertEqual('lease_renamed', result['name'])
+        self.assertIsNotNone(result['updated_at'])
+
+    def test_lease_get_all(self):
+        for i in range(10):
+            lease = _get_fake_phys_lease_values(id=_get_fake_random_uuid(),
+                                                name='fake%d' % i)
+            lease['events'].append(_get_fake_event_values(lease['id']))
+            db_api.lease_create(lease)
+        result = self.assertStatementsCount(3, db_api.lease_get_all)
+        self.assertEqual(10, len(result))
+        for lease in result:
+            self.assertEqual(1, len(lease.reservations))
+            self.assertEqual(1, len(lease.events))
+
+    def test_lease_get_all_by_chunks(self):
+        self.useFixture(mockpatch.PatchObject(db_api, 'IN_CHUNK_SIZE',
+                                              new=4))
+        for i in range(10):
+            lease = _get_fake_phys_lease_values(id=_get_fake_random_uuid(),
+                                                name='fake%d' % i)
+            lease['events'].append(_get_fake_event_values(lease['id']))
+            db_api.lease_create(lease)
+        result = self.assertStatementsCount(7, db_api.lease_get_all)
+        for lease in result:
+            self.assertEqual(1, len(lease.reservations))
+            self.assertEqual([lease.id], [e.lease_id for e in lease.events])
+
+    def test_lease_get(self):
+        lease = _create_physical_lease()
+        db_api.event_create(_get_fake_event_values(lease_id=lease['id']))
+        db_api.event_create(_get_fake_event_values(lease_id=lease['id']))
+        result = self.assertStatementsCount(3, db_api.lease_get, lease['id'])
+        self.assertEqual(1, len(result.reservations))
+        self.assertEqual(2, len(result.events))
+
+    def test_lease_version(self):
+        lease = _create_physical_lease()
+        self.assertStatementsCount(1, db_api.lease_version, lease['id'])
+
+    def test_lease_get_without_children(self):
+        lease = _create_physical_lease()
+        result = self.assertStatementsCount(1, db_api.lease_get, lease['id'],
+                                            False)
+        self.assertEqual(lease['id'], result['id'])
+        self.assertEqual([], result.reservations)
+
+    def test_lease_list_without_children(self):
+        _create_physical_lease()
+        result = self.assertStatementsCount(1, db_api.lease_list, False)
+        self.assertEqual(1, len(result))
+
+    def test_reservation_create(self):
+        _create_physical_lease()
+        self.assertStatementsCount(2, db_api.reservation_create,
+                                   _get_fake_virt_reservation_values())
+
+    def test_reservation_update(self):
+        lease = _create_physical_lease()
+        result = self.assertStatementsCount(
+            3, db_api.reservation_update, lease['reservations'][0]['id'],
+            {'status': 'active'})
+        self.assertEqual('active', result['status'])
+
+    def test_event_create(self):
+        _create_physical_lease()
+        self.assertStatementsCount(2, db_api.event_create,
+                                   _get_fake_event_values())
+
+    def test_event_update(self):
+        _create_physical_lease()
+        event = db_api.event_create(_get_fake_event_values())
+        result = self.assertStatementsCount(
+            3, db_api.event_update, event['id'], {'status': 'DONE'})
+        self.assertEqual('DONE', result['status'])
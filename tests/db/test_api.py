@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
+
 from climate.db import api as db_api
 from climate import test
 
@@ -34,3 +36,13 @@ class DBApiTestCase(test.TestCase):
 
     def test_drop_db(self):
         self.assertTrue(self.db_api.drop_db())
+
+    def test_lease_iter_by_filters(self):
+        iter_all = self.patch(self.db_api.IMPL, "lease_iter_by_filters")
+        row = iter_all.return_value = [mock.MagicMock()]
+        row[0].to_dict.return_value = {'id': 'lease1'}
+
+        result = self.db_api.lease_iter_by_filters({'name': 'lease'})
+        iter_all.assert_called_once_with({'name': 'lease'}, None, None, None)
+        self.assertFalse(row[0].to_dict.called)
+        self.assertEqual([{'id': 'lease1'}], list(result))
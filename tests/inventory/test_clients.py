@@ -0,0 +1,55 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import datetime
+
+import mock
+
+from climate.inventory import clients
+from climate.openstack.common import timeutils
+from climate import test
+
+
+class ClientsTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ClientsTestCase, self).setUp()
+        clients.reset()
+        self.addCleanup(clients.reset)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+
+    def _authenticate(self, nova, expires_in):
+        expires = timeutils.utcnow() + datetime.timedelta(seconds=expires_in)
+        nova.client.auth_token = 'token'
+        nova.client.service_catalog = mock.MagicMock()
+        nova.client.service_catalog.catalog = {
+            'access': {'token': {'id': 'token',
+                                 'expires': timeutils.isotime(expires)}}}
+        return self.patch(nova.client, 'authenticate')
+
+    def test_get_novaclient_shared(self):
+        nova = clients.get_novaclient()
+        self.assertIs(nova, clients.get_novaclient())
+        self.assertIsNot(nova, clients.get_novaclient(username='other'))
+
+    def test_token_reused(self):
+        authenticate = self._authenticate(clients.get_novaclient(), 3600)
+        clients.get_novaclient()
+        self.assertFalse(authenticate.called)
+
+    def test_token_renewed_before_expiration(self):
+        authenticate = self._authenticate(clients.get_novaclient(), 60)
+        clients.get_novaclient()
+        authenticate.assert_called_once_with()
@@ -17,7 +17,9 @@
 
 import mock
 
+from climate.inventory import clients
 from climate.inventory import nova
+from climate.openstack.common import timeutils
 from climate import test
 
 
@@ -27,10 +29,13 @@ class ServiceTestCase(test.TestCase):
     """
 
     @staticmethod
-    def fake_hypervisors_list():
+    def fake_hypervisors_list(detailed=True):
         a, b = mock.MagicMock(), mock.MagicMock()
         a.id = 1
         b.id = 2
+        for hypervisor in (a, b):
+            hypervisor.__getitem__.side_effect = {
+                'cpu_info': {'arch': 'x86'}}.__getitem__
         return [a, b]
 
     @staticmethod
@@ -41,11 +46,14 @@ class ServiceTestCase(test.TestCase):
     def setUp(self):
         super(ServiceTestCase, self).setUp()
         self.i = nova.NovaInventory()
-        self.patch(self.i.novaclient.hypervisors, "list").\
-            side_effect = self.fake_hypervisors_list
+        self.list = self.patch(self.i.novaclient.hypervisors, "list")
+        self.list.side_effect = self.fake_hypervisors_list
 
-        self.patch(self.i.novaclient.hypervisors, "get").\
-            side_effect = self.fake_hypervisors_get
+        self.get = self.patch(self.i.novaclient.hypervisors, "get")
+        self.get.side_effect = self.fake_hypervisors_get
+
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
 
     def test_list_hosts(self):
         hosts = self.i.list_hosts()
@@ -55,3 +63,69 @@ class ServiceTestCase(test.TestCase):
         hosts = self.i.list_hosts()
         detail = self.i.get_host_details(hosts[0])
         self.assertEqual(detail['cpu_info']['arch'], 'x86')
+
+    def test_list_hosts_cached(self):
+        hosts = self.i.list_hosts()
+        self.assertEqual(hosts, self.i.list_hosts())
+        self.assertEqual(1, self.list.call_count)
+
+        timeutils.advance_time_seconds(self.i.cache_ttl)
+        self.i.list_hosts()
+        self.assertEqual(2, self.list.call_count)
+
+    def test_token_renewed_on_calls(self):
+        renew = self.patch(clients, '_renew_token_if_needed')
+        self.i.list_hosts()
+        timeutils.advance_time_seconds(self.i.cache_ttl)
+        self.i.list_hosts()
+        self.i.get_host_details(3)
+        self.assertEqual(3, renew.call_count)
+
+    def test_get_host_details_cached(self):
+        self.i.get_host_details(3)
+        self.i.get_host_details(3)
+        self.assertEqual(1, self.get.call_count)
+
+    def test_get_host_details_from_list(self):
+        hosts = self.i.list_hosts()
+        self.assertEqual(hosts[1], self.i.get_host_details(2))
+        self.assertFalse(self.get.called)
+
+    def test_get_hosts_details(self):
+        details = self.i.get_hosts_details([1, 2, 3])
+        self.assertEqual([1, 2], sorted(details))
+        self.assertEqual(1, details[1].id)
+        self.i.get_hosts_details([1, 2])
+        self.assertEqual(1, self.list.call_count)
+        self.assertFalse(self.get.called)
+
+    def test_get_hosts_details_unknown_cached(self):
+        self.i.get_hosts_details([1, 3])
+        self.assertEqual([1], list(self.i.get_hosts_details([1, 3])))
+        self.assertEqual(1, self.list.call_count)
+
+        timeutils.advance_time_seconds(self.i.cache_ttl)
+        self.i.get_hosts_details([1, 3])
+        self.assertEqual(2, self.list.call_count)
+
+    def test_list_aggregates_cached(self):
+        aggregates = self.patch(self.i.novaclient.aggregates, 'list')
+        self.assertEqual(aggregates.return_value, self.i.list_aggregates())
+        self.i.list_aggregates()
+        self.assertEqual(1, aggregates.call_count)
+
+        timeutils.advance_time_seconds(self.i.cache_ttl)
+        self.i.list_aggregates()
+        self.i.invalidate()
+        self.i.list_aggregates()
+        self.assertEqual(3, aggregates.call_count)
+
+    def test_invalidate(self):
+        self.i.list_hosts()
+        self.i.invalidate(1)
+        self.i.get_hosts_details([1])
+        self.assertEqual(2, self.list.call_count)
+
+        self.i.invalidate()
+        self.i.list_hosts()
+        self.assertEqual(3, self.list.call_count)
@@ -0,0 +1,83 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from climate import exceptions
+from climate.inventory import query
+from climate.openstack.common.fixture import mockpatch
+from climate import test
+
+
+class HostQueryTestCase(test.TestCase):
+
+    def setUp(self):
+        super(HostQueryTestCase, self).setUp()
+        self.host = {'vcpus': 32, 'memory_mb': 262144,
+                     'hypervisor_hostname': 'host1',
+                     'properties': {'aggregate': 'gpu-free',
+                                    'hypervisor_version': '1000000'}}
+
+    def test_parse(self):
+        self.assertEqual(
+            [('vcpus', '>=', 32), ('memory_mb', '>=', 256000),
+             ('aggregate', '=', 'gpu-free'), ('name', '!=', 'a b'),
+             ('ratio', '<', 1.5)],
+            query.parse('vcpus>=32 and memory_mb >= 256000 AND '
+                        'aggregate=gpu-free and name != "a b" and '
+                        'ratio < 1.5'))
+
+    def test_parse_malformed(self):
+        for text in ('', 'vcpus', 'vcpus >= 32 or memory_mb > 1',
+                     'vcpus >= 32 and', 'vcpus ~ 1'):
+            self.assertRaises(exceptions.InvalidInput, query.parse, text)
+
+    def test_terms_split(self):
+        q = query.HostQuery('vcpus >= 32 and aggregate = gpu-free')
+        self.assertEqual([('vcpus', '>=', 32)], q.column_terms)
+        self.assertEqual([('aggregate', '=', 'gpu-free')], q.property_terms)
+
+    def test_matches(self):
+        self.assertTrue(query.HostQuery(
+            'vcpus >= 32 and memory_mb >= 256000 and aggregate = gpu-free'
+        ).matches(self.host))
+        self.assertTrue(query.HostQuery(
+            'hypervisor_version > 999').matches(self.host))
+        self.assertFalse(query.HostQuery('vcpus > 32').matches(self.host))
+        self.assertFalse(query.HostQuery(
+            'aggregate = gpu').matches(self.host))
+        self.assertFalse(query.HostQuery('unknown = 1').matches(self.host))
+
+    def test_matches_several_values(self):
+        self.host['properties']['aggregate'] = ['gpu-free', 'ssd']
+        self.assertTrue(query.HostQuery('aggregate = ssd').matches(self.host))
+        self.assertTrue(query.HostQuery(
+            'aggregate != gpu').matches(self.host))
+        self.assertFalse(query.HostQuery(
+            'aggregate != ssd').matches(self.host))
+        self.host['properties']['aggregate'] = []
+        self.assertFalse(query.HostQuery(
+            'aggregate = ssd').matches(self.host))
+
+    def test_compile_query_cached(self):
+        self.useFixture(mockpatch.PatchObject(query, 'CACHE_SIZE', new=2))
+        self.useFixture(mockpatch.PatchObject(query, '_CACHE', new={}))
+        self.useFixture(mockpatch.PatchObject(query, '_CACHE_ORDER',
+                                              new=[]))
+        q = query.compile_query('vcpus > 1')
+        self.assertIs(q, query.compile_query('vcpus > 1'))
+
+        query.compile_query('vcpus > 2')
+        query.compile_query('vcpus > 1')
+        query.compile_query('vcpus > 3')
+        self.assertEqual(['vcpus > 1', 'vcpus > 3'], query._CACHE_ORDER)
+        self.assertEqual(['vcpus > 1', 'vcpus > 3'], sorted(query._CACHE))
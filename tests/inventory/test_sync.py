@@ -0,0 +1,113 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import mock
+
+from climate.db import api as db_api
+from climate.inventory import sync
+from climate.openstack.common import context
+from climate import test
+
+
+def _fake_hypervisor(id, hostname, vcpus=4):
+    hypervisor = mock.Mock()
+    hypervisor.id = id
+    hypervisor.hypervisor_hostname = hostname
+    hypervisor.vcpus = vcpus
+    hypervisor.memory_mb = 8192
+    hypervisor.local_gb = 100
+    hypervisor.cpu_info = '{"arch": "x86_64"}'
+    hypervisor.hypervisor_type = 'QEMU'
+    hypervisor.hypervisor_version = 1000000
+    return hypervisor
+
+
+def _fake_aggregate(name, hosts, metadata):
+    aggregate = mock.Mock()
+    aggregate.name = name
+    aggregate.hosts = hosts
+    aggregate.metadata = metadata
+    return aggregate
+
+
+class HostsSynchronizerTestCase(test.DBTestCase):
+
+    def setUp(self):
+        super(HostsSynchronizerTestCase, self).setUp()
+        self.set_context(context.get_admin_context())
+        self.inventory = mock.Mock()
+        self.inventory.list_hosts.return_value = [
+            _fake_hypervisor(1, 'host1'), _fake_hypervisor(2, 'host2')]
+        self.inventory.list_aggregates.return_value = []
+        self.synchronizer = sync.HostsSynchronizer(self.inventory)
+
+    def _get_hosts(self):
+        return dict((host['hypervisor_hostname'], host)
+                    for host in db_api.host_get_all())
+
+    def test_sync_creates_hosts(self):
+        self.assertEqual((2, 0, 0), self.synchronizer.sync())
+        hosts = self._get_hosts()
+        self.assertEqual(['host1', 'host2'], sorted(hosts))
+        self.assertEqual(u'1', hosts['host1']['hypervisor_id'])
+        self.assertEqual(4, hosts['host1']['vcpus'])
+        self.assertEqual('QEMU',
+                         hosts['host1']['properties']['hypervisor_type'])
+        self.inventory.invalidate.assert_called_once_with()
+
+    def test_sync_writes_changes_only(self):
+        self.synchronizer.sync()
+        self.inventory.list_hosts.return_value = [
+            _fake_hypervisor(1, 'host1', vcpus=8),
+            _fake_hypervisor(3, 'host3')]
+        host_update = self.patch(db_api, 'host_update')
+
+        self.assertEqual((1, 1, 1), self.synchronizer.sync())
+        self.assertEqual(1, host_update.call_count)
+        self.assertEqual(8, host_update.call_args[0][1]['vcpus'])
+        self.assertEqual(['host1', 'host3'], sorted(self._get_hosts()))
+
+    def test_sync_unchanged(self):
+        self.synchronizer.sync()
+        self.assertEqual((0, 0, 0), self.synchronizer.sync())
+
+    def test_sync_aggregates_then_query(self):
+        self.inventory.list_aggregates.return_value = [
+            _fake_aggregate('gpu-free', ['host1'], {'gpu': 'k20'}),
+            _fake_aggregate('gpu-old', ['host1', 'host2'], {'gpu': 'm2070',
+                                                            'ssd': 'true'}),
+        ]
+        self.synchronizer.sync()
+        properties = self._get_hosts()['host1']['properties']
+        self.assertEqual(['gpu-free', 'gpu-old'], properties['aggregate'])
+        self.assertEqual(['k20', 'm2070'], properties['gpu'])
+
+        def hostnames(*queries):
+            return sorted(h['hypervisor_hostname']
+                          for h in db_api.host_get_all_by_queries(queries))
+
+        self.assertEqual(['host1'], hostnames('aggregate = gpu-free'))
+        self.assertEqual(['host1', 'host2'], hostnames('aggregate = gpu-old',
+                                                       'ssd = true'))
+        self.assertEqual(['host2'], hostnames('gpu = m2070',
+                                              'aggregate != gpu-free'))
+
+        self.inventory.list_aggregates.return_value = []
+        self.assertEqual((0, 2, 0), self.synchronizer.sync())
+        self.assertEqual([], hostnames('aggregate = gpu-old'))
+
+    def test_sync_from_db(self):
+        self.synchronizer.sync()
+        synchronizer = sync.HostsSynchronizer(self.inventory)
+        self.assertEqual((0, 0, 0), synchronizer.sync())
@@ -0,0 +1,107 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import eventlet
+
+from climate import exceptions
+from climate.scheduler import executor
+from climate import test
+
+
+class ExecutorTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ExecutorTestCase, self).setUp()
+        self.executor = executor.Executor(size=4,
+                                          limits={'physical:host': 1})
+        self.running = []
+        self.max_running = 0
+
+    def _action(self, kind):
+        self.running.append(kind)
+        self.max_running = max(self.max_running,
+                               self.running.count(kind))
+        eventlet.sleep(0)
+        self.running.remove(kind)
+
+    def test_submit(self):
+        for _i in range(3):
+            self.executor.submit('fast', self._action, 'fast')
+        self.assertEqual(1, self.executor.free())
+
+        self.executor.wait()
+        self.assertEqual(4, self.executor.free())
+        stats = self.executor.stats()['fast']
+        self.assertEqual(3, stats['done'])
+        self.assertEqual(0, stats['failed'])
+        self.assertEqual(0, stats['queued'])
+        self.assertEqual(0, stats['running'])
+
+    def test_stats_queued(self):
+        self.executor.submit('fast', self._action, 'fast')
+        self.executor.wait()
+        stats = self.executor.stats({'fast': 2, 'slow': 5})
+        self.assertEqual((2, 1), (stats['fast']['queued'],
+                                  stats['fast']['done']))
+        self.assertEqual((5, 0), (stats['slow']['queued'],
+                                  stats['slow']['done']))
+
+    def _plugin_action(self, plugin):
+        with self.executor.plugin_slot(plugin):
+            self._action(plugin)
+
+    def test_plugin_limit(self):
+        for _i in range(4):
+            self.executor.submit('start_lease', self._plugin_action,
+                                 'physical:host')
+        self.executor.wait()
+        self.assertEqual(1, self.max_running)
+        self.assertEqual(4, self.executor.stats()['start_lease']['done'])
+
+    def test_plugin_without_limit(self):
+        for _i in range(4):
+            self.executor.submit('start_lease', self._plugin_action,
+                                 'virtual:instance')
+        self.executor.wait()
+        self.assertEqual(4, self.max_running)
+
+    def test_parse_limits(self):
+        self.assertEqual({'physical:host': 16, 'virtual:instance': 2},
+                         executor._parse_limits(['physical:host=16',
+                                                 'virtual:instance = 2']))
+
+    def test_parse_bad_limits(self):
+        for pair in ('physical:host', 'x=abc', '=2', 'x=0'):
+            self.assertRaises(exceptions.ConfigurationError,
+                              executor._parse_limits, [pair])
+
+    def test_submit_blocks_when_full(self):
+        for _i in range(6):
+            self.executor.submit('fast', self._action, 'fast')
+        self.executor.wait()
+        self.assertTrue(self.max_running <= 4)
+        self.assertEqual(6, self.executor.stats()['fast']['done'])
+
+    def test_failed_action(self):
+        def fail():
+            raise Exception('Boom')
+
+        self.executor.submit('fast', fail)
+        self.executor.wait()
+        self.executor.submit('fast', self._action, 'fast')
+        self.executor.wait()
+        stats = self.executor.stats()['fast']
+        self.assertEqual((1, 1), (stats['failed'], stats['done']))
+        self.assertEqual(4, self.executor.free())
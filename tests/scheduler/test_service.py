@@ -0,0 +1,236 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+import mock
+from oslo.config import cfg
+
+from climate.db import api as db_api
+from climate.openstack.common import context
+from climate.openstack.common import timeutils
+from climate.scheduler import executor
+from climate.scheduler import service
+from climate import test
+from climate.utils import partitions
+
+
+def _get_datetime(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M")
+
+
+class SchedulerServiceTestCase(test.DBTestCase):
+
+    def setUp(self):
+        super(SchedulerServiceTestCase, self).setUp()
+        self.set_context(context.get_admin_context())
+        timeutils.set_time_override(_get_datetime('2030-01-01 12:00'))
+        self.addCleanup(timeutils.clear_time_override)
+        self.service = service.SchedulerService('host', 'climate.scheduler')
+
+        db_api.lease_create({
+            'id': 'lease1',
+            'name': 'lease1',
+            'start_date': _get_datetime('2030-01-01 00:00'),
+            'end_date': _get_datetime('2030-01-02 00:00'),
+            'trust': 'trust',
+            'reservations': [{'resource_id': '1234',
+                              'resource_type': 'physical:host'}],
+            'events': [
+                {'id': 'start', 'event_type': 'start_lease',
+                 'time': _get_datetime('2030-01-01 00:00'),
+                 'status': 'UNDONE'},
+                {'id': 'end', 'event_type': 'end_lease',
+                 'time': _get_datetime('2030-01-02 00:00'),
+                 'status': 'UNDONE'},
+                {'id': 'unknown', 'event_type': 'unknown',
+                 'time': _get_datetime('2030-01-01 06:00'),
+                 'status': 'UNDONE'},
+            ],
+        })
+
+    def _get_status(self, event_id):
+        return db_api.event_get(event_id)['status']
+
+    def _run_due_events(self, scheduler=None):
+        scheduler = scheduler or self.service
+        result = scheduler._run_due_events()
+        scheduler.executor.wait()
+        return result
+
+    def test_run_due_events(self):
+        self.assertEqual(60, self._run_due_events())
+        self.assertEqual('DONE', self._get_status('start'))
+        self.assertEqual('ERROR', self._get_status('unknown'))
+        self.assertEqual('UNDONE', self._get_status('end'))
+        self.assertEqual('active', db_api.lease_get('lease1')[
+            'reservations'][0]['status'])
+
+        timeutils.set_time_override(_get_datetime('2030-01-02 00:00'))
+        self._run_due_events()
+        self.assertEqual('DONE', self._get_status('end'))
+        self.assertEqual('completed', db_api.lease_get('lease1')[
+            'reservations'][0]['status'])
+
+    def test_run_due_events_stats(self):
+        log = self.patch(service.LOG, 'debug')
+        self._run_due_events()
+        stats = log.call_args[0][1]
+        self.assertEqual(1, stats['start_lease']['queued'])
+        self.assertEqual(1, stats['unknown']['queued'])
+
+        stats = self.service.executor.stats()
+        self.assertEqual((1, 0), (stats['start_lease']['done'],
+                                  stats['start_lease']['failed']))
+        self.assertEqual((0, 1), (stats['unknown']['done'],
+                                  stats['unknown']['failed']))
+
+    def test_run_due_events_sleeps_until_next_event(self):
+        cfg.CONF.set_override('events_resync_interval', 86400)
+        self.assertEqual(12 * 3600, self._run_due_events())
+
+    def test_run_due_events_retries_after_failure(self):
+        event_get_all = db_api.event_get_all_sorted_by_filters
+        get_events = self.patch(db_api, 'event_get_all_sorted_by_filters')
+        get_events.side_effect = Exception('DB connection lost')
+        self.assertEqual(5, self._run_due_events())
+        self.assertEqual('UNDONE', self._get_status('start'))
+
+        get_events.side_effect = event_get_all
+        self.assertEqual(60, self._run_due_events())
+        self.assertEqual('DONE', self._get_status('start'))
+
+    def test_run_due_events_does_not_reload(self):
+        self._run_due_events()
+        get_events = self.patch(db_api, 'event_get_all_sorted_by_filters')
+        timeutils.advance_time_seconds(30)
+        self._run_due_events()
+        self.assertFalse(get_events.called)
+
+    def test_run_due_events_by_batches(self):
+        cfg.CONF.set_override('events_batch_size', 1)
+        dispatch = self.patch(self.service, '_dispatch')
+        dispatch.side_effect = lambda event: db_api.event_update(
+            event['id'], {'status': 'DONE'})
+
+        self.assertEqual(0, self._run_due_events())
+        self.assertEqual(['start', 'unknown'],
+                         [c[0][0]['id'] for c in dispatch.call_args_list])
+
+    def test_events_changed(self):
+        cfg.CONF.set_override('events_resync_interval', 86400)
+        self._run_due_events()
+        db_api.event_create({'id': 'new', 'lease_id': 'lease1',
+                             'event_type': 'end_lease',
+                             'time': _get_datetime('2030-01-01 13:00'),
+                             'status': 'UNDONE'})
+        start_timer = self.patch(self.service, '_start_timer')
+        start_timer.side_effect = lambda: setattr(self.service,
+                                                  '_next_resync', None)
+
+        self.service.events_changed(None)
+        self.assertEqual(3600, self._run_due_events())
+
+    def test_run_due_events_claimed_elsewhere(self):
+        db_api.event_claim_due(1, 'other')
+        dispatch = self.patch(self.service, '_dispatch')
+
+        self._run_due_events()
+        self.assertEqual(['unknown'],
+                         [c[0][0]['id'] for c in dispatch.call_args_list])
+        self.assertEqual('IN_PROGRESS', self._get_status('start'))
+
+    def test_sharding(self):
+        other = service.SchedulerService('host', 'climate.scheduler')
+        self.service.worker_id = 'worker1'
+        other.worker_id = 'worker2'
+        self.service._heartbeat()
+        other._heartbeat()
+        self.service._heartbeat()
+
+        partition = partitions.partition_of('lease1')
+        if partition in other._partitions:
+            owner, idle = other, self.service
+        else:
+            owner, idle = self.service, other
+        self.assertEqual([], [p for p in idle._partitions
+                              if p in owner._partitions])
+
+        self._run_due_events(idle)
+        self.assertEqual('UNDONE', self._get_status('start'))
+        self._run_due_events(owner)
+        self.assertEqual('DONE', self._get_status('start'))
+
+        db_api.scheduler_worker_destroy(owner.worker_id)
+        idle._heartbeat()
+        self.assertEqual(range(partitions.PARTITION_COUNT), idle._partitions)
+        timeutils.set_time_override(_get_datetime('2030-01-02 00:00'))
+        self._run_due_events(idle)
+        self.assertEqual('DONE', self._get_status('end'))
+
+    def test_reclaim_events_of_dead_workers(self):
+        cfg.CONF.set_override('scheduler_sharding', True)
+        db_api.scheduler_worker_heartbeat('dead')
+        db_api.event_claim_due(1, 'dead')
+        timeutils.advance_time_seconds(cfg.CONF.scheduler_heartbeat_ttl + 1)
+
+        self.service.worker_id = 'worker1'
+        self.service._heartbeat()
+        self.assertEqual('UNDONE', self._get_status('start'))
+        self._run_due_events()
+        self.assertEqual('DONE', self._get_status('start'))
+
+    def test_reclaim_events_after_timeout(self):
+        db_api.event_claim_due(1, 'other')
+        self._run_due_events()
+        self.assertEqual('IN_PROGRESS', self._get_status('start'))
+
+        timeutils.advance_time_seconds(cfg.CONF.scheduler_event_timeout + 1)
+        self.service._next_resync = None
+        self._run_due_events()
+        self.assertEqual('DONE', self._get_status('start'))
+
+    def test_dispatch_of_reclaimed_event(self):
+        event = db_api.event_claim_due(1, self.service.worker_id)[0]
+        timeutils.advance_time_seconds(1)
+        self.assertEqual(1, db_api.event_reclaim(0))
+        self.service._dispatch(event)
+        self.assertEqual('UNDONE', self._get_status('start'))
+
+    def test_run_due_events_claims_free_slots_only(self):
+        self.service.executor = executor.Executor(size=1)
+        claim = self.patch(db_api, 'event_claim_due')
+        claim.return_value = []
+
+        self._run_due_events()
+        claim.assert_called_once_with(1, None, None)
+
+    def test_sync_hosts_by_first_partition_owner(self):
+        synchronizer = mock.Mock()
+        self.service._hosts_synchronizer = synchronizer
+        self.service._partitions = [1, 3]
+        self.service._sync_hosts()
+        self.assertFalse(synchronizer.sync.called)
+
+        self.service._partitions = [0, 2]
+        self.service._sync_hosts()
+        synchronizer.sync.assert_called_once_with()
+
+    def test_sync_hosts_failure(self):
+        synchronizer = mock.Mock()
+        synchronizer.sync.side_effect = Exception('Nova is down')
+        self.service._hosts_synchronizer = synchronizer
+        self.service._sync_hosts()
+        synchronizer.reset.assert_called_once_with()
@@ -0,0 +1,56 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+from climate import context
+from climate import test
+
+
+class ContextTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ContextTestCase, self).setUp()
+        self.addCleanup(context.Context.clear)
+        self.factory = mock.Mock(side_effect=lambda: mock.Mock())
+
+    def test_db_session_without_context(self):
+        session = context.Context.db_session(self.factory)
+        self.assertIsNot(session, context.Context.db_session(self.factory))
+        self.assertFalse(session.close.called)
+
+    def test_db_session_default_factory_without_context(self):
+        default_factory = mock.Mock()
+        session = context.Context.db_session(self.factory, default_factory)
+        self.assertIs(default_factory.return_value, session)
+        self.assertFalse(self.factory.called)
+
+    def test_db_session_closed_on_exit(self):
+        with context.Context():
+            session = context.Context.db_session(self.factory)
+            self.assertIs(session, context.Context.db_session(self.factory))
+            with context.Context():
+                self.assertIsNot(session,
+                                 context.Context.db_session(self.factory))
+            self.assertFalse(session.close.called)
+        session.close.assert_called_once_with()
+        self.assertEqual(2, self.factory.call_count)
+
+    def test_db_session_closed_on_clear(self):
+        context.Context().__enter__()
+        session = context.Context.db_session(self.factory)
+        context.Context.clear()
+        session.close.assert_called_once_with()
+        self.assertRaises(RuntimeError, context.Context.current)
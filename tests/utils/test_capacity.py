@@ -0,0 +1,70 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+from climate import test
+from climate.utils import capacity
+
+
+class CapacityTimelineTestCase(test.TestCase):
+
+    def setUp(self):
+        super(CapacityTimelineTestCase, self).setUp()
+        self.timeline = capacity.CapacityTimeline(
+            3, [(10, 20, 1), (15, 30, 1), (15, 25, 1), (40, 50, 2)])
+
+    def test_steps(self):
+        self.assertEqual([(10, 2), (15, 0), (20, 1), (25, 2), (30, 3),
+                          (40, 1), (50, 3)], self.timeline.steps())
+
+    def test_min_free(self):
+        self.assertEqual(3, self.timeline.min_free(0, 10))
+        self.assertEqual(2, self.timeline.min_free(5, 15))
+        self.assertEqual(0, self.timeline.min_free(5, 16))
+        self.assertEqual(1, self.timeline.min_free(20, 25))
+        self.assertEqual(1, self.timeline.min_free(22, 45))
+        self.assertEqual(3, self.timeline.min_free(50, 100))
+
+    def test_min_free_matches_brute_force(self):
+        periods = []
+        for _i in range(50):
+            start = random.randint(0, 100)
+            periods.append((start, start + random.randint(1, 30), 1))
+        timeline = capacity.CapacityTimeline(20, periods)
+
+        for _i in range(200):
+            start = random.randint(0, 130)
+            end = start + random.randint(1, 30)
+            used = max(sum(c for s, e, c in periods if s <= t < e)
+                       for t in range(start, end))
+            self.assertEqual(20 - used, timeline.min_free(start, end))
+
+    def test_earliest_window(self):
+        self.assertEqual(0, self.timeline.earliest_window(1, 10, 0))
+        self.assertEqual(20, self.timeline.earliest_window(1, 25, 5))
+        self.assertEqual(30, self.timeline.earliest_window(3, 10, 5))
+        self.assertEqual(50, self.timeline.earliest_window(3, 11, 5))
+        self.assertIsNone(self.timeline.earliest_window(4, 1, 0))
+
+    def test_windows(self):
+        self.assertEqual([0, 20, 25, 30, 50],
+                         list(self.timeline.windows(1, 5, 0)))
+        self.assertEqual([30, 50], list(self.timeline.windows(3, 10, 22)))
+
+    def test_empty(self):
+        timeline = capacity.CapacityTimeline(2, [])
+        self.assertEqual(2, timeline.min_free(0, 10))
+        self.assertEqual(5, timeline.earliest_window(2, 10, 5))
@@ -0,0 +1,97 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+from climate import test
+from climate.utils import intervals
+
+
+class IntervalTreeTestCase(test.TestCase):
+
+    def test_overlapping(self):
+        rand = random.Random(42)
+        tree = intervals.IntervalTree()
+        periods = []
+        for i in range(500):
+            start = rand.randint(0, 1000)
+            # A few long periods, which must not slow the lookups down
+            length = rand.randint(1, 1000 if i % 50 == 0 else 20)
+            periods.append((start, start + length, i))
+            tree.add(periods[-1])
+        for period in periods[::3]:
+            tree.remove(period)
+        periods = sorted(set(periods) - set(periods[::3]))
+
+        self.assertEqual(len(periods), len(tree))
+        for _i in range(100):
+            start = rand.randint(0, 1100)
+            end = start + rand.randint(1, 50)
+            expected = [p for p in periods if p[0] < end and p[1] > start]
+            self.assertEqual(expected, tree.overlapping(start, end))
+
+    def test_remove_missing(self):
+        tree = intervals.IntervalTree()
+        tree.add((0, 10, 'a'))
+        self.assertRaises(ValueError, tree.remove, (0, 10, 'b'))
+        self.assertEqual([(0, 10, 'a')], tree.overlapping(0, 1))
+
+
+class IntervalIndexTestCase(test.TestCase):
+
+    def setUp(self):
+        super(IntervalIndexTestCase, self).setUp()
+        self.index = intervals.IntervalIndex()
+        self.index.add('host1', 0, 10, 'lease1')
+        self.index.add('host1', 10, 20, 'lease2')
+        self.index.add('host1', 30, 100, 'lease3')
+        self.index.add('host2', 0, 50, 'lease3')
+
+    def test_overlapping(self):
+        self.assertEqual(['lease1', 'lease2'],
+                         self.index.overlapping('host1', 5, 15))
+        self.assertEqual(['lease3'], self.index.overlapping('host1', 90, 95))
+        self.assertEqual(['lease3'], self.index.overlapping('host2', 40, 60))
+
+    def test_overlapping_is_half_open(self):
+        self.assertEqual(['lease2'], self.index.overlapping('host1', 10, 11))
+        self.assertEqual([], self.index.overlapping('host1', 20, 30))
+
+    def test_keys_overlapping(self):
+        self.assertEqual(set(['host1', 'host2']),
+                         self.index.keys_overlapping(5, 15))
+        self.assertEqual(set(['host1']), self.index.keys_overlapping(50, 60))
+        self.assertEqual(set(), self.index.keys_overlapping(100, 110))
+
+    def test_periods_overlapping(self):
+        self.assertEqual([(0, 50, 'host2'), (10, 20, 'host1'),
+                          (30, 100, 'host1')],
+                         self.index.periods_overlapping(15, 40))
+
+    def test_overlapping_unknown_key(self):
+        self.assertEqual([], self.index.overlapping('host3', 0, 100))
+
+    def test_remove(self):
+        self.index.remove('lease3')
+        self.assertEqual(2, len(self.index))
+        self.assertEqual([], self.index.overlapping('host1', 50, 60))
+        self.assertEqual([], self.index.overlapping('host2', 0, 100))
+        self.assertEqual(set(), self.index.keys_overlapping(50, 60))
+
+    def test_remove_then_add(self):
+        self.index.remove('lease3')
+        self.index.add('host1', 40, 45, 'lease4')
+        self.assertEqual(['lease4'], self.index.overlapping('host1', 41, 42))
+        self.assertEqual([], self.index.overlapping('host1', 46, 100))
@@ -0,0 +1,38 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from climate import test
+from climate.utils import partitions
+
+
+class PartitionsTestCase(test.TestCase):
+
+    def test_partition_of(self):
+        partition = partitions.partition_of(u'lease1')
+        self.assertEqual(partition, partitions.partition_of('lease1'))
+        self.assertTrue(0 <= partition < partitions.PARTITION_COUNT)
+
+    def test_owned_partitions(self):
+        members = ['worker3', 'worker1', 'worker2']
+        owned = [partitions.owned_partitions(members, member)
+                 for member in members]
+        self.assertEqual(range(partitions.PARTITION_COUNT),
+                         sorted(sum(owned, [])))
+        self.assertEqual(range(0, partitions.PARTITION_COUNT, 3),
+                         partitions.owned_partitions(members, 'worker1'))
+
+    def test_owned_partitions_not_member(self):
+        self.assertEqual([], partitions.owned_partitions(['worker1'],
+                                                         'worker2'))
@@ -15,16 +15,190 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
+import os
+import subprocess
+import sys
+import time
+
+from keystoneclient.v2_0 import client as keystone_client
+import mock
+from nova.openstack.common import loopingcall
 from nova.tests.scheduler import fakes
 
 from climate.nova import climate_filter
+from climate.openstack.common.fixture import mockpatch
+from climate.openstack.common import timeutils
 from climate import test
 
 
+def _reservation(start, end, reservation_id='r1'):
+    return climate_filter.Reservation(datetime.datetime(2030, 1, 1, start),
+                                      datetime.datetime(2030, 1, 1, end),
+                                      reservation_id)
+
+
 class ClimateSchedulerTestCase(test.TestCase):
 
+    def setUp(self):
+        super(ClimateSchedulerTestCase, self).setUp()
+        timeutils.set_time_override(datetime.datetime(2030, 1, 1, 12))
+        self.addCleanup(timeutils.clear_time_override)
+        self.reserved_hosts = {'host2': [_reservation(10, 14, 'r1'),
+                                         _reservation(14, 18, 'r2')]}
+        self.fetches = 0
+        self.cache = climate_filter.ReservedHostsCache(
+            fetch=self._fetch, refresh_interval=60)
+        self.cache.refresh()
+
+    def _fetch(self):
+        self.fetches += 1
+        return self.reserved_hosts
+
     def test_climate_scheduler(self):
-        f = climate_filter.ClimateFilter()
+        f = climate_filter.ClimateFilter(cache=self.cache)
         host = fakes.FakeHostState('host1', 'node1', {})
         filter_properties = {"scheduler_hints": {"foo": "bar"}}
         self.assertTrue(f.host_passes(host, filter_properties))
+
+    def test_reserved_host_needs_reservation_hint(self):
+        f = climate_filter.ClimateFilter(cache=self.cache)
+        host = fakes.FakeHostState('host2', 'node2', {})
+        self.assertFalse(f.host_passes(host, {}))
+        self.assertFalse(f.host_passes(
+            host, {"scheduler_hints": {"reservation": "r2"}}))
+        self.assertTrue(f.host_passes(
+            host, {"scheduler_hints": {"reservation": "r1"}}))
+
+    def test_unreserved_host_refuses_reservation_hint(self):
+        f = climate_filter.ClimateFilter(cache=self.cache)
+        host = fakes.FakeHostState('host1', 'node1', {})
+        self.assertFalse(f.host_passes(
+            host, {"scheduler_hints": {"reservation": "r1"}}))
+
+    def test_filter_all(self):
+        f = climate_filter.ClimateFilter(cache=self.cache)
+        hosts = [fakes.FakeHostState('host1', 'node1', {}),
+                 fakes.FakeHostState('host2', 'node2', {})]
+        self.assertEqual([hosts[0]], list(f.filter_all(hosts, {})))
+        self.assertEqual([hosts[1]], list(f.filter_all(
+            hosts, {"scheduler_hints": {"reservation": "r1"}})))
+        self.assertEqual(1, self.fetches)
+
+    def test_lookups_do_not_fetch(self):
+        self.cache.get('host1')
+        self.cache.get('host2')
+        self.cache.snapshot()
+        self.assertEqual(1, self.fetches)
+
+    def test_cache_refresh(self):
+        self.assertEqual(0, self.cache.staleness())
+        timeutils.advance_time_seconds(60)
+        self.assertEqual(60, self.cache.staleness())
+        self.cache.refresh()
+        self.assertEqual(2, self.fetches)
+        self.assertEqual(0, self.cache.staleness())
+
+    def test_cache_keeps_snapshot_on_refresh_failure(self):
+        self.patch(self.cache, '_fetch').side_effect = Exception
+        timeutils.advance_time_seconds(90)
+        self.cache.refresh()
+        self.assertEqual(2, len(self.cache.get('host2')))
+        self.assertEqual(90, self.cache.staleness())
+
+    def test_refuse_all_hosts_until_loaded(self):
+        cache = climate_filter.ReservedHostsCache(
+            fetch=mock.Mock(side_effect=Exception), refresh_interval=60)
+        log = self.patch(climate_filter, 'LOG')
+        cache.refresh()
+        f = climate_filter.ClimateFilter(cache=cache)
+        hosts = [fakes.FakeHostState('host1', 'node1', {}),
+                 fakes.FakeHostState('host2', 'node2', {})]
+        self.assertFalse(f.host_passes(hosts[0], {}))
+        self.assertFalse(f.host_passes(hosts[1], {}))
+        self.assertEqual([], list(f.filter_all(hosts, {})))
+        self.assertIsNone(cache.staleness())
+        self.assertEqual(1, log.exception.call_count)
+
+    def test_get_cache_refreshes_in_background(self):
+        self.useFixture(mockpatch.PatchObject(climate_filter, '_CACHE',
+                                              new=None))
+        looping_call = self.patch(loopingcall, 'FixedIntervalLoopingCall')
+        cache = climate_filter._get_cache()
+        self.assertIs(cache, climate_filter._get_cache())
+        looping_call.assert_called_once_with(cache.refresh)
+        looping_call.return_value.start.assert_called_once_with(30)
+
+    def test_fetch_reserved_hosts(self):
+        keystone = self.patch(keystone_client, 'Client').return_value
+        keystone.service_catalog.url_for.return_value = 'http://climate/v1'
+        keystone.request.return_value = (None, {'reservations': [
+            {'host': 'host2', 'start_date': '2030-01-01T10:00:00',
+             'end_date': '2030-01-01T14:00:00', 'reservation_id': 'r1'}]})
+        self.assertEqual({'host2': [_reservation(10, 14, 'r1')]},
+                         climate_filter._fetch_reserved_hosts())
+        keystone.service_catalog.url_for.assert_called_once_with(
+            service_type='reservation', endpoint_type='internalURL')
+        self.assertEqual(('http://climate/v1/os-hosts/reservations', 'GET'),
+                         keystone.request.call_args[0])
+
+    def test_load_with_nova_options(self):
+        """Check the filter loads once Nova registered its options."""
+        script = (
+            'from oslo.config import cfg\n'
+            'cfg.CONF.register_opts([\n'
+            '    cfg.StrOpt("rpc_backend",\n'
+            '               default="nova.openstack.common.rpc.impl_kombu"),\n'
+            '    cfg.StrOpt("control_exchange", default="nova"),\n'
+            '])\n'
+            'from climate.nova import climate_filter\n'
+            'climate_filter.ClimateFilter(cache=object())\n')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        process = subprocess.Popen([sys.executable, '-c', script], env=env,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        output = process.communicate()[0]
+        self.assertEqual(0, process.returncode, output)
+
+
+class ClimateFilterBenchmarkTestCase(test.TestCase):
+    """Measure the cost of the filter on a large cluster."""
+
+    hosts_count = 1000
+    requests_count = 100
+
+    def setUp(self):
+        super(ClimateFilterBenchmarkTestCase, self).setUp()
+        timeutils.set_time_override(datetime.datetime(2030, 1, 1, 12))
+        self.addCleanup(timeutils.clear_time_override)
+
+    def test_host_passes_benchmark(self):
+        reserved_hosts = dict(
+            ('host%d' % i, [_reservation(0, 23, 'r%d' % i)])
+            for i in range(0, self.hosts_count, 2))
+        cache = climate_filter.ReservedHostsCache(
+            fetch=lambda: reserved_hosts, refresh_interval=60)
+        cache.refresh()
+        hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i, {})
+                 for i in range(self.hosts_count)]
+        filter_properties = {"scheduler_hints": {"reservation": "r0"}}
+
+        start = time.time()
+        for _i in range(self.requests_count):
+            f = climate_filter.ClimateFilter(cache=cache)
+            passing = [h for h in hosts
+                       if f.host_passes(h, filter_properties)]
+        elapsed = time.time() - start
+        self.assertEqual(['host0'], [h.host for h in passing])
+
+        start = time.time()
+        for _i in range(self.requests_count):
+            f = climate_filter.ClimateFilter(cache=cache)
+            passing = list(f.filter_all(hosts, filter_properties))
+        batch_elapsed = time.time() - start
+        self.assertEqual(['host0'], [h.host for h in passing])
+
+        print('ClimateFilter: %d hosts x %d requests in %.3fs with '
+              'host_passes, %.3fs with filter_all' %
+              (self.hosts_count, self.requests_count, elapsed,
+               batch_elapsed))
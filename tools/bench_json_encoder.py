@@ -0,0 +1,77 @@
+# Copyright (c) 2013 Mirantis Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compare the JSON encoders of the API on a listing of leases.
+
+Usage: python tools/bench_json_encoder.py [LEASES] [ROUNDS]
+"""
+
+import datetime
+import sys
+import timeit
+
+from climate.api import encoder
+from climate.openstack.common.deprecated import wsgi
+
+
+def _lease(i):
+    date = datetime.datetime(2030, 1, 1, 12, 0, 0, 123)
+    lease_id = 'aaaaaaaa-1111-bbbb-2222-%012d' % i
+    return {
+        'id': lease_id,
+        'name': 'lease%d' % i,
+        'tenant_id': 'tenant',
+        'user_id': 'user',
+        'start_date': date,
+        'end_date': date + datetime.timedelta(days=1),
+        'trust': 'trust',
+        'created_at': '2013-12-01 00:00:00',
+        'updated_at': None,
+        'reservations': [{'id': 'reservation%d' % i, 'lease_id': lease_id,
+                          'resource_id': 'host%d' % (i % 100),
+                          'resource_type': 'physical:host',
+                          'status': 'pending',
+                          'created_at': '2013-12-01 00:00:00',
+                          'updated_at': None}],
+        'events': [{'id': 'event%d-%d' % (i, j), 'lease_id': lease_id,
+                    'event_type': event_type, 'time': date, 'status': 'UNDONE',
+                    'created_at': '2013-12-01 00:00:00', 'updated_at': None}
+                   for j, event_type in enumerate(('start_lease',
+                                                   'end_lease'))],
+    }
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 10000
+    rounds = int(argv[2]) if len(argv) > 2 else 5
+    leases = [_lease(i) for i in range(count)]
+    serializer = wsgi.JSONDictSerializer()
+
+    print('backend: %s' % encoder.Encoder().backend.__name__)
+    for name, func in (
+            ('serializer, whole document',
+             lambda: serializer.serialize({'leases': leases})),
+            ('encoder, whole document',
+             lambda: encoder.dumps({'leases': leases})),
+            ('serializer, lease by lease',
+             lambda: [serializer.serialize(lease) for lease in leases]),
+            ('encoder, lease by lease',
+             lambda: [encoder.dumps(lease) for lease in leases])):
+        best = min(timeit.repeat(func, number=1, repeat=rounds))
+        print('%-28s %8.1f ms' % (name, best * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv)